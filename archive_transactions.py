@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Move closed periods of the ledger out of the hot database.
+
+Transactions dated before --before (with their cart line items) and the
+overdraft_weeks rows of weeks that ended by then are copied into per-year
+cold files, stuco_archive_YYYY.db, then deleted from stuco.db in small
+batches so POS lanes are never locked out for long. Each student's archived
+amounts are folded into a single ADJUST row, the opening-balance
+carry-forward (staff 'archive'), so every balance still equals the sum of
+its hot transactions. Accounts, cards and students are not touched.
+
+Each step writes one file only: the copy commits to the archive, and a
+batch is deleted from the hot database only after its rows are found in
+the archive. An interrupted run is finished by running it again.
+
+Full history stays available: open_history() attaches the archives and
+creates a TEMP view, transactions_history, over archived and hot rows
+(without the carry-forward rows, which only summarise archived ones).
+
+Usage:
+    python archive_transactions.py --before 2026-02-01 --dry-run
+    python archive_transactions.py --before 2026-02-01
+    python archive_transactions.py --history 42      # one student's full history
+    python archive_transactions.py --list
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pos
+
+CARRY_STAFF = "archive"
+
+
+def not_carry(alias: str = "") -> str:
+    """SQL condition excluding carry-forward rows (staff may be NULL, hence IS)"""
+    return f"NOT ({alias}type = 'ADJUST' AND {alias}staff IS '{CARRY_STAFF}')"
+
+
+NOT_CARRY = not_carry()
+TX_COLUMNS = "id, student_id, card_uid, type, amount, overdraft_component, description, staff, created_at"
+ARCHIVE_RE = re.compile(r"^stuco_archive_(\d{4})\.db$")
+DEFAULT_BATCH_SIZE = 500
+
+# Cold copy of the ledger tables: same columns and IDs, no foreign keys
+# (students stay in the hot database) and no triggers
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+  id INTEGER PRIMARY KEY,
+  student_id INTEGER NOT NULL,
+  card_uid TEXT,
+  type TEXT NOT NULL,
+  amount INTEGER NOT NULL,
+  overdraft_component INTEGER NOT NULL DEFAULT 0,
+  description TEXT,
+  staff TEXT,
+  created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tx_student_time ON transactions(student_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_tx_time ON transactions(created_at);
+
+CREATE TABLE IF NOT EXISTS transaction_items (
+  transaction_id INTEGER NOT NULL,
+  product_id INTEGER NOT NULL,
+  quantity INTEGER NOT NULL,
+  unit_price INTEGER NOT NULL,
+  PRIMARY KEY (transaction_id, product_id)
+) WITHOUT ROWID;
+
+-- Products named by archived line items, as they were when archived
+CREATE TABLE IF NOT EXISTS products (
+  id INTEGER PRIMARY KEY,
+  sku TEXT NOT NULL,
+  name TEXT NOT NULL,
+  price INTEGER NOT NULL,
+  active INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS overdraft_weeks (
+  student_id INTEGER NOT NULL,
+  week_start_utc TEXT NOT NULL,
+  used INTEGER NOT NULL,
+  PRIMARY KEY(student_id, week_start_utc)
+);
+
+CREATE TABLE IF NOT EXISTS archive_runs (
+  cutoff TEXT NOT NULL,
+  archived_at TEXT NOT NULL DEFAULT (datetime('now')),
+  transactions INTEGER NOT NULL,
+  overdraft_weeks INTEGER NOT NULL
+);
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Hot database connection in autocommit mode: every transaction here is explicit"""
+    con = sqlite3.connect(path, isolation_level=None)
+    con.execute("PRAGMA foreign_keys=ON;")
+    con.execute("PRAGMA busy_timeout=5000;")
+    return con
+
+
+def parse_cutoff(text: str) -> str:
+    """'YYYY-MM-DD[ HH:MM:SS]' (UTC) -> 'YYYY-MM-DD HH:MM:SS'; raises ValueError"""
+    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            cutoff = datetime.strptime(text, fmt).replace(tzinfo=timezone.utc)
+            break
+        except ValueError:
+            continue
+    else:
+        raise ValueError(f"invalid date '{text}' (expected YYYY-MM-DD or 'YYYY-MM-DD HH:MM:SS')")
+    if cutoff > datetime.now(timezone.utc):
+        raise ValueError(f"cutoff {text} is in the future; only closed periods can be archived")
+    return cutoff.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def archive_path(archive_dir: str, year: str) -> str:
+    return os.path.join(archive_dir, f"stuco_archive_{year}.db")
+
+
+def year_bounds(year: str, cutoff: str):
+    """[start, end) of a calendar year, clipped to the cutoff"""
+    return f"{year}-01-01 00:00:00", min(cutoff, f"{int(year) + 1}-01-01 00:00:00")
+
+
+def pending(con, cutoff: str) -> dict:
+    """year -> {'transactions', 'amount', 'students', 'weeks'} still to archive"""
+    years = {}
+    for year, count, amount, students in con.execute(f"""
+            SELECT substr(created_at, 1, 4), COUNT(*), SUM(amount), COUNT(DISTINCT student_id)
+            FROM transactions WHERE created_at < ? AND {NOT_CARRY} GROUP BY 1""", (cutoff,)):
+        years[year] = {"transactions": count, "amount": amount, "students": students, "weeks": 0}
+    for year, weeks in con.execute("""
+            SELECT substr(week_start_utc, 1, 4), COUNT(*) FROM overdraft_weeks
+            WHERE datetime(week_start_utc, '+7 days') <= ? GROUP BY 1""", (cutoff,)):
+        years.setdefault(year, {"transactions": 0, "amount": 0, "students": 0, "weeks": 0})["weeks"] = weeks
+    return dict(sorted(years.items()))
+
+
+def attach_archive(con, path: str, alias: str = "arc"):
+    """Create the archive file's tables if needed and attach it"""
+    cold = sqlite3.connect(path)
+    cold.executescript(ARCHIVE_SCHEMA)
+    cold.close()
+    con.execute("ATTACH DATABASE ? AS " + alias, (path,))
+
+
+def copy_year(con, year: str, cutoff: str) -> int:
+    """Copy a year's archivable rows into the attached archive (one archive-only transaction)"""
+    start, end = year_bounds(year, cutoff)
+    con.execute("BEGIN")
+    try:
+        copied = con.execute(f"""
+            INSERT OR IGNORE INTO arc.transactions({TX_COLUMNS})
+            SELECT {TX_COLUMNS} FROM main.transactions
+            WHERE created_at >= ? AND created_at < ? AND {NOT_CARRY}""", (start, end)).rowcount
+        con.execute(f"""
+            INSERT OR IGNORE INTO arc.transaction_items(transaction_id, product_id, quantity, unit_price)
+            SELECT i.transaction_id, i.product_id, i.quantity, i.unit_price
+            FROM main.transactions t JOIN main.transaction_items i ON i.transaction_id = t.id
+            WHERE t.created_at >= ? AND t.created_at < ? AND {not_carry("t.")}""", (start, end))
+        con.execute("""
+            INSERT OR REPLACE INTO arc.products(id, sku, name, price, active)
+            SELECT id, sku, name, price, active FROM main.products
+            WHERE id IN (SELECT product_id FROM arc.transaction_items)""")
+        con.execute("""
+            INSERT OR REPLACE INTO arc.overdraft_weeks(student_id, week_start_utc, used)
+            SELECT student_id, week_start_utc, used FROM main.overdraft_weeks
+            WHERE substr(week_start_utc, 1, 4) = ? AND datetime(week_start_utc, '+7 days') <= ?""",
+                    (year, cutoff))
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return copied
+
+
+def move_batch(con, year: str, cutoff: str, batch_size: int) -> int:
+    """
+    Delete up to batch_size archived transactions from the hot database and fold
+    their amounts into the students' carry-forward rows, in one short transaction.
+
+    Returns:
+        Rows moved (0 when the year is done)
+
+    Raises:
+        RuntimeError: if a row is missing from the archive (copy again, then retry)
+    """
+    start, end = year_bounds(year, cutoff)
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        con.execute("DELETE FROM archive_batch")
+        moved = con.execute(f"""
+            INSERT INTO archive_batch(id)
+            SELECT id FROM main.transactions
+            WHERE created_at >= ? AND created_at < ? AND {NOT_CARRY}
+            ORDER BY created_at LIMIT ?""", (start, end, batch_size)).rowcount
+        if not moved:
+            con.execute("COMMIT")
+            return 0
+
+        missing = con.execute("""
+            SELECT COUNT(*) FROM archive_batch b
+            WHERE NOT EXISTS (SELECT 1 FROM arc.transactions a WHERE a.id = b.id)""").fetchone()[0]
+        if missing:
+            raise RuntimeError(f"{missing} transaction(s) before {cutoff} are not in the archive yet")
+
+        sums = con.execute("""
+            SELECT t.student_id, SUM(t.amount) FROM main.transactions t
+            JOIN archive_batch b ON b.id = t.id GROUP BY t.student_id""").fetchall()
+        carried = dict(con.execute(f"""
+            SELECT student_id, id FROM main.transactions
+            WHERE type = 'ADJUST' AND staff IS '{CARRY_STAFF}'
+              AND student_id IN (SELECT DISTINCT t.student_id FROM main.transactions t
+                                 JOIN archive_batch b ON b.id = t.id)"""))
+        description = f"Opening balance carried forward (transactions before {cutoff[:10]} archived)"
+        con.executemany("UPDATE main.transactions SET amount = amount + ?, description = ?, created_at = ? WHERE id = ?",
+                        [(amount, description, cutoff, carried[sid]) for sid, amount in sums if sid in carried])
+        con.executemany(f"""INSERT INTO main.transactions(student_id, type, amount, description, staff, created_at)
+                            VALUES (?, 'ADJUST', ?, ?, '{CARRY_STAFF}', ?)""",
+                        [(sid, amount, description, cutoff) for sid, amount in sums if sid not in carried])
+        # transaction_items rows go with their transactions (ON DELETE CASCADE)
+        con.execute("DELETE FROM main.transactions WHERE id IN (SELECT id FROM archive_batch)")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return moved
+
+
+def move_weeks(con, year: str, cutoff: str) -> int:
+    """Delete the year's finished overdraft weeks that the archive already holds"""
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        moved = con.execute("""
+            DELETE FROM main.overdraft_weeks
+            WHERE substr(week_start_utc, 1, 4) = ? AND datetime(week_start_utc, '+7 days') <= ?
+              AND EXISTS (SELECT 1 FROM arc.overdraft_weeks a
+                          WHERE a.student_id = overdraft_weeks.student_id
+                            AND a.week_start_utc = overdraft_weeks.week_start_utc)""",
+                            (year, cutoff)).rowcount
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return moved
+
+
+def archive(con, cutoff: str, archive_dir: str, batch_size: int = DEFAULT_BATCH_SIZE, pause: float = 0.0) -> dict:
+    """
+    Archive everything before cutoff, year by year.
+
+    Returns:
+        year -> (transactions moved, overdraft weeks moved)
+    """
+    con.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)")
+    results = {}
+    for year in pending(con, cutoff):
+        path = archive_path(archive_dir, year)
+        attach_archive(con, path)
+        try:
+            started = time.perf_counter()
+            copied = copy_year(con, year, cutoff)
+            moved = 0
+            while True:
+                batch = move_batch(con, year, cutoff, batch_size)
+                if not batch:
+                    break
+                moved += batch
+                if pause:
+                    time.sleep(pause)   # let POS writers in between batches
+            weeks = move_weeks(con, year, cutoff)
+            con.execute("INSERT INTO arc.archive_runs(cutoff, transactions, overdraft_weeks) VALUES (?, ?, ?)",
+                        (cutoff, moved, weeks))
+            print(f"[ARCHIVE] {year}: {moved} transactions ({copied} newly copied), {weeks} overdraft weeks "
+                  f"-> {path} in {time.perf_counter() - started:.1f}s")
+            results[year] = (moved, weeks)
+        finally:
+            con.execute("DETACH DATABASE arc")
+    return results
+
+
+def archive_files(archive_dir: str) -> dict:
+    """year -> path for every stuco_archive_YYYY.db in archive_dir"""
+    found = {}
+    for name in sorted(os.listdir(archive_dir or ".")):
+        match = ARCHIVE_RE.match(name)
+        if match:
+            found[match.group(1)] = os.path.join(archive_dir, name)
+    return found
+
+
+def open_history(con, archive_dir: str) -> list:
+    """
+    Attach every archive as arc_YYYY and create the TEMP VIEW transactions_history:
+    archived and hot transactions with the same columns plus source ('YYYY' or 'hot').
+
+    Returns:
+        Attached archive years
+
+    Raises:
+        RuntimeError: if there are more archives than SQLite can attach at once
+    """
+    files = archive_files(archive_dir)
+    limit = con.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    if len(files) > limit:
+        raise RuntimeError(f"{len(files)} archives but SQLite attaches at most {limit}; "
+                           f"merge old years or move them out of {archive_dir}")
+    attached = {row[1] for row in con.execute("PRAGMA database_list")}
+    selects = []
+    for year, path in files.items():
+        if f"arc_{year}" not in attached:
+            con.execute(f"ATTACH DATABASE ? AS arc_{year}", (path,))
+        selects.append(f"SELECT {TX_COLUMNS}, '{year}' AS source FROM arc_{year}.transactions")
+    selects.append(f"SELECT {TX_COLUMNS}, 'hot' AS source FROM main.transactions WHERE {NOT_CARRY}")
+    con.execute("DROP VIEW IF EXISTS temp.transactions_history")
+    con.execute("CREATE TEMP VIEW transactions_history AS " + "\nUNION ALL ".join(selects))
+    return list(files)
+
+
+def hot_size(con) -> tuple:
+    """(bytes in use, bytes on the freelist) of the hot database file"""
+    page_size = con.execute("PRAGMA page_size").fetchone()[0]
+    pages = con.execute("PRAGMA page_count").fetchone()[0]
+    free = con.execute("PRAGMA freelist_count").fetchone()[0]
+    return (pages - free) * page_size, free * page_size
+
+
+def print_history(con, archive_dir: str, student_id: int):
+    years = open_history(con, archive_dir)
+    name = con.execute("SELECT name FROM students WHERE id=?", (student_id,)).fetchone()
+    print(f"[ARCHIVE] History of {name[0] if name else '(deleted student)'} (ID: {student_id}) "
+          f"from {len(years)} archive(s) + hot database")
+    total = 0
+    for tx_id, tx_type, amount, description, created_at, source in con.execute("""
+            SELECT id, type, amount, description, created_at, source FROM transactions_history
+            WHERE student_id = ? ORDER BY created_at, id""", (student_id,)):
+        total += amount
+        print(f"  {created_at}  #{tx_id:<7} {tx_type:<6} {amount / 10:>9.1f}  {source:<4}  {description or ''}")
+    balance = con.execute("SELECT balance FROM accounts WHERE student_id=?", (student_id,)).fetchone()
+    print(f"[ARCHIVE] Sum of history: ¥{total / 10:.1f}"
+          + (f"; account balance: ¥{balance[0] / 10:.1f}" if balance else ""))
+
+
+def print_list(con, archive_dir: str):
+    files = archive_files(archive_dir)
+    if not files:
+        print(f"[ARCHIVE] No archives in {os.path.abspath(archive_dir)}")
+    for year, path in files.items():
+        cold = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        count, first, last = cold.execute("SELECT COUNT(*), MIN(created_at), MAX(created_at) FROM transactions").fetchone()
+        weeks = cold.execute("SELECT COUNT(*) FROM overdraft_weeks").fetchone()[0]
+        runs = cold.execute("SELECT COUNT(*), MAX(cutoff) FROM archive_runs").fetchone()
+        cold.close()
+        print(f"[ARCHIVE] {path}: {count} transactions ({first} .. {last}), {weeks} overdraft weeks, "
+              f"{runs[0]} run(s), last cutoff {runs[1]}, {os.path.getsize(path) / 1e6:.1f} MB")
+    used, free = hot_size(con)
+    hot = con.execute(f"SELECT COUNT(*) FROM transactions WHERE {NOT_CARRY}").fetchone()[0]
+    carry = con.execute(f"SELECT COUNT(*) FROM transactions WHERE NOT ({NOT_CARRY})").fetchone()[0]
+    print(f"[ARCHIVE] Hot database: {hot} transactions + {carry} carry-forward rows, "
+          f"{used / 1e6:.1f} MB in use, {free / 1e6:.1f} MB free pages")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Archive closed periods of transactions into stuco_archive_YYYY.db files")
+    ap.add_argument("--db", default=os.getenv("DATABASE_PATH", pos.DB), help="hot database (default: $DATABASE_PATH or stuco.db)")
+    ap.add_argument("--archive-dir", help="where the stuco_archive_YYYY.db files live (default: next to --db)")
+    ap.add_argument("--before", help="archive transactions dated before this UTC date, e.g. the first day of term")
+    ap.add_argument("--dry-run", action="store_true", help="with --before: show what would be archived")
+    ap.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                    help=f"transactions deleted per hot-database transaction (default: {DEFAULT_BATCH_SIZE})")
+    ap.add_argument("--pause", type=float, default=0.05, help="seconds between batches (default: 0.05)")
+    ap.add_argument("--vacuum", action="store_true",
+                    help="VACUUM the hot database afterwards (locks it; run outside service hours)")
+    ap.add_argument("--history", type=int, metavar="STUDENT_ID", help="print a student's full history, archives included")
+    ap.add_argument("--list", action="store_true", help="list archive files and hot database size")
+    args = ap.parse_args()
+
+    if not Path(args.db).exists():
+        print(f"Error: database '{args.db}' not found")
+        sys.exit(1)
+    archive_dir = args.archive_dir or os.path.dirname(os.path.abspath(args.db))
+    con = connect(args.db)
+
+    if args.history is not None:
+        print_history(con, archive_dir, args.history)
+        return
+    if args.list:
+        print_list(con, archive_dir)
+        return
+    if not args.before:
+        ap.error("one of --before, --history or --list is required")
+    if args.batch_size < 1:
+        ap.error("--batch-size must be at least 1")
+    try:
+        cutoff = parse_cutoff(args.before)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    todo = pending(con, cutoff)
+    if not todo:
+        print(f"[ARCHIVE] Nothing to archive before {cutoff}")
+        return
+    for year, info in todo.items():
+        print(f"[ARCHIVE] {year}: {info['transactions']} transactions for {info['students']} students "
+              f"(net ¥{(info['amount'] or 0) / 10:.1f}), {info['weeks']} overdraft weeks "
+              f"-> {archive_path(archive_dir, year)}")
+    if args.dry_run:
+        print("[ARCHIVE] Dry run: nothing changed")
+        return
+
+    used_before, _ = hot_size(con)
+    try:
+        results = archive(con, cutoff, archive_dir, args.batch_size, args.pause)
+    except (sqlite3.Error, RuntimeError) as e:
+        print(f"[ARCHIVE] Error: {e}")
+        print("[ARCHIVE] Batches already moved are committed; run the same command again to finish")
+        sys.exit(1)
+    moved = sum(tx for tx, _ in results.values())
+    print(f"[ARCHIVE] Moved {moved} transactions; each affected student has one carry-forward ADJUST row")
+
+    if args.vacuum:
+        print("[ARCHIVE] VACUUM...")
+        con.execute("VACUUM")
+    used_after, free_after = hot_size(con)
+    print(f"[ARCHIVE] Hot database: {used_before / 1e6:.1f} MB -> {used_after / 1e6:.1f} MB in use"
+          + (f" ({free_after / 1e6:.1f} MB of free pages will be reused; --vacuum returns them)" if free_after else ""))
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
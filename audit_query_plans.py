@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Query-plan audit for the queries the POS, the CLI tools and the web app run.
+
+Runs EXPLAIN QUERY PLAN over every query in QUERIES and flags the ones that
+scan a whole table, directly or through an index ("SCAN <table> [USING
+INDEX ...]"). A scan is fine when the query has a LIMIT the scan's order
+satisfies (no temp B-tree for ORDER BY), since it stops after LIMIT rows.
+Queries that read a whole table on purpose (cache loads, "list all" pages,
+LIKE searches) list that table in expected_scans and are not flagged.
+Temp B-tree sorts are reported as warnings.
+Also reports foreign keys whose child column has no index, since an
+ON DELETE CASCADE through them scans the child table.
+
+Exit code is 1 if any query has an unexpected full table scan, so it can
+gate a schema or query change. When a query in one of the sources changes,
+change it here too.
+
+Usage:
+    python audit_query_plans.py                          # against stuco.db
+    python audit_query_plans.py --db /path/to/stuco.db -v
+    python audit_query_plans.py --schema                 # fresh in-memory schema.sql
+    python audit_query_plans.py --synthetic 1000000 --time   # 1M synthetic transactions, timed
+"""
+
+import argparse
+import random
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import pos
+
+SCHEMA_FILE = Path(__file__).resolve().parent / "migrations" / "schema.sql"
+WEEK = "2026-01-04 16:00:00"
+
+
+class AuditQuery(NamedTuple):
+    source: str
+    name: str
+    sql: str
+    params: object = ()
+    expected_scans: tuple = ()   # table names/aliases this query reads in full on purpose
+
+
+QUERIES = [
+    # pos.py
+    AuditQuery("pos.py", "charge", pos.CHARGE_SQL, {"price": 35, "uid": "DEADBEEF", "wk": WEEK}),
+    AuditQuery("pos.py", "charge (cached card)", pos.CHARGE_CACHED_SQL,
+               {"price": 35, "sid": 1, "max_ov": 200, "wk": WEEK}),
+    AuditQuery("pos.py", "balance after charge",
+               """SELECT a.student_id, a.balance FROM cards c JOIN accounts a ON a.student_id=c.student_id
+                  WHERE c.card_uid=? AND c.status='active'""", ("DEADBEEF",)),
+    AuditQuery("pos.py", "decline reason",
+               """SELECT a.balance, a.max_overdraft_week, COALESCE(o.used, 0)
+                  FROM cards c JOIN accounts a ON a.student_id=c.student_id
+                  LEFT JOIN overdraft_weeks o ON o.student_id=c.student_id AND o.week_start_utc=?
+                  WHERE c.card_uid=? AND c.status='active'""", (WEEK, "DEADBEEF")),
+    AuditQuery("pos.py", "overdraft_used_this_week",
+               "SELECT used FROM overdraft_weeks WHERE student_id=? AND week_start_utc=?", (1, WEEK)),
+    AuditQuery("pos.py", "CardCache load",
+               """SELECT c.card_uid, c.student_id, a.max_overdraft_week
+                  FROM cards c JOIN accounts a ON a.student_id=c.student_id
+                  WHERE c.status='active'""", (), ("c",)),
+    AuditQuery("pos.py", "ProductCatalog load",
+               "SELECT id, sku, name, price FROM products WHERE active=1", (), ("products",)),
+    AuditQuery("pos.py", "lookup_product",
+               "SELECT id, name, price FROM products WHERE sku=? AND active=1", ("drink",)),
+    # topup.py
+    AuditQuery("topup.py", "active card",
+               "SELECT student_id FROM cards WHERE card_uid=? AND status='active'", ("DEADBEEF",)),
+    AuditQuery("topup.py", "new balance", "SELECT balance FROM accounts WHERE student_id=?", (1,)),
+    AuditQuery("topup.py", "filter_bulk_rows",
+               """SELECT s.id, s.name FROM students s JOIN accounts a ON a.student_id=s.id
+                  WHERE s.name LIKE ? ORDER BY s.name""", ("%",), ("s",)),
+    AuditQuery("topup.py", "resolve_bulk cards",
+               "SELECT card_uid, student_id FROM cards WHERE status='active'", (), ("cards",)),
+    AuditQuery("topup.py", "resolve_bulk names", "SELECT id, name FROM students", (), ("students",)),
+    AuditQuery("topup.py", "resolve_bulk accounts", "SELECT student_id FROM accounts", (), ("accounts",)),
+    AuditQuery("topup.py", "bulk balances",
+               """SELECT student_id, balance FROM accounts
+                  WHERE student_id IN (SELECT value FROM json_each(?))""", ("[1,2,3]",)),
+    # batch_import_students.py
+    AuditQuery("batch_import_students.py", "prefetch students",
+               "SELECT s.name, s.id FROM students s JOIN import_staging i ON i.name = s.name", (), ("i",)),
+    AuditQuery("batch_import_students.py", "prefetch cards",
+               "SELECT c.card_uid, c.student_id FROM cards c JOIN import_staging i ON i.uid = c.card_uid",
+               (), ("i",)),
+    AuditQuery("batch_import_students.py", "sync students", "SELECT name, id FROM students", (), ("students",)),
+    AuditQuery("batch_import_students.py", "sync cards",
+               "SELECT card_uid, student_id, status FROM cards", (), ("cards",)),
+    # web-next/lib/repositories
+    AuditQuery("web accounts.ts", "getAccountByStudentId", "SELECT * FROM accounts WHERE student_id = ?", (1,)),
+    AuditQuery("web cards.ts", "getAllCards",
+               """SELECT c.card_uid, c.student_id, c.status, c.issued_at, s.name as student_name
+                  FROM cards c JOIN students s ON c.student_id = s.id
+                  ORDER BY c.issued_at DESC""", (), ("c", "s")),
+    AuditQuery("web cards.ts", "getCardByUid",
+               """SELECT c.card_uid, c.student_id, c.status, c.issued_at, s.name as student_name
+                  FROM cards c JOIN students s ON c.student_id = s.id
+                  WHERE c.card_uid = ?""", ("DEADBEEF",)),
+    AuditQuery("web cards.ts", "getCardsByStudentId",
+               "SELECT * FROM cards WHERE student_id = ? ORDER BY issued_at DESC", (1,)),
+    AuditQuery("web overdraft.ts", "getOverdraftWeek",
+               "SELECT * FROM overdraft_weeks WHERE student_id = ? AND week_start_utc = ?", (1, WEEK)),
+    AuditQuery("web overdraft.ts", "getAllOverdraftWeeks",
+               "SELECT * FROM overdraft_weeks ORDER BY week_start_utc DESC", (), ("overdraft_weeks",)),
+    AuditQuery("web students.ts", "getAllStudents",
+               """SELECT s.id, s.name, COALESCE(a.balance, 0) as balance,
+                         COALESCE(a.max_overdraft_week, 0) as max_overdraft_week
+                  FROM students s LEFT JOIN accounts a ON s.id = a.student_id
+                  ORDER BY s.name ASC""", (), ("s",)),
+    AuditQuery("web students.ts", "getStudentById",
+               """SELECT s.id, s.name, COALESCE(a.balance, 0) as balance,
+                         COALESCE(a.max_overdraft_week, 0) as max_overdraft_week
+                  FROM students s LEFT JOIN accounts a ON s.id = a.student_id
+                  WHERE s.id = ?""", (1,)),
+    AuditQuery("web students.ts", "getStudentByName", "SELECT * FROM students WHERE name = ?", ("Student 1",)),
+    AuditQuery("web students.ts", "searchStudents",
+               """SELECT s.id, s.name, COALESCE(a.balance, 0) as balance,
+                         COALESCE(a.max_overdraft_week, 0) as max_overdraft_week
+                  FROM students s LEFT JOIN accounts a ON s.id = a.student_id
+                  WHERE s.name LIKE ?
+                  ORDER BY s.name ASC""", ("%stud%",), ("s",)),
+    AuditQuery("web transactions.ts", "getAllTransactions",
+               """SELECT t.id, t.student_id, t.card_uid, t.type, t.amount, t.overdraft_component,
+                         t.description, t.staff, t.created_at, s.name as student_name
+                  FROM transactions t JOIN students s ON t.student_id = s.id
+                  ORDER BY t.created_at DESC""", (), ("t",)),
+    AuditQuery("web transactions.ts", "getAllTransactions (limit)",
+               """SELECT t.id, t.student_id, t.card_uid, t.type, t.amount, t.overdraft_component,
+                         t.description, t.staff, t.created_at, s.name as student_name
+                  FROM transactions t JOIN students s ON t.student_id = s.id
+                  ORDER BY t.created_at DESC
+                  LIMIT ?""", (10,)),
+    AuditQuery("web transactions.ts", "getTransactionsByStudentId",
+               "SELECT * FROM transactions WHERE student_id = ? ORDER BY created_at DESC", (1,)),
+    AuditQuery("web transactions.ts", "getTransactionById", "SELECT * FROM transactions WHERE id = ?", (1,)),
+    AuditQuery("web transactions.ts", "getStudentIdsWithTransactions",
+               """SELECT s.id AS student_id FROM students s
+                  WHERE EXISTS (SELECT 1 FROM transactions t WHERE t.student_id = s.id)""", (), ("s",)),
+    AuditQuery("web transactions.ts", "getWeeklyTopupData",
+               """SELECT date(created_at, 'weekday 0', '-6 days') as week_start, SUM(amount) as total_amount
+                  FROM transactions
+                  WHERE type = 'TOPUP' AND created_at >= date('now', '-84 days')
+                  GROUP BY week_start
+                  ORDER BY week_start ASC"""),
+    AuditQuery("web transactions.ts", "getTotalSalesCount",
+               "SELECT COUNT(*) as count FROM transactions WHERE type = 'DEBIT'"),
+]
+
+SCAN_RE = re.compile(r"^SCAN (\S+)")
+LIMIT_RE = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+
+
+def plan_of(con, query):
+    """EXPLAIN QUERY PLAN detail lines, indented by depth"""
+    rows = con.execute("EXPLAIN QUERY PLAN " + query.sql, query.params).fetchall()
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+
+def audit(con, query):
+    """(flags, notes, plan): unexpected full scans, temp-B-tree sorts, plan lines"""
+    lines = plan_of(con, query)
+    details = [line.strip() for line in lines]
+    bounded = LIMIT_RE.search(query.sql) and "USE TEMP B-TREE FOR ORDER BY" not in details
+    flags, notes = [], []
+    for detail in details:
+        match = SCAN_RE.match(detail)
+        if (match and match.group(1) not in query.expected_scans and not bounded
+                and "VIRTUAL TABLE" not in detail):   # json_each() over a bound list
+            flags.append(detail)
+        elif detail.startswith("USE TEMP B-TREE") and not query.expected_scans:
+            notes.append(detail)
+    return flags, notes, lines
+
+
+def time_query(con, query, repeat=3):
+    """Best of repeat runs in milliseconds; None for statements that write"""
+    if not query.sql.lstrip().upper().startswith("SELECT"):
+        return None
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        con.execute(query.sql, query.params).fetchall()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def unindexed_foreign_keys(con):
+    """(table, column, parent) for foreign keys whose child column leads no index"""
+    missing = []
+    tables = [r[0] for r in con.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+    )]
+    for table in tables:
+        leading = set()
+        for index in con.execute(f"PRAGMA index_list('{table}')").fetchall():
+            cols = con.execute(f"PRAGMA index_info('{index[1]}')").fetchall()
+            if cols:
+                leading.add(sorted(cols)[0][2])
+        pk = [r for r in con.execute(f"PRAGMA table_info('{table}')") if r[5]]
+        if pk:
+            leading.add(min(pk, key=lambda r: r[5])[1])
+        for fk in con.execute(f"PRAGMA foreign_key_list('{table}')"):
+            if fk[1] == 0 and fk[3] not in leading:   # first column of each key
+                missing.append((table, fk[3], fk[2]))
+    return missing
+
+
+def build_synthetic(con, transactions, students):
+    """Fill an empty schema with students, cards and a year of transactions"""
+    rng = random.Random(0)
+    con.executemany("INSERT INTO students(id, name) VALUES (?, ?)",
+                    [(i, f"Student {i}") for i in range(1, students + 1)])
+    con.executemany("INSERT INTO accounts(student_id, balance, max_overdraft_week) VALUES (?, 1000, 200)",
+                    [(i,) for i in range(1, students + 1)])
+    con.executemany("INSERT INTO cards(card_uid, student_id, status) VALUES (?, ?, ?)",
+                    [(f"{i:08X}", i, "active" if i % 10 else "revoked") for i in range(1, students + 1)])
+    con.executemany("INSERT INTO products(sku, name, price) VALUES (?, ?, ?)",
+                    [(f"sku{i}", f"Product {i}", 10 + i) for i in range(20)])
+    start = time.mktime((2025, 10, 1, 0, 0, 0, 0, 0, -1))
+
+    def rows():
+        for n in range(transactions):
+            sid = rng.randint(1, students)
+            topup = rng.random() < 0.1
+            ts = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start + n * 365 * 86400 / transactions))
+            yield (sid, f"{sid:08X}", "TOPUP" if topup else "DEBIT", 100 if topup else -35, ts)
+
+    con.executemany("""INSERT INTO transactions(student_id, card_uid, type, amount, created_at)
+                       VALUES (?, ?, ?, ?, ?)""", rows())
+    con.commit()
+    con.execute("ANALYZE")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN audit of the app's queries")
+    ap.add_argument("--db", default=pos.DB, help="database to audit (default: %(default)s)")
+    ap.add_argument("--schema", action="store_true",
+                    help="audit a fresh in-memory database built from migrations/schema.sql")
+    ap.add_argument("--synthetic", type=int, metavar="N",
+                    help="like --schema, filled with N synthetic transactions (and ANALYZEd)")
+    ap.add_argument("--students", type=int, default=2000, help="students for --synthetic (default: %(default)s)")
+    ap.add_argument("--time", action="store_true", help="also run each SELECT and report its time")
+    ap.add_argument("-v", "--verbose", action="store_true", help="print every plan, not just flagged ones")
+    args = ap.parse_args()
+
+    if args.schema or args.synthetic:
+        con = sqlite3.connect(":memory:")
+        con.executescript(SCHEMA_FILE.read_text(encoding="utf-8"))
+        if args.synthetic:
+            print(f"[AUDIT] Building {args.synthetic} synthetic transactions for {args.students} students...")
+            build_synthetic(con, args.synthetic, args.students)
+        label = f"{SCHEMA_FILE.name} (in memory)"
+    else:
+        if not Path(args.db).exists():
+            print(f"Error: database '{args.db}' not found (use --schema to audit a fresh one)")
+            sys.exit(2)
+        con = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+        label = args.db
+    # Temp table batch_import_students.py stages rows in
+    con.execute("CREATE TEMP TABLE IF NOT EXISTS import_staging (name TEXT, uid TEXT)")
+
+    print(f"[AUDIT] {len(QUERIES)} queries against {label}\n")
+    flagged = 0
+    for query in QUERIES:
+        try:
+            flags, notes, lines = audit(con, query)
+        except sqlite3.Error as e:
+            print(f"✗ {query.source}: {query.name} - {e}")
+            flagged += 1
+            continue
+        status = "✗" if flags else ("⚠" if notes else "✓")
+        timing = ""
+        if args.time:
+            ms = time_query(con, query)
+            timing = "" if ms is None else f"  ({ms:.2f} ms)"
+        print(f"{status} {query.source}: {query.name}{timing}")
+        for detail in flags:
+            print(f"    full table scan: {detail}")
+        for detail in notes:
+            print(f"    {detail.lower()}")
+        if args.verbose or flags:
+            for line in lines:
+                print(f"      | {line}")
+        flagged += bool(flags)
+
+    missing = unindexed_foreign_keys(con)
+    if missing:
+        print("\nForeign keys without an index on the child column (cascades scan the table):")
+        for table, column, parent in missing:
+            print(f"  ⚠ {table}.{column} -> {parent}")
+
+    print(f"\n[AUDIT] {flagged} of {len(QUERIES)} queries flagged")
+    con.close()
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Consistent online backups of stuco.db.
+
+A plain file copy of a WAL-mode database misses whatever is still in
+stuco.db-wal and can catch pages mid-write. Here the SQLite backup API
+copies the database a few pages at a time from one read snapshot: the
+source connection holds a read transaction for the whole backup, so writes
+from POS lanes carry on (WAL readers never block writers) and never force
+the backup to restart. A short sleep between steps keeps the I/O from
+crowding out charges.
+
+Every backup is written to a .partial file, checked with PRAGMA
+integrity_check, switched to a self-contained rollback-journal file and
+only then renamed into place. --compact uses VACUUM INTO instead: one
+statement, smaller (defragmented) output, but not throttled.
+
+Retention keeps the newest --keep-last backups plus the newest backup of
+each of the last --keep-daily days and --keep-weekly ISO weeks.
+
+Usage:
+    python backup_db.py                      # paged backup into db_backups/, verify, prune
+    python backup_db.py --compact            # VACUUM INTO variant
+    python backup_db.py --output /mnt/usb/stuco.db
+    python backup_db.py --list
+    python backup_db.py --verify db_backups/stuco_backup_20260301_020000.db
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+DB = "stuco.db"
+BACKUP_DIR = "db_backups"
+BACKUP_RE = re.compile(r"^stuco_backup_(\d{8}_\d{6})\.db$")
+DEFAULT_PAGES = 256      # pages per backup step (1 MiB at the default 4 KiB page size)
+DEFAULT_SLEEP = 0.02     # seconds between steps
+HAS_VACUUM_INTO = sqlite3.sqlite_version_info >= (3, 27, 0)
+
+
+def backup_name(when: datetime = None) -> str:
+    """stuco_backup_YYYYmmdd_HHMMSS.db, the name reset_db.py has always used"""
+    return f"stuco_backup_{(when or datetime.now()).strftime('%Y%m%d_%H%M%S')}.db"
+
+
+def open_snapshot(db_path: str) -> sqlite3.Connection:
+    """Read-only connection holding one read transaction (a fixed snapshot) until closed"""
+    src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, isolation_level=None)
+    src.execute("PRAGMA busy_timeout=5000;")
+    src.execute("BEGIN")
+    src.execute("SELECT COUNT(*) FROM sqlite_schema").fetchone()
+    return src
+
+
+def online_backup(db_path: str, dest_path: str, pages: int = DEFAULT_PAGES,
+                  sleep: float = DEFAULT_SLEEP, verbose: bool = True) -> dict:
+    """
+    Copy db_path to dest_path with the backup API, pages at a time, sleeping between steps.
+
+    Returns:
+        {'pages', 'steps', 'seconds'}
+    """
+    src = open_snapshot(db_path)
+    dst = sqlite3.connect(dest_path)
+    stats = {"pages": 0, "steps": 0, "seconds": 0.0}
+    reported = [-1]
+
+    def progress(status, remaining, total):
+        stats["steps"] += 1
+        stats["pages"] = total
+        percent = 100 * (total - remaining) // total if total else 100
+        if verbose and percent // 10 > reported[0]:
+            reported[0] = percent // 10
+            print(f"[BACKUP] {percent:3d}% ({total - remaining}/{total} pages)")
+        if remaining and sleep:
+            time.sleep(sleep)   # throttle: let POS writes have the disk
+
+    started = time.perf_counter()
+    try:
+        src.backup(dst, pages=pages, progress=progress)
+    finally:
+        dst.close()
+        src.close()
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def compact_backup(db_path: str, dest_path: str) -> dict:
+    """
+    Write a defragmented copy with VACUUM INTO (one statement from one snapshot;
+    not throttled, so prefer online_backup during service hours).
+
+    Returns:
+        {'pages', 'steps', 'seconds'}
+    """
+    if not HAS_VACUUM_INTO:
+        raise RuntimeError(f"VACUUM INTO needs SQLite 3.27+, this is {sqlite3.sqlite_version}")
+    src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, isolation_level=None)
+    src.execute("PRAGMA busy_timeout=5000;")
+    started = time.perf_counter()
+    try:
+        src.execute("VACUUM INTO ?", (dest_path,))   # runs in its own read transaction
+    finally:
+        src.close()
+    out = sqlite3.connect(dest_path)
+    pages = out.execute("PRAGMA page_count").fetchone()[0]
+    out.close()
+    return {"pages": pages, "steps": 1, "seconds": time.perf_counter() - started}
+
+
+def verify(path: str, quick: bool = False) -> tuple:
+    """
+    Check a backup file.
+
+    Returns:
+        (ok, message): message is 'ok' or the first problems integrity_check reported
+    """
+    con = None
+    try:
+        con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        rows = [r[0] for r in con.execute("PRAGMA quick_check" if quick else "PRAGMA integrity_check")]
+    except sqlite3.Error as e:
+        return False, str(e)
+    finally:
+        if con is not None:
+            con.close()
+    return rows == ["ok"], "; ".join(rows[:5])
+
+
+def make_backup(db_path: str = DB, dest_path: str = None, backup_dir: str = BACKUP_DIR,
+                compact: bool = False, pages: int = DEFAULT_PAGES, sleep: float = DEFAULT_SLEEP,
+                quick: bool = False, verbose: bool = True) -> str:
+    """
+    Back up db_path, verify the copy and move it into place.
+
+    Args:
+        dest_path: Backup file; default backup_dir/stuco_backup_<timestamp>.db
+
+    Returns:
+        Path of the verified backup
+
+    Raises:
+        FileNotFoundError: if db_path does not exist
+        RuntimeError: if the copy fails verification (it is kept as <dest>.failed)
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"database not found: {db_path}")
+    if dest_path is None:
+        os.makedirs(backup_dir, exist_ok=True)
+        dest_path = os.path.join(backup_dir, backup_name())
+    partial = dest_path + ".partial"
+    for leftover in (partial, partial + "-journal"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+    if compact:
+        stats = compact_backup(db_path, partial)
+    else:
+        stats = online_backup(db_path, partial, pages, sleep, verbose)
+
+    # A self-contained file: no -wal/-shm next to the backup when it is opened
+    out = sqlite3.connect(partial)
+    out.execute("PRAGMA journal_mode=DELETE;")
+    out.close()
+
+    ok, message = verify(partial, quick)
+    if not ok:
+        os.replace(partial, dest_path + ".failed")
+        raise RuntimeError(f"backup failed {'quick_check' if quick else 'integrity_check'}: {message} "
+                           f"(kept as {dest_path}.failed)")
+    os.replace(partial, dest_path)
+    if verbose:
+        size = os.path.getsize(dest_path)
+        print(f"[BACKUP] ✓ {dest_path}: {stats['pages']} pages, {size / 1e6:.1f} MB, "
+              f"{stats['steps']} step(s) in {stats['seconds']:.1f}s, "
+              f"{'quick_check' if quick else 'integrity_check'} ok")
+    return dest_path
+
+
+def list_backups(backup_dir: str = BACKUP_DIR) -> list:
+    """[(taken at, path)] for stuco_backup_*.db files, newest first"""
+    if not os.path.isdir(backup_dir):
+        return []
+    found = []
+    for name in os.listdir(backup_dir):
+        match = BACKUP_RE.match(name)
+        if match:
+            found.append((datetime.strptime(match.group(1), "%Y%m%d_%H%M%S"), os.path.join(backup_dir, name)))
+    return sorted(found, reverse=True)
+
+
+def backups_to_keep(backups: list, keep_last: int, keep_daily: int, keep_weekly: int) -> set:
+    """Paths retained: the newest keep_last, plus the newest of each recent day and ISO week"""
+    keep = {path for _, path in backups[:keep_last]}
+    days, weeks = set(), set()
+    for taken, path in backups:
+        day, week = taken.date(), taken.isocalendar()[:2]
+        if day not in days and len(days) < keep_daily:
+            days.add(day)
+            keep.add(path)
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.add(week)
+            keep.add(path)
+    return keep
+
+
+def prune(backup_dir: str = BACKUP_DIR, keep_last: int = 7, keep_daily: int = 14,
+          keep_weekly: int = 8, dry_run: bool = False) -> list:
+    """Delete backups outside the retention rules; returns the removed paths"""
+    backups = list_backups(backup_dir)
+    keep = backups_to_keep(backups, max(1, keep_last), keep_daily, keep_weekly)
+    removed = [path for _, path in backups if path not in keep]
+    for path in removed:
+        if not dry_run:
+            os.remove(path)
+        print(f"[BACKUP] {'Would remove' if dry_run else 'Removed'} {path}")
+    return removed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Consistent, throttled online backups of the SQLite database")
+    ap.add_argument("--db", default=os.getenv("DATABASE_PATH", DB), help="database to back up (default: $DATABASE_PATH or stuco.db)")
+    ap.add_argument("--dir", default=os.getenv("STUCO_BACKUP_DIR", BACKUP_DIR),
+                    help="backup directory (default: $STUCO_BACKUP_DIR or db_backups)")
+    ap.add_argument("--output", help="write this file instead of a timestamped one in --dir (no pruning)")
+    ap.add_argument("--compact", action="store_true", help="VACUUM INTO a defragmented copy (not throttled)")
+    ap.add_argument("--pages", type=int, default=DEFAULT_PAGES, help=f"pages per step (default: {DEFAULT_PAGES})")
+    ap.add_argument("--sleep", type=float, default=DEFAULT_SLEEP, help=f"seconds between steps (default: {DEFAULT_SLEEP})")
+    ap.add_argument("--quick", action="store_true", help="verify with quick_check instead of integrity_check")
+    ap.add_argument("--keep-last", type=int, default=7, help="always keep the newest N backups (default: 7)")
+    ap.add_argument("--keep-daily", type=int, default=14, help="keep the newest backup of each of the last N days (default: 14)")
+    ap.add_argument("--keep-weekly", type=int, default=8, help="keep the newest backup of each of the last N weeks (default: 8)")
+    ap.add_argument("--no-prune", action="store_true", help="do not delete old backups")
+    ap.add_argument("--prune-only", action="store_true", help="only apply the retention rules")
+    ap.add_argument("--dry-run", action="store_true", help="with --prune-only: show what would be removed")
+    ap.add_argument("--verify", metavar="FILE", help="check an existing backup file and exit")
+    ap.add_argument("--list", action="store_true", help="list backups in --dir")
+    args = ap.parse_args()
+
+    if args.verify:
+        ok, message = verify(args.verify, args.quick)
+        print(f"[BACKUP] {'✓' if ok else '✗'} {args.verify}: {message}")
+        sys.exit(0 if ok else 1)
+    if args.list:
+        backups = list_backups(args.dir)
+        keep = backups_to_keep(backups, max(1, args.keep_last), args.keep_daily, args.keep_weekly)
+        for taken, path in backups:
+            print(f"  {taken:%Y-%m-%d %H:%M:%S}  {os.path.getsize(path) / 1e6:8.1f} MB  {path}"
+                  f"{'' if path in keep else '  (outside retention)'}")
+        print(f"[BACKUP] {len(backups)} backup(s) in {args.dir}")
+        return
+    if args.prune_only:
+        prune(args.dir, args.keep_last, args.keep_daily, args.keep_weekly, args.dry_run)
+        return
+    if args.pages < 1 or args.sleep < 0:
+        ap.error("--pages must be at least 1 and --sleep not negative")
+
+    try:
+        make_backup(args.db, args.output, args.dir, args.compact, args.pages, args.sleep, args.quick)
+    except (OSError, sqlite3.Error, RuntimeError) as e:
+        print(f"[BACKUP] ✗ {e}")
+        sys.exit(1)
+    if not args.output and not args.no_prune:
+        prune(args.dir, args.keep_last, args.keep_daily, args.keep_weekly)
+
+
+if __name__ == "__main__":
+    main()
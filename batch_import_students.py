@@ -15,12 +15,16 @@ Or without UIDs:
 """
 
 import csv
+import json
+import os
 import sqlite3
 import sys
+import time
 import argparse
 from pathlib import Path
 
 DB = "stuco.db"
+DEFAULT_CHUNK_SIZE = 1000
 
 def batch_import_students(csv_file, skip_duplicates=True, dry_run=False):
     """
@@ -66,24 +70,11 @@ def batch_import_students(csv_file, skip_duplicates=True, dry_run=False):
                 print("UID column detected - will import cards with students")
             
             for row_num, row in enumerate(reader, start=2):  # Start at 2 (header is row 1)
-                name = row.get('name', '').strip()
-                uid = row.get('uid', '').strip().upper() if has_uid_column else None
-                
-                if not name:
-                    errors.append(f"Row {row_num}: Missing or empty name")
-                    continue
-                
-                # Validate UID if provided
-                if uid:
-                    # Basic hex validation (allow alphanumeric for hex UIDs)
-                    if not all(c in '0123456789ABCDEF' for c in uid):
-                        errors.append(f"Row {row_num} ({name}): Invalid UID format '{uid}' (must be hex)")
-                        continue
-                    if len(uid) < 4 or len(uid) > 20:
-                        errors.append(f"Row {row_num} ({name}): UID length invalid '{uid}' (expected 4-20 chars)")
-                        continue
-                
-                students_to_import.append((row_num, name, uid))
+                entry, error = parse_row(row_num, row, has_uid_column)
+                if error:
+                    errors.append(error)
+                else:
+                    students_to_import.append(entry)
     
     except Exception as e:
         print(f"Error reading CSV: {e}")
@@ -109,95 +100,15 @@ def batch_import_students(csv_file, skip_duplicates=True, dry_run=False):
     con.execute("PRAGMA busy_timeout=5000;")
     cur = con.cursor()
     
-    imported = 0
-    skipped = 0
-    cards_created = 0
-    import_errors = []
-    
     try:
-        for row_num, name, uid in students_to_import:
-            try:
-                # Check if student already exists
-                existing = cur.execute("SELECT id FROM students WHERE name=?", (name,)).fetchone()
-                if existing:
-                    if skip_duplicates:
-                        student_id = existing[0]
-                        
-                        # If UID provided, try to add card for existing student
-                        if uid and not dry_run:
-                            try:
-                                # Check if UID already exists
-                                existing_card = cur.execute(
-                                    "SELECT student_id FROM cards WHERE card_uid=?", 
-                                    (uid,)
-                                ).fetchone()
-                                
-                                if existing_card:
-                                    if existing_card[0] == student_id:
-                                        print(f"⊘ Skipping duplicate student with existing card: {name} (ID: {student_id})")
-                                    else:
-                                        print(f"⚠ Skipping {name}: Card {uid} already assigned to student ID {existing_card[0]}")
-                                else:
-                                    # Add card to existing student
-                                    cur.execute(
-                                        "INSERT INTO cards(card_uid, student_id, status) VALUES (?, ?, 'active')",
-                                        (uid, student_id)
-                                    )
-                                    cards_created += 1
-                                    print(f"⊕ Added card to existing student: {name} (ID: {student_id}) → {uid}")
-                            except Exception as card_error:
-                                print(f"⚠ Could not add card for {name}: {card_error}")
-                        else:
-                            print(f"⊘ Skipping duplicate: {name} (ID: {student_id})")
-                        
-                        skipped += 1
-                        continue
-                    else:
-                        import_errors.append(f"Row {row_num} ({name}): Student already exists")
-                        continue
-                
-                # Check if UID is already in use
-                if uid:
-                    existing_card = cur.execute(
-                        "SELECT student_id FROM cards WHERE card_uid=?", 
-                        (uid,)
-                    ).fetchone()
-                    if existing_card:
-                        import_errors.append(
-                            f"Row {row_num} ({name}): Card UID {uid} already assigned to student ID {existing_card[0]}"
-                        )
-                        continue
-                
-                if dry_run:
-                    uid_info = f" → {uid}" if uid else ""
-                    print(f"[DRY RUN] Would import: {name}{uid_info}")
-                    imported += 1
-                    if uid:
-                        cards_created += 1
-                else:
-                    # Insert student and create account
-                    cur.execute("INSERT INTO students(name) VALUES (?)", (name,))
-                    student_id = cur.lastrowid
-                    cur.execute(
-                        "INSERT INTO accounts(student_id, balance, max_overdraft_week) VALUES (?, 0, 0)", 
-                        (student_id,)
-                    )
-                    
-                    # If UID provided, create card entry
-                    if uid:
-                        cur.execute(
-                            "INSERT INTO cards(card_uid, student_id, status) VALUES (?, ?, 'active')",
-                            (uid, student_id)
-                        )
-                        cards_created += 1
-                        print(f"✓ Imported: {name} (ID: {student_id}) → {uid}")
-                    else:
-                        print(f"✓ Imported: {name} (ID: {student_id})")
-                    
-                    imported += 1
-                
-            except Exception as e:
-                import_errors.append(f"Row {row_num} ({name}): {str(e)}")
+        if not dry_run:
+            # Hold the write lock from lookup to commit so the plan stays valid
+            cur.execute("BEGIN IMMEDIATE;")
+        existing_students, existing_cards = prefetch_existing(cur, students_to_import)
+        plan = plan_import(students_to_import, existing_students, existing_cards, skip_duplicates, dry_run)
+        if not dry_run:
+            apply_import(cur, plan)
+        print_plan(plan)
         
         if not dry_run:
             con.commit()
@@ -211,6 +122,8 @@ def batch_import_students(csv_file, skip_duplicates=True, dry_run=False):
     finally:
         con.close()
     
+    imported, skipped, cards_created, import_errors = plan.imported, plan.skipped, plan.cards_created, plan.errors
+    
     # Print summary
     print(f"\n{'='*60}")
     print(f"Import Summary:")
@@ -231,6 +144,657 @@ def batch_import_students(csv_file, skip_duplicates=True, dry_run=False):
     return len(import_errors) == 0
 
 
+def stream_import_students(csv_file, skip_duplicates=True, dry_run=False,
+                           chunk_size=DEFAULT_CHUNK_SIZE, checkpoint_path=None, restart=False):
+    """
+    Import a CSV of any size in constant memory.
+    
+    Rows are read as a stream and every chunk_size rows are planned, inserted
+    and committed on their own. After each commit a checkpoint (file, byte
+    offset, row number and running totals) is written next to the CSV, so
+    running the same command after an interruption resumes at the first
+    uncommitted row. The checkpoint is removed once the file is done.
+    
+    Per-row output is replaced by one progress line per chunk; validation and
+    import errors are printed as they are found instead of being collected.
+    
+    Args:
+        csv_file: Path to CSV file
+        skip_duplicates: If True, skip existing students. If False, fail on duplicates.
+        dry_run: If True, plan each chunk without writing anything (checkpoint included).
+        chunk_size: CSV rows per transaction
+        checkpoint_path: Where to keep the checkpoint (default: <csv_file>.checkpoint)
+        restart: Ignore an existing checkpoint and start from the first row
+    """
+    csv_path = Path(csv_file)
+    if not csv_path.exists():
+        print(f"Error: File '{csv_file}' not found")
+        return False
+    checkpoint_path = checkpoint_path or f"{csv_file}.checkpoint"
+    
+    try:
+        checkpoint = None if restart else load_checkpoint(checkpoint_path, csv_path)
+    except ValueError as e:
+        print(f"Error: {e}")
+        print("Use --restart to ignore the checkpoint and import from the first row")
+        return False
+    
+    totals = {"rows": 0, "imported": 0, "skipped": 0, "cards_created": 0,
+              "validation_errors": 0, "import_errors": 0}
+    if checkpoint:
+        totals.update(checkpoint["totals"])
+    
+    if dry_run:
+        print("\n=== DRY RUN MODE - No changes will be made ===\n")
+    
+    con = sqlite3.connect(DB)
+    con.execute("PRAGMA foreign_keys=ON;")
+    con.execute("PRAGMA busy_timeout=5000;")
+    cur = con.cursor()
+    
+    started = time.perf_counter()
+    rows_this_run = 0
+    row_num = 1
+    try:
+        # readline (not file iteration) keeps f.tell() usable between records
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(iter(f.readline, ''))
+            fieldnames = reader.fieldnames
+            if not fieldnames or 'name' not in fieldnames:
+                print("Error: CSV must have a 'name' column")
+                print(f"Found columns: {', '.join(fieldnames or [])}")
+                return False
+            has_uid_column = 'uid' in fieldnames
+            if has_uid_column:
+                print("UID column detected - will import cards with students")
+            
+            if checkpoint:
+                if checkpoint["fieldnames"] != fieldnames:
+                    print(f"Error: CSV header changed since checkpoint {checkpoint_path} was written")
+                    print("Use --restart to ignore the checkpoint and import from the first row")
+                    return False
+                f.seek(checkpoint["offset"])
+                row_num = checkpoint["row"]
+                print(f"Resuming from checkpoint at row {row_num + 1} "
+                      f"({totals['rows']} rows already processed)")
+            
+            for rows, errors, offset, row_num in read_chunks(f, reader, row_num, chunk_size, has_uid_column):
+                for error in errors:
+                    print(f"  - {error}")
+                
+                imported = skipped = cards_created = 0
+                import_errors = []
+                if rows:
+                    if not dry_run:
+                        cur.execute("BEGIN IMMEDIATE;")
+                    existing_students, existing_cards = prefetch_existing(cur, rows)
+                    plan = plan_import(rows, existing_students, existing_cards, skip_duplicates, dry_run)
+                    if not dry_run:
+                        apply_import(cur, plan)
+                    import_errors = plan.errors
+                    for error in import_errors:
+                        print(f"  - {error}")
+                    imported, skipped, cards_created = plan.imported, plan.skipped, plan.cards_created
+                
+                chunk_rows = len(rows) + len(errors)
+                totals["rows"] += chunk_rows
+                totals["imported"] += imported
+                totals["skipped"] += skipped
+                totals["cards_created"] += cards_created
+                totals["validation_errors"] += len(errors)
+                totals["import_errors"] += len(import_errors)
+                if not dry_run:
+                    con.commit()
+                    save_checkpoint(checkpoint_path, {
+                        "file": str(csv_path.resolve()),
+                        "fieldnames": fieldnames,
+                        "offset": offset,
+                        "row": row_num,
+                        "totals": totals,
+                    })
+                
+                rows_this_run += chunk_rows
+                elapsed = time.perf_counter() - started
+                rate = rows_this_run / elapsed if elapsed > 0 else 0.0
+                print(f"[IMPORT] Row {row_num}: {'would import' if dry_run else 'imported'} {imported}, "
+                      f"skipped {skipped}, errors {len(errors) + len(import_errors)} "
+                      f"| {totals['rows']} rows total, {rate:.0f} rows/s")
+    
+    except Exception as e:
+        con.rollback()
+        print(f"\nDatabase error at row {row_num}: {e}")
+        print("Current chunk rolled back")
+        if not dry_run and totals["rows"]:
+            print(f"Committed chunks are kept; run the same command again to resume from {checkpoint_path}")
+        return False
+    finally:
+        con.close()
+    
+    if totals["rows"] == 0:
+        print("No valid students found in CSV file")
+        return False
+    
+    if not dry_run:
+        try:
+            os.remove(checkpoint_path)
+        except FileNotFoundError:
+            pass
+        print("\nChanges committed to database")
+    
+    elapsed = time.perf_counter() - started
+    rate = rows_this_run / elapsed if elapsed > 0 else 0.0
+    
+    # Print summary
+    print(f"\n{'='*60}")
+    print("Import Summary:")
+    print(f"  Rows processed: {totals['rows']} ({rows_this_run} this run, {rate:.0f} rows/s)")
+    print(f"  {'Would import' if dry_run else 'Imported'}: {totals['imported']}")
+    if has_uid_column:
+        print(f"  {'Would create' if dry_run else 'Cards created'}: {totals['cards_created']}")
+    print(f"  Skipped (duplicates): {totals['skipped']}")
+    print(f"  Validation errors: {totals['validation_errors']}")
+    print(f"  Import errors: {totals['import_errors']}")
+    print(f"{'='*60}")
+    
+    return totals["import_errors"] == 0
+
+
+def read_chunks(f, reader, row_num, chunk_size, has_uid_column):
+    """
+    Yield (rows, errors, offset, row_num) for each chunk of up to chunk_size
+    CSV rows: the valid rows, the chunk's validation errors, and the byte
+    offset and row number just past the chunk - where a resumed import starts.
+    """
+    rows, errors = [], []
+    for row in reader:
+        row_num += 1
+        entry, error = parse_row(row_num, row, has_uid_column)
+        if error:
+            errors.append(error)
+        else:
+            rows.append(entry)
+        if len(rows) + len(errors) >= chunk_size:
+            yield rows, errors, f.tell(), row_num
+            rows, errors = [], []
+    if rows or errors:
+        yield rows, errors, f.tell(), row_num
+
+
+def load_checkpoint(checkpoint_path, csv_path):
+    """
+    Read a streaming-import checkpoint.
+    
+    Returns:
+        The checkpoint dict, or None if there is none
+    
+    Raises:
+        ValueError: if the checkpoint is unreadable or does not match csv_path
+    """
+    try:
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        missing = [key for key in ("file", "fieldnames", "offset", "row", "totals") if key not in checkpoint]
+        if missing:
+            raise ValueError(f"missing {', '.join(missing)}")
+        offset, checkpoint_file = checkpoint["offset"], checkpoint["file"]
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Unreadable checkpoint {checkpoint_path}: {e}")
+    if checkpoint_file != str(csv_path.resolve()):
+        raise ValueError(f"Checkpoint {checkpoint_path} belongs to {checkpoint_file}")
+    if offset > csv_path.stat().st_size:
+        raise ValueError(f"Checkpoint {checkpoint_path} points past the end of {csv_path} (file was truncated?)")
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    """Atomically write a streaming-import checkpoint"""
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def parse_row(row_num, row, has_uid_column):
+    """
+    Validate one CSV row.
+
+    Returns:
+        ((row_num, name, uid), None) for a valid row, (None, error message) otherwise
+    """
+    name = (row.get('name') or '').strip()
+    uid = (row.get('uid') or '').strip().upper() if has_uid_column else None
+    
+    if not name:
+        return None, f"Row {row_num}: Missing or empty name"
+    
+    # Validate UID if provided
+    if uid:
+        # Basic hex validation (allow alphanumeric for hex UIDs)
+        if not all(c in '0123456789ABCDEF' for c in uid):
+            return None, f"Row {row_num} ({name}): Invalid UID format '{uid}' (must be hex)"
+        if len(uid) < 4 or len(uid) > 20:
+            return None, f"Row {row_num} ({name}): UID length invalid '{uid}' (expected 4-20 chars)"
+    
+    return (row_num, name, uid), None
+
+
+def prefetch_existing(cur, rows):
+    """
+    Existing students (name -> id) and cards (uid -> student_id) for the names and
+    UIDs in rows, found in two joins against a temp staging table instead of
+    point lookups per row.
+    """
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS import_staging (name TEXT, uid TEXT)")
+    cur.execute("DELETE FROM import_staging")
+    cur.executemany("INSERT INTO import_staging(name, uid) VALUES (?, ?)", [(name, uid) for _, name, uid in rows])
+    students = dict(cur.execute(
+        "SELECT s.name, s.id FROM students s JOIN import_staging i ON i.name = s.name"
+    ))
+    cards = dict(cur.execute(
+        "SELECT c.card_uid, c.student_id FROM cards c JOIN import_staging i ON i.uid = c.card_uid"
+    ))
+    return students, cards
+
+
+class ImportPlan:
+    """
+    What an import will do, row by row, worked out in memory.
+
+    Each action is (kind, row_num, name, uid, student, other): student is an
+    existing student ID or a NewStudent placeholder until apply_import has
+    inserted it; other is the owner of a conflicting card.
+    """
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.actions = []
+        self.new_students = []   # NewStudent, in insert order
+        self.new_cards = []      # (uid, student), in insert order
+        self._errors = []        # (message, student whose ID ends it, or None)
+        self.imported = 0
+        self.skipped = 0
+        self.cards_created = 0
+
+    def error(self, message, student=None):
+        """Record an import error; a student's ID is appended once known"""
+        self._errors.append((message, student))
+
+    @property
+    def errors(self):
+        return [message if student is None else f"{message}{_student_id(student)}"
+                for message, student in self._errors]
+
+
+class NewStudent:
+    """A student the import will create; id is set once inserted"""
+    def __init__(self, name):
+        self.name = name
+        self.id = None
+
+
+def _student_id(student):
+    return student.id if isinstance(student, NewStudent) else student
+
+
+def plan_import(rows, students, cards, skip_duplicates=True, dry_run=False):
+    """
+    Decide every row against the prefetched students and cards, exactly as a
+    row-by-row import would: students and cards created by earlier rows count
+    as existing for later rows, except in a dry run, which changes nothing.
+    """
+    plan = ImportPlan(dry_run)
+    students, cards = dict(students), dict(cards)
+    for row_num, name, uid in rows:
+        existing = students.get(name)
+        if existing is not None:
+            if not skip_duplicates:
+                plan.error(f"Row {row_num} ({name}): Student already exists")
+                continue
+            if uid and not dry_run:
+                owner = cards.get(uid)
+                if owner is None:
+                    cards[uid] = existing
+                    plan.new_cards.append((uid, existing))
+                    plan.cards_created += 1
+                    plan.actions.append(("add_card", row_num, name, uid, existing, None))
+                elif owner == existing:
+                    plan.actions.append(("skip_has_card", row_num, name, uid, existing, None))
+                else:
+                    plan.actions.append(("skip_card_taken", row_num, name, uid, existing, owner))
+            else:
+                plan.actions.append(("skip", row_num, name, uid, existing, None))
+            plan.skipped += 1
+            continue
+        
+        if uid and uid in cards:
+            plan.error(f"Row {row_num} ({name}): Card UID {uid} already assigned to student ID ", cards[uid])
+            continue
+        
+        if dry_run:
+            plan.actions.append(("import", row_num, name, uid, None, None))
+        else:
+            student = NewStudent(name)
+            students[name] = student
+            plan.new_students.append(student)
+            if uid:
+                cards[uid] = student
+                plan.new_cards.append((uid, student))
+            plan.actions.append(("import", row_num, name, uid, student, None))
+        plan.imported += 1
+        if uid:
+            plan.cards_created += 1
+    return plan
+
+
+def apply_import(cur, plan):
+    """Insert the planned students, accounts and cards with executemany (inside the caller's transaction)"""
+    if plan.new_students:
+        ids = insert_students(cur, [s.name for s in plan.new_students])
+        for student in plan.new_students:
+            student.id = ids[student.name]
+    if plan.new_cards:
+        cur.executemany(
+            "INSERT INTO cards(card_uid, student_id, status) VALUES (?, ?, 'active')",
+            [(uid, _student_id(student)) for uid, student in plan.new_cards]
+        )
+
+
+def insert_students(cur, names):
+    """
+    Insert new students with empty accounts (inside the caller's transaction).
+
+    Returns:
+        Dict of name -> new student ID
+    """
+    cur.executemany("INSERT INTO students(name) VALUES (?)", [(name,) for name in names])
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS import_staging (name TEXT, uid TEXT)")
+    cur.execute("DELETE FROM import_staging")
+    cur.executemany("INSERT INTO import_staging(name) VALUES (?)", [(name,) for name in names])
+    ids = dict(cur.execute("SELECT s.name, s.id FROM students s JOIN import_staging i ON i.name = s.name"))
+    cur.executemany(
+        "INSERT INTO accounts(student_id, balance, max_overdraft_week) VALUES (?, 0, 0)",
+        [(ids[name],) for name in names]
+    )
+    return ids
+
+
+def print_plan(plan):
+    """Per-row output, in CSV order"""
+    for kind, row_num, name, uid, student, other in plan.actions:
+        sid = _student_id(student)
+        if kind == "skip":
+            print(f"⊘ Skipping duplicate: {name} (ID: {sid})")
+        elif kind == "skip_has_card":
+            print(f"⊘ Skipping duplicate student with existing card: {name} (ID: {sid})")
+        elif kind == "skip_card_taken":
+            print(f"⚠ Skipping {name}: Card {uid} already assigned to student ID {_student_id(other)}")
+        elif kind == "add_card":
+            print(f"⊕ Added card to existing student: {name} (ID: {sid}) → {uid}")
+        elif plan.dry_run:
+            uid_info = f" → {uid}" if uid else ""
+            print(f"[DRY RUN] Would import: {name}{uid_info}")
+        elif uid:
+            print(f"✓ Imported: {name} (ID: {sid}) → {uid}")
+        else:
+            print(f"✓ Imported: {name} (ID: {sid})")
+
+
+def sync_roster(csv_file, dry_run=False):
+    """
+    Make the database match a complete roster, touching only what changed.
+    
+    The roster is authoritative: every name on it ends up as a student, every
+    UID on it ends up as an active card of the student it is listed under, and
+    the active cards of students missing from the roster are revoked. A
+    student listed with one or more UIDs also loses any other active card
+    (the card was replaced). Students are never deleted, so balances and
+    history stay intact; a departed student simply has no usable card.
+    
+    The roster is hash-joined against full scans of students and cards, the
+    delta is printed as a diff, and (unless dry_run) applied in one transaction.
+    A student may appear on several rows to list several cards.
+    
+    Args:
+        csv_file: Path to roster CSV (name column, optional uid column)
+        dry_run: If True, print the diff without applying it
+    """
+    if not Path(csv_file).exists():
+        print(f"Error: File '{csv_file}' not found")
+        return False
+    
+    try:
+        roster, has_uid_column, errors = read_roster(csv_file)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return False
+    except Exception as e:
+        print(f"Error reading CSV: {e}")
+        return False
+    
+    if errors:
+        # A dropped row would read as a departed student, so never sync a partial roster
+        print(f"Roster has {len(errors)} error(s); nothing was changed:")
+        for error in errors:
+            print(f"  - {error}")
+        return False
+    if not roster:
+        print("Roster is empty; refusing to revoke every card")
+        return False
+    
+    print(f"Roster: {len(roster)} students{' with card UIDs' if has_uid_column else ''}")
+    if dry_run:
+        print("\n=== DRY RUN MODE - No changes will be made ===\n")
+    
+    con = sqlite3.connect(DB)
+    con.execute("PRAGMA foreign_keys=ON;")
+    con.execute("PRAGMA busy_timeout=5000;")
+    cur = con.cursor()
+    
+    try:
+        if not dry_run:
+            cur.execute("BEGIN IMMEDIATE;")
+        students = dict(cur.execute("SELECT name, id FROM students"))
+        cards = {uid: (sid, status) for uid, sid, status in cur.execute(
+            "SELECT card_uid, student_id, status FROM cards"
+        )}
+        diff = diff_roster(roster, students, cards)
+        if not dry_run:
+            apply_roster_diff(cur, diff)
+        print_roster_diff(diff, students, dry_run)
+        
+        if not dry_run:
+            con.commit()
+            if diff.changes:
+                print("\nChanges committed to database")
+    
+    except Exception as e:
+        con.rollback()
+        print(f"\nDatabase error: {e}")
+        print("Changes rolled back")
+        return False
+    finally:
+        con.close()
+    
+    print(f"\n{'='*60}")
+    print("Sync Summary:")
+    print(f"  {'Would add' if dry_run else 'Added'} students: {len(diff.add_students)}")
+    print(f"  {'Would add' if dry_run else 'Added'} cards: {len(diff.add_cards)}")
+    print(f"  {'Would reassign' if dry_run else 'Reassigned'} cards: {len(diff.reassign)}")
+    print(f"  {'Would reactivate' if dry_run else 'Reactivated'} cards: {len(diff.reactivate)}")
+    print(f"  {'Would revoke' if dry_run else 'Revoked'} cards: {len(diff.revoke)}")
+    print(f"  {'Would deactivate' if dry_run else 'Deactivated'} students (left roster): {len(diff.deactivated)}")
+    print(f"  Unchanged students: {diff.unchanged}")
+    print(f"{'='*60}")
+    
+    return True
+
+
+def read_roster(csv_file):
+    """
+    Read a roster CSV into {name: [uid, ...]} (CSV order, UIDs de-duplicated).
+    
+    Returns:
+        (roster, has_uid_column, validation errors)
+    
+    Raises:
+        ValueError: if the CSV has no 'name' column
+    """
+    roster = {}
+    uid_owner = {}
+    errors = []
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        if not reader.fieldnames or 'name' not in reader.fieldnames:
+            raise ValueError(f"CSV must have a 'name' column (found: {', '.join(reader.fieldnames or [])})")
+        has_uid_column = 'uid' in reader.fieldnames
+        for row_num, row in enumerate(reader, start=2):
+            entry, error = parse_row(row_num, row, has_uid_column)
+            if error:
+                errors.append(error)
+                continue
+            _, name, uid = entry
+            uids = roster.setdefault(name, [])
+            if not uid:
+                continue
+            owner = uid_owner.setdefault(uid, name)
+            if owner != name:
+                errors.append(f"Row {row_num} ({name}): Card UID {uid} is also listed for {owner}")
+            elif uid not in uids:
+                uids.append(uid)
+    return roster, has_uid_column, errors
+
+
+class RosterDiff:
+    """
+    The changes that bring students and cards in line with a roster.
+
+    Student references are existing IDs, or names for add_students entries.
+    """
+    def __init__(self):
+        self.add_students = []   # names
+        self.add_cards = []      # (uid, student ID or new name)
+        self.reassign = []       # (uid, from student ID, to student ID or new name)
+        self.reactivate = []     # (uid, student ID)
+        self.revoke = []         # (uid, student ID, reason)
+        self.unchanged = 0       # roster students left untouched
+        self.new_ids = {}        # new name -> student ID, filled in by apply_roster_diff
+
+    @property
+    def deactivated(self):
+        """Students losing their last active card because they left the roster"""
+        return {sid for _, sid, reason in self.revoke if reason == "not on roster"}
+
+    @property
+    def changes(self):
+        return (len(self.add_students) + len(self.add_cards) + len(self.reassign)
+                + len(self.reactivate) + len(self.revoke))
+
+
+def diff_roster(roster, students, cards):
+    """
+    Work out the delta between a roster and the database in one pass over each.
+    
+    Args:
+        roster: {name: [uid, ...]} from read_roster
+        students: {name: student ID} for every student
+        cards: {uid: (student ID, status)} for every card
+    """
+    diff = RosterDiff()
+    listed_for = {}   # uid -> student ID or new name it is listed under
+    keep_cards = {}   # student ID -> whether the roster lists their cards
+    for name, uids in roster.items():
+        student = students.get(name, name)
+        if name not in students:
+            diff.add_students.append(name)
+        else:
+            keep_cards[student] = bool(uids)
+        for uid in uids:
+            listed_for[uid] = student
+    
+    changed = set()
+    for uid, student in listed_for.items():
+        card = cards.get(uid)
+        if card is None:
+            diff.add_cards.append((uid, student))
+        elif card[0] != student:
+            diff.reassign.append((uid, card[0], student))
+            changed.update((card[0], student))
+        elif card[1] != 'active':
+            diff.reactivate.append((uid, student))
+        else:
+            continue
+        changed.add(student)
+    
+    for uid, (sid, status) in cards.items():
+        if status != 'active' or uid in listed_for:
+            continue
+        if sid not in keep_cards:
+            diff.revoke.append((uid, sid, "not on roster"))
+        elif keep_cards[sid]:
+            diff.revoke.append((uid, sid, "replaced"))
+        else:
+            continue
+        changed.add(sid)
+    
+    diff.unchanged = sum(1 for sid in keep_cards if sid not in changed)
+    diff.revoke.sort(key=lambda change: (change[1], change[0]))
+    return diff
+
+
+def apply_roster_diff(cur, diff):
+    """Apply a RosterDiff with executemany (inside the caller's transaction)"""
+    if diff.add_students:
+        diff.new_ids = insert_students(cur, diff.add_students)
+    def student_id(student):
+        return diff.new_ids[student] if isinstance(student, str) else student
+    
+    if diff.revoke:
+        cur.executemany(
+            "UPDATE cards SET status = 'revoked' WHERE card_uid = ?",
+            [(uid,) for uid, _, _ in diff.revoke]
+        )
+    if diff.reassign:
+        cur.executemany(
+            "UPDATE cards SET student_id = ?, status = 'active', issued_at = datetime('now') WHERE card_uid = ?",
+            [(student_id(to), uid) for uid, _, to in diff.reassign]
+        )
+    if diff.reactivate:
+        cur.executemany(
+            "UPDATE cards SET status = 'active' WHERE card_uid = ?",
+            [(uid,) for uid, _ in diff.reactivate]
+        )
+    if diff.add_cards:
+        cur.executemany(
+            "INSERT INTO cards(card_uid, student_id, status) VALUES (?, ?, 'active')",
+            [(uid, student_id(student)) for uid, student in diff.add_cards]
+        )
+
+
+def print_roster_diff(diff, students, dry_run):
+    """Diff report: + additions, ~ card moves, - revocations"""
+    names = {sid: name for name, sid in students.items()}
+    def who(student):
+        if isinstance(student, str):
+            sid = diff.new_ids.get(student)
+            return f"{student} (new{'' if sid is None else f', ID: {sid}'})"
+        return f"{names.get(student, '?')} (ID: {student})"
+    
+    prefix = "[DRY RUN] " if dry_run else ""
+    for name in diff.add_students:
+        print(f"{prefix}+ Add student: {who(name)}")
+    for uid, student in diff.add_cards:
+        print(f"{prefix}+ Add card {uid} → {who(student)}")
+    for uid, old, new in diff.reassign:
+        print(f"{prefix}~ Reassign card {uid}: {who(old)} → {who(new)}")
+    for uid, student in diff.reactivate:
+        print(f"{prefix}~ Reactivate card {uid} → {who(student)}")
+    for uid, student, reason in diff.revoke:
+        print(f"{prefix}- Revoke card {uid}: {who(student)} ({reason})")
+    if not diff.changes:
+        print("Database already matches the roster")
+
+
 def generate_template(output_file, include_uid=False):
     """Generate a template CSV file"""
     with open(output_file, 'w', encoding='utf-8') as f:
@@ -274,6 +838,13 @@ Examples:
   
   # Fail on duplicate names instead of skipping
   python batch_import_students.py --no-skip-duplicates students.csv
+  
+  # Preview, then apply, a term roster refresh (revokes cards of departed students)
+  python batch_import_students.py --sync --dry-run roster.csv
+  python batch_import_students.py --sync roster.csv
+  
+  # Stream a district-wide roster, committing every 5000 rows (resumable)
+  python batch_import_students.py --stream --chunk-size 5000 district.csv
 
 CSV Format:
   Basic format (name only):
@@ -313,6 +884,31 @@ CSV Format:
         action='store_true',
         help='Fail on duplicate names instead of skipping them'
     )
+    parser.add_argument(
+        '--sync',
+        action='store_true',
+        help='Treat the CSV as the complete roster: add, reassign and revoke to match it'
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Stream the CSV and commit in chunks, with a resumable checkpoint'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f'Rows per transaction in --stream mode (default: {DEFAULT_CHUNK_SIZE})'
+    )
+    parser.add_argument(
+        '--checkpoint',
+        help='Checkpoint file for --stream (default: <csv_file>.checkpoint)'
+    )
+    parser.add_argument(
+        '--restart',
+        action='store_true',
+        help='Ignore an existing --stream checkpoint and start from the first row'
+    )
     
     args = parser.parse_args()
     
@@ -320,11 +916,27 @@ CSV Format:
         generate_template(args.csv_file, include_uid=args.with_uid)
         return
     
-    success = batch_import_students(
-        args.csv_file,
-        skip_duplicates=not args.no_skip_duplicates,
-        dry_run=args.dry_run
-    )
+    if args.sync:
+        if args.stream or args.no_skip_duplicates:
+            parser.error("--sync cannot be combined with --stream or --no-skip-duplicates")
+        success = sync_roster(args.csv_file, dry_run=args.dry_run)
+    elif args.stream:
+        if args.chunk_size < 1:
+            parser.error("--chunk-size must be at least 1")
+        success = stream_import_students(
+            args.csv_file,
+            skip_duplicates=not args.no_skip_duplicates,
+            dry_run=args.dry_run,
+            chunk_size=args.chunk_size,
+            checkpoint_path=args.checkpoint,
+            restart=args.restart
+        )
+    else:
+        success = batch_import_students(
+            args.csv_file,
+            skip_duplicates=not args.no_skip_duplicates,
+            dry_run=args.dry_run
+        )
     
     sys.exit(0 if success else 1)
 
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Charge-path benchmark and race-condition stress test.
+
+Builds a synthetic database, hammers pos.charge_by_uid from N processes x M
+threads (each like one POS lane), reports throughput and latency percentiles,
+then checks the ledger invariants:
+
+- every balance equals the sum of its transactions
+- overdraft_weeks.used never exceeds max_overdraft_week
+- overdraft_weeks.used equals the overpay recorded on the DEBIT rows
+- the charges workers saw approved are exactly the DEBIT rows written
+
+Exit code is 0 only if every invariant holds, so it can gate a deploy.
+
+Usage:
+    python bench_charges.py                          # 4 processes x 2 threads, 10s
+    python bench_charges.py --processes 8 --threads 4 --duration 30
+    python bench_charges.py --students 5 --balance 10 # few, poor accounts: maximum overdraft contention
+    python bench_charges.py --ledger --group-commit   # through a ledger_daemon started on the synthetic database
+"""
+
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pos
+
+SCHEMA_FILE = Path(__file__).resolve().parent / "migrations" / "schema.sql"
+LEDGER_DAEMON = Path(__file__).resolve().parent / "ledger_daemon.py"
+STAFF = "bench"
+
+
+def build_database(path: str, students: int, balance_tenths: int, max_overdraft_tenths: int) -> list[str]:
+    """Create a fresh synthetic database; returns the active card UIDs"""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA journal_mode=WAL;")
+    con.execute("PRAGMA foreign_keys=ON;")
+    with open(SCHEMA_FILE, "r", encoding="utf-8") as f:
+        con.executescript(f.read())
+
+    uids = [f"BE{n:06X}" for n in range(students)]
+    con.executemany("INSERT INTO students(id, name) VALUES (?, ?)",
+                    [(n + 1, f"Bench Student {n + 1}") for n in range(students)])
+    con.executemany("INSERT INTO accounts(student_id, balance, max_overdraft_week) VALUES (?, ?, ?)",
+                    [(n + 1, balance_tenths, max_overdraft_tenths) for n in range(students)])
+    con.executemany("INSERT INTO cards(card_uid, student_id) VALUES (?, ?)",
+                    [(uid, n + 1) for n, uid in enumerate(uids)])
+    # Opening balances as top-ups, so balance == SUM(amount) holds from the start
+    con.executemany("""INSERT INTO transactions(student_id, card_uid, type, amount, description, staff)
+                       VALUES (?, ?, 'TOPUP', ?, 'bench opening balance', 'bench-setup')""",
+                    [(n + 1, uid, balance_tenths) for n, uid in enumerate(uids) if balance_tenths])
+    con.commit()
+    con.close()
+    return uids
+
+
+def start_ledger_daemon(db: str, socket_path: str, group_commit: bool) -> subprocess.Popen:
+    """Start ledger_daemon.py on the synthetic database and wait for its socket"""
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    command = [sys.executable, str(LEDGER_DAEMON), "--db", db, "--socket", socket_path]
+    if group_commit:
+        command.append("--group-commit")
+    daemon = subprocess.Popen(command)
+    for _ in range(100):
+        if os.path.exists(socket_path) or daemon.poll() is not None:
+            break
+        time.sleep(0.1)
+    if not os.path.exists(socket_path):
+        daemon.terminate()
+        raise RuntimeError("ledger daemon did not start")
+    return daemon
+
+
+def charge_worker(args: dict, uids: list[str], seed: int, deadline: float, results: list):
+    """One lane: charge random cards until the deadline, recording latency and outcome"""
+    rng = random.Random(seed)
+    latencies = []
+    approved, declined, unknown, errors, outcome_unknown = 0, 0, 0, 0, 0
+    failed_after_send = ()
+
+    if args["ledger_socket"]:
+        from ledger_daemon import LedgerClient, LedgerOutcomeUnknown
+        failed_after_send = (LedgerOutcomeUnknown,)
+        ledger = LedgerClient(args["ledger_socket"])
+        charge = lambda uid: ledger.charge(uid, args["price"], STAFF)
+        close = ledger.close
+    else:
+        con = pos.connect(args["db"])
+        card_cache = pos.CardCache() if args["cache"] else None
+        charge = lambda uid: pos.charge_by_uid(uid, args["price"], STAFF, con=con, card_cache=card_cache)
+        close = con.close
+
+    try:
+        while time.time() < deadline and (not args["charges"] or len(latencies) < args["charges"]):
+            uid = f"FF{rng.randrange(1 << 24):06X}" if rng.random() < args["unknown_rate"] else rng.choice(uids)
+            started = time.perf_counter()
+            try:
+                ok, msg = charge(uid)
+            except (sqlite3.Error, OSError) as e:
+                errors += 1
+                print(f"[BENCH] Charge error: {e}")
+                continue
+            except failed_after_send as e:
+                # The daemon may or may not have committed it (see check_invariants)
+                outcome_unknown += 1
+                print(f"[BENCH] Charge outcome unknown: {e}")
+                continue
+            latencies.append(time.perf_counter() - started)
+            if ok:
+                approved += 1
+            elif msg == "Unknown/inactive card":
+                unknown += 1
+            else:
+                declined += 1
+    finally:
+        close()
+
+    results.append({"latencies": latencies, "approved": approved, "declined": declined,
+                    "unknown": unknown, "errors": errors, "outcome_unknown": outcome_unknown})
+
+
+def process_worker(args: dict, uids: list[str], worker: int, deadline: float) -> list[dict]:
+    """One process running args['threads'] lanes"""
+    results = []
+    threads = [
+        threading.Thread(target=charge_worker, args=(args, uids, worker * 1000 + n, deadline, results))
+        for n in range(args["threads"])
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list (0 for an empty list): the
+    smallest value with at least pct% of the values at or below it. Also used by
+    tap-broadcaster.py --bench, so both report p50/p99 the same way.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values), max(1, math.ceil(pct * len(sorted_values) / 100)))
+    return sorted_values[rank - 1]
+
+
+def check_invariants(path: str, approved: int, outcome_unknown: int = 0) -> list[str]:
+    """
+    Return a description of every violated invariant (empty if the ledger is consistent).
+    Each charge whose outcome is unknown may or may not have written its DEBIT.
+    """
+    con = sqlite3.connect(path)
+    failures = []
+
+    for sid, balance, total in con.execute("""
+            SELECT a.student_id, a.balance, COALESCE(SUM(t.amount), 0)
+            FROM accounts a LEFT JOIN transactions t ON t.student_id = a.student_id
+            GROUP BY a.student_id HAVING a.balance != COALESCE(SUM(t.amount), 0)"""):
+        failures.append(f"student {sid}: balance {balance / 10:.1f} != transaction sum {total / 10:.1f}")
+
+    for sid, week, used, max_ov in con.execute("""
+            SELECT o.student_id, o.week_start_utc, o.used, a.max_overdraft_week
+            FROM overdraft_weeks o JOIN accounts a ON a.student_id = o.student_id
+            WHERE o.used > a.max_overdraft_week"""):
+        failures.append(f"student {sid}: overpay used {used / 10:.1f} > weekly limit {max_ov / 10:.1f} (week {week})")
+
+    for sid, used, recorded in con.execute("""
+            SELECT a.student_id,
+                   (SELECT COALESCE(SUM(used), 0) FROM overdraft_weeks WHERE student_id = a.student_id),
+                   (SELECT COALESCE(SUM(overdraft_component), 0) FROM transactions
+                    WHERE student_id = a.student_id AND type = 'DEBIT')
+            FROM accounts a"""):
+        if used != recorded:
+            failures.append(f"student {sid}: overdraft_weeks.used {used / 10:.1f} != DEBIT overpay {recorded / 10:.1f}")
+
+    debits = con.execute("SELECT COUNT(*) FROM transactions WHERE type = 'DEBIT' AND staff = ?", (STAFF,)).fetchone()[0]
+    if not approved <= debits <= approved + outcome_unknown:
+        failures.append(f"{approved} charges approved ({outcome_unknown} outcome unknown) but {debits} DEBIT rows written")
+
+    con.close()
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark pos.charge_by_uid under concurrency and check ledger invariants")
+    ap.add_argument("--db", default="stuco-bench.db", help="synthetic database to create (default: stuco-bench.db)")
+    ap.add_argument("--force", action="store_true", help="overwrite --db if it already exists")
+    ap.add_argument("--processes", type=int, default=4, help="worker processes (default: 4)")
+    ap.add_argument("--threads", type=int, default=2, help="charging threads per process (default: 2)")
+    ap.add_argument("--duration", type=float, default=10, help="seconds to charge for (default: 10)")
+    ap.add_argument("--charges", type=int, default=0, help="stop each thread after this many charges (default: no limit)")
+    ap.add_argument("--students", type=int, default=200, help="synthetic students with one card each (default: 200)")
+    ap.add_argument("--balance", type=float, default=50, help="opening balance per student in CNY (default: 50)")
+    ap.add_argument("--max-overdraft", type=float, default=20, help="weekly overpay limit in CNY (default: 20)")
+    ap.add_argument("--price", type=float, default=5.5, help="price per charge in CNY (default: 5.5)")
+    ap.add_argument("--unknown-rate", type=float, default=0.05, help="fraction of taps with an unknown card (default: 0.05)")
+    ap.add_argument("--cache", action="store_true", help="use pos.CardCache in each worker, as pos.py does")
+    ap.add_argument("--ledger", action="store_true", help="charge through ledger_daemon.py, started on the synthetic database")
+    ap.add_argument("--group-commit", action="store_true", help="start the ledger daemon with --group-commit (implies --ledger)")
+    args = ap.parse_args()
+
+    if os.path.exists(args.db) and not args.force:
+        print(f"{args.db} already exists; pass --force to overwrite it (never point this at the live database)")
+        sys.exit(1)
+    if args.processes < 1 or args.threads < 1 or args.students < 1:
+        print("--processes, --threads and --students must be at least 1")
+        sys.exit(1)
+
+    uids = build_database(args.db, args.students, round(args.balance * 10), round(args.max_overdraft * 10))
+    print(f"[BENCH] Synthetic database {os.path.abspath(args.db)}: {args.students} students, "
+          f"¥{args.balance:.1f} each, ¥{args.max_overdraft:.1f}/week overpay")
+    ledger = args.ledger or args.group_commit
+    path = "group-commit ledger daemon" if args.group_commit else "ledger daemon" if ledger else \
+        "card cache" if args.cache else "direct"
+    print(f"[BENCH] {args.processes} process(es) x {args.threads} thread(s), ¥{args.price:.1f} per charge, "
+          f"{path}, {args.duration:.0f}s")
+
+    socket_path = os.path.abspath(args.db) + ".sock"
+    daemon = start_ledger_daemon(args.db, socket_path, args.group_commit) if ledger else None
+    worker_args = {
+        "db": args.db, "price": args.price, "charges": args.charges, "threads": args.threads,
+        "unknown_rate": args.unknown_rate, "cache": args.cache, "ledger_socket": socket_path if ledger else None,
+    }
+    try:
+        started = time.time()
+        deadline = started + args.duration
+        with multiprocessing.Pool(args.processes) as pool:
+            per_process = pool.starmap(process_worker, [(worker_args, uids, n, deadline) for n in range(args.processes)])
+        elapsed = time.time() - started
+    finally:
+        if daemon is not None:
+            daemon.terminate()
+            daemon.wait()
+
+    results = [result for process in per_process for result in process]
+    latencies = sorted(latency for result in results for latency in result["latencies"])
+    approved = sum(result["approved"] for result in results)
+    declined = sum(result["declined"] for result in results)
+    unknown = sum(result["unknown"] for result in results)
+    errors = sum(result["errors"] for result in results)
+    outcome_unknown = sum(result["outcome_unknown"] for result in results)
+
+    print(f"\n[BENCH] Charges:    {len(latencies)} in {elapsed:.1f}s ({len(latencies) / elapsed:.0f}/s)")
+    print(f"[BENCH] Approved:   {approved} ({approved / elapsed:.0f}/s)")
+    print(f"[BENCH] Declined:   {declined} (overpay limit)")
+    print(f"[BENCH] Unknown:    {unknown}")
+    print(f"[BENCH] Errors:     {errors}")
+    if outcome_unknown:
+        print(f"[BENCH] Outcome unknown: {outcome_unknown} (ledger connection failed after sending)")
+    print(f"[BENCH] Latency:    p50 {percentile(latencies, 50) * 1000:.1f}ms  "
+          f"p90 {percentile(latencies, 90) * 1000:.1f}ms  p99 {percentile(latencies, 99) * 1000:.1f}ms  "
+          f"max {(latencies[-1] if latencies else 0) * 1000:.1f}ms")
+
+    failures = check_invariants(args.db, approved, outcome_unknown)
+    if failures:
+        print(f"\n[BENCH] ✗ {len(failures)} invariant violation(s):")
+        for failure in failures[:20]:
+            print(f"  - {failure}")
+        if len(failures) > 20:
+            print(f"  ... and {len(failures) - 20} more")
+        sys.exit(1)
+    print("\n[BENCH] ✓ Invariants hold: balances match transactions, overpay within weekly limits")
+    if errors or outcome_unknown:
+        if errors:
+            print(f"[BENCH] ✗ {errors} charge(s) failed with an error (lock timeouts?)")
+        if outcome_unknown:
+            print(f"[BENCH] ✗ {outcome_unknown} charge(s) lost their ledger connection after sending")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Ledger daemon - resident charge / top-up / balance service.
+
+Keeps a pool of warm SQLite connections (PRAGMAs applied once, prepared
+statements cached by the sqlite3 module per connection) and serves them over
+a Unix-domain socket, so a charge costs one round trip instead of a Python
+start-up plus a fresh connection. Active cards are held in a pos.CardCache,
+so unknown or revoked cards are declined without taking the write lock, and
+cart prices come from an in-memory pos.ProductCatalog.
+
+Protocol: one JSON object per line in each direction.
+
+    -> {"op": "charge", "uid": "DEADBEEF", "price": 6.5, "staff": "pos"}
+    <- {"ok": true, "message": "Charged ¥6.5 (overpay used ¥0.0). New balance: ¥43.5. TX ID: 42"}
+
+    -> {"op": "charge_cart", "uid": "DEADBEEF", "items": [["drink", 2], ["chips", 1]], "staff": "pos"}
+    <- {"ok": true, "message": "Charged ¥14.0 for 3 item(s) (overpay used ¥0.0). New balance: ¥36.0. TX ID: 43"}
+
+    -> {"op": "topup", "uid": "DEADBEEF", "amount": 20.0, "staff": "admin"}
+    -> {"op": "balance", "uid": "DEADBEEF"}
+    <- {"ok": true, "message": "...", "balance": 43.5, "overpay_left": 20.0}
+
+    -> {"op": "stats"}
+    <- {"ok": true, "message": "...", "card_cache": {"hits": ..., "hit_rate": ...}, ...}
+
+An optional "id" in a request is echoed back. Messages are the same ones
+pos.py and topup.py print.
+
+With --group-commit, charges and top-ups from every client go through one
+writer thread that applies them in batches, each request in its own
+SAVEPOINT, with a single COMMIT per batch (a few milliseconds of requests).
+Lanes then stop fighting over the SQLite write lock; each caller still gets
+its own result, and only after the batch has committed.
+
+Usage:
+    python ledger_daemon.py                       # socket: stuco-ledger.sock
+    python ledger_daemon.py --socket /run/stuco/ledger.sock --pool-size 4
+    python ledger_daemon.py --group-commit --commit-window-ms 3
+    STUCO_LEDGER_SOCKET=/run/stuco/ledger.sock python pos.py 6.5 --simulate
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import queue
+import select
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+import pos
+import topup as topup_cli
+
+DEFAULT_SOCKET = "stuco-ledger.sock"
+
+
+class ConnectionPool:
+    """Fixed set of open SQLite connections shared by the worker threads"""
+
+    def __init__(self, path: str, size: int, card_cache: Optional[pos.CardCache] = None,
+                 catalog: Optional[pos.ProductCatalog] = None):
+        self.card_cache = card_cache
+        self.catalog = catalog
+        self._idle = queue.Queue()
+        for _ in range(size):
+            con = sqlite3.connect(path, check_same_thread=False)
+            con.execute("PRAGMA foreign_keys=ON;")
+            con.execute("PRAGMA busy_timeout=5000;")
+            self._idle.put(con)
+        self.size = size
+
+    @contextmanager
+    def connection(self):
+        con = self._idle.get()
+        try:
+            yield con
+        finally:
+            # Never hand out a connection with a transaction left open by a failed request
+            if con.in_transaction:
+                con.rollback()
+            self._idle.put(con)
+
+    def close(self):
+        for _ in range(self.size):
+            self._idle.get().close()
+
+
+def balance_by_uid(uid_hex: str, con) -> tuple[bool, str, dict]:
+    """Balance and remaining weekly overpay for a card"""
+    cur = con.cursor()
+    card = cur.execute("""SELECT c.student_id, a.balance, a.max_overdraft_week
+                          FROM cards c JOIN accounts a ON a.student_id=c.student_id
+                          WHERE c.card_uid=? AND c.status='active'""", (uid_hex,)).fetchone()
+    if not card:
+        return False, "Unknown/inactive card", {}
+
+    sid, bal_tenths, max_ov_tenths = card
+    used_tenths = pos.overdraft_used_this_week(cur, sid, pos.week_start_utc(datetime.now(timezone.utc)))
+    remaining_ov_tenths = max(0, max_ov_tenths - used_tenths)
+    balance, overpay_left = bal_tenths / 10.0, remaining_ov_tenths / 10.0
+    return True, f"Balance: ¥{balance:.1f} (overpay left this week ¥{overpay_left:.1f})", {
+        "balance": balance,
+        "overpay_left": overpay_left,
+    }
+
+
+WRITE_OPS = ("charge", "charge_cart", "topup")
+
+
+def _cart_items(request: dict) -> list:
+    """[[sku, qty], ...] from a charge_cart request"""
+    return [(str(sku), int(qty)) for sku, qty in request["items"]]
+
+
+def _amount(request: dict, key: str) -> float:
+    """request[key] as a float, rejected before it reaches SQLite if it is not finite or out of range"""
+    value = float(request[key])
+    if not math.isfinite(value) or abs(value) > topup_cli.MAX_AMOUNT:
+        raise ValueError(f"{key} out of range: {request[key]!r}")
+    return value
+
+
+def _response(request: dict, ok: bool, message: str, **extra) -> dict:
+    response = {"ok": ok, "message": message, **extra}
+    if "id" in request:
+        response["id"] = request["id"]
+    return response
+
+
+def handle_request(pool: ConnectionPool, request: dict) -> dict:
+    """Run one request on a pooled connection (called in a worker thread)"""
+    op = request.get("op")
+    uid = str(request.get("uid", "")).strip().upper()
+    extra = {}
+    try:
+        with pool.connection() as con:
+            if op == "charge":
+                ok, message = pos.charge_by_uid(uid, _amount(request, "price"), request.get("staff", "pos"),
+                                                con=con, card_cache=pool.card_cache)
+            elif op == "charge_cart":
+                ok, message = pos.charge_cart_by_uid(uid, _cart_items(request), request.get("staff", "pos"),
+                                                     con=con, card_cache=pool.card_cache, catalog=pool.catalog)
+            elif op == "topup":
+                ok, message = topup_cli.topup(uid, _amount(request, "amount"), request.get("staff", "admin"), con=con)
+            elif op == "balance":
+                ok, message, extra = balance_by_uid(uid, con)
+            else:
+                ok, message = False, f"Unknown op: {op!r}"
+    except (KeyError, TypeError, ValueError) as e:
+        ok, message = False, f"Bad request: {e}"
+    except sqlite3.Error as e:
+        print(f"[ERROR] {op} {uid}: {e}")
+        ok, message = False, f"Database error: {e}"
+    except Exception as e:
+        print(f"[ERROR] {op} {uid}: {e!r}")
+        ok, message = False, f"Internal error: {e}"
+
+    return _response(request, ok, message, **extra)
+
+
+class GroupCommitWriter:
+    """
+    Single writer thread that group-commits charges and top-ups.
+
+    Requests queue up while the previous batch commits. The writer takes the
+    first waiting request, gathers more for up to `window` seconds (or
+    `max_batch` requests), then runs them in order in one BEGIN IMMEDIATE
+    transaction: each in its own SAVEPOINT through the same charge / top-up
+    logic as the CLIs, so a failing request is rolled back alone. Results are
+    handed back only after the COMMIT; if the COMMIT fails, every request in
+    the batch gets an error.
+    """
+
+    def __init__(self, path: str, window: float = 0.003, max_batch: int = 64,
+                 card_cache: Optional[pos.CardCache] = None, catalog: Optional[pos.ProductCatalog] = None):
+        self.card_cache = card_cache
+        self.catalog = catalog
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        # Autocommit mode: the writer issues BEGIN / SAVEPOINT / COMMIT itself
+        self._con = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._con.execute("PRAGMA foreign_keys=ON;")
+        self._con.execute("PRAGMA busy_timeout=5000;")
+        self._thread = threading.Thread(target=self._run, name="ledger-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, request: dict) -> Future:
+        future = Future()
+        self._queue.put((request, future))
+        return future
+
+    def close(self):
+        """Finish queued requests, then stop the writer"""
+        self._queue.put(None)
+        self._thread.join()
+        self._con.close()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _apply(self, cur, request: dict) -> dict:
+        op = request.get("op")
+        uid = str(request.get("uid", "")).strip().upper()
+        if op == "charge":
+            ok, message = pos.charge_in_transaction(cur, uid, _amount(request, "price"), request.get("staff", "pos"),
+                                                    self.card_cache)
+        elif op == "charge_cart":
+            ok, message = pos.cart_in_transaction(cur, uid, _cart_items(request), request.get("staff", "pos"),
+                                                  self.card_cache, self.catalog)
+        else:
+            ok, message = topup_cli.topup_in_transaction(cur, uid, _amount(request, "amount"), request.get("staff", "admin"))
+        return _response(request, ok, message)
+
+    def _commit(self, batch: list):
+        """
+        Run one batch. Never raises: whatever happens, the transaction is closed
+        and every future gets a response (per-request results only if the COMMIT
+        went through), so one bad request cannot stop the writer thread.
+        """
+        cur = self._con.cursor()
+        results = {}
+        committed = False
+        error = "Database error: group commit aborted"
+        try:
+            cur.execute("BEGIN IMMEDIATE;")
+            for request, future in batch:
+                cur.execute("SAVEPOINT request;")
+                try:
+                    response = self._apply(cur, request)
+                except (KeyError, TypeError, ValueError) as e:
+                    cur.execute("ROLLBACK TO request;")
+                    response = _response(request, False, f"Bad request: {e}")
+                except sqlite3.Error as e:
+                    print(f"[ERROR] {request.get('op')} {request.get('uid')}: {e}")
+                    cur.execute("ROLLBACK TO request;")
+                    response = _response(request, False, f"Database error: {e}")
+                except Exception as e:
+                    print(f"[ERROR] {request.get('op')} {request.get('uid')}: {e!r}")
+                    cur.execute("ROLLBACK TO request;")
+                    response = _response(request, False, f"Internal error: {e}")
+                cur.execute("RELEASE request;")
+                results[future] = response
+            cur.execute("COMMIT;")
+            committed = True
+        except Exception as e:
+            print(f"[ERROR] Group commit of {len(batch)} request(s) failed: {e!r}")
+            error = f"Database error: {e}" if isinstance(e, sqlite3.Error) else f"Internal error: {e}"
+        finally:
+            if self._con.in_transaction:
+                try:
+                    self._con.rollback()
+                except sqlite3.Error as e:
+                    print(f"[ERROR] Rollback after failed group commit: {e}")
+            self.batches += 1
+            self.requests += len(batch)
+            for request, future in batch:
+                future.set_result(results[future] if committed else _response(request, False, error))
+
+
+def stats(pool: ConnectionPool, writer_thread: Optional[GroupCommitWriter]) -> dict:
+    result = {}
+    if pool.card_cache is not None:
+        result["card_cache"] = pool.card_cache.stats()
+    if pool.catalog is not None:
+        result["catalog"] = pool.catalog.stats()
+    if writer_thread is not None:
+        result["group_commit"] = {"requests": writer_thread.requests, "batches": writer_thread.batches}
+    return result
+
+
+async def serve(socket_path: str, pool: ConnectionPool, stop: asyncio.Event,
+                writer_thread: Optional[GroupCommitWriter] = None):
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="ledger")
+
+    async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                except ValueError as e:
+                    response = {"ok": False, "message": f"Bad request: {e}"}
+                else:
+                    if request.get("op") == "stats":
+                        response = _response(request, True, "stats", **stats(pool, writer_thread))
+                    elif writer_thread is not None and request.get("op") in WRITE_OPS:
+                        response = await asyncio.wrap_future(writer_thread.submit(request))
+                    else:
+                        response = await loop.run_in_executor(executor, handle_request, pool, request)
+                writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)  # stale socket from a previous run
+    server = await asyncio.start_unix_server(handle_client, path=socket_path)
+    os.chmod(socket_path, 0o660)
+    mode = f", group commit every {writer_thread.window * 1000:g}ms" if writer_thread else ""
+    print(f"[LEDGER] Listening on {socket_path} ({pool.size} connections{mode})")
+
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        executor.shutdown(wait=True)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+class LedgerUnavailable(ConnectionError):
+    """The daemon could not be reached; nothing was sent, so the caller may charge directly"""
+
+
+class LedgerOutcomeUnknown(Exception):
+    """
+    The connection failed after the request was sent. The daemon may already
+    have committed it, so it must not be retried or repeated directly.
+    """
+
+
+class LedgerClient:
+    """
+    Blocking client for ledger_daemon, used by pos.py and topup.py.
+
+    Keeps one socket open across calls and reconnects before sending if the
+    daemon closed it (e.g. restarted). A request is sent at most once: raises
+    LedgerUnavailable when the daemon cannot be reached, LedgerOutcomeUnknown
+    when the connection fails after the request went out.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 10.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._file = sock.makefile("rb")
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = self._file = None
+
+    def _closed_by_daemon(self) -> bool:
+        """An idle socket is only readable if the daemon closed it (replies come only after requests)"""
+        readable, _, _ = select.select([self._sock], [], [], 0)
+        return bool(readable)
+
+    def call(self, request: dict) -> dict:
+        payload = (json.dumps(request) + "\n").encode()
+        if self._sock is not None and self._closed_by_daemon():
+            self.close()
+        if self._sock is None:
+            try:
+                self._connect()
+            except OSError as e:
+                raise LedgerUnavailable(f"cannot reach ledger daemon at {self.socket_path}: {e}") from e
+        try:
+            self._sock.sendall(payload)
+            line = self._file.readline()
+        except OSError as e:
+            self.close()
+            raise LedgerOutcomeUnknown(f"ledger daemon connection failed after the request was sent ({e})") from e
+        if not line:
+            self.close()
+            raise LedgerOutcomeUnknown("ledger daemon closed the connection after the request was sent")
+        return json.loads(line)
+
+    def charge(self, uid_hex: str, price: float, staff: str = "pos") -> tuple[bool, str]:
+        response = self.call({"op": "charge", "uid": uid_hex, "price": price, "staff": staff})
+        return response["ok"], response["message"]
+
+    def charge_cart(self, uid_hex: str, items, staff: str = "pos") -> tuple[bool, str]:
+        response = self.call({"op": "charge_cart", "uid": uid_hex, "items": [list(item) for item in items],
+                              "staff": staff})
+        return response["ok"], response["message"]
+
+    def topup(self, uid_hex: str, amount: float, staff: str = "admin") -> tuple[bool, str]:
+        response = self.call({"op": "topup", "uid": uid_hex, "amount": amount, "staff": staff})
+        return response["ok"], response["message"]
+
+    def balance(self, uid_hex: str) -> dict:
+        return self.call({"op": "balance", "uid": uid_hex})
+
+    def stats(self) -> dict:
+        return self.call({"op": "stats"})
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Resident charge/top-up/balance service over a Unix socket")
+    ap.add_argument("--socket", default=os.getenv("STUCO_LEDGER_SOCKET", DEFAULT_SOCKET),
+                    help=f"Unix socket path (default: {DEFAULT_SOCKET} or $STUCO_LEDGER_SOCKET)")
+    ap.add_argument("--db", default=pos.DB, help=f"SQLite database (default: {pos.DB})")
+    ap.add_argument("--pool-size", type=int, default=int(os.getenv("STUCO_LEDGER_POOL", "4")),
+                    help="Open connections / worker threads (default: 4 or $STUCO_LEDGER_POOL)")
+    ap.add_argument("--no-card-cache", action="store_true",
+                    help="Look every card up in the database instead of the in-process card cache")
+    ap.add_argument("--group-commit", action="store_true",
+                    default=os.getenv("STUCO_LEDGER_GROUP_COMMIT", "").lower() in ("1", "true", "yes"),
+                    help="Send charges and top-ups through one writer thread that commits them in batches "
+                         "(default: off or $STUCO_LEDGER_GROUP_COMMIT)")
+    ap.add_argument("--commit-window-ms", type=float, default=3.0,
+                    help="How long the writer gathers requests into one commit (default: 3)")
+    ap.add_argument("--max-batch", type=int, default=64,
+                    help="Most requests per group commit (default: 64)")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Database not found: {args.db} (run init_db.py first)")
+        sys.exit(1)
+
+    card_cache = None if args.no_card_cache else pos.CardCache()
+    catalog = pos.ProductCatalog()
+    pool = ConnectionPool(args.db, max(1, args.pool_size), card_cache, catalog)
+    writer_thread = None
+    if args.group_commit:
+        writer_thread = GroupCommitWriter(args.db, args.commit_window_ms / 1000.0, max(1, args.max_batch),
+                                          card_cache, catalog)
+
+    async def run():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await serve(args.socket, pool, stop, writer_thread)
+
+    try:
+        asyncio.run(run())
+    finally:
+        if writer_thread is not None:
+            writer_thread.close()
+            print(f"[LEDGER] Group commit: {writer_thread.requests} request(s) in {writer_thread.batches} batch(es)")
+        if card_cache is not None:
+            print(f"[LEDGER] Card cache: {card_cache.stats()}")
+        pool.close()
+        print("[LEDGER] Stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+-- Migration: change counter for in-process card caches (pos.CardCache)
+-- Run this with: ./scripts/run_migration.sh migrate_card_cache_epoch.sql
+--
+-- Triggers bump cache_epochs('cards') whenever a card or a cached account
+-- field changes, so enroll.py, batch_import_students.py and the web app
+-- invalidate every cache without any code of their own. Balance updates do
+-- not bump it.
+
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS cache_epochs (
+  name TEXT PRIMARY KEY,
+  epoch INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO cache_epochs(name, epoch) VALUES ('cards', 0);
+
+CREATE TRIGGER IF NOT EXISTS cards_epoch_insert AFTER INSERT ON cards
+BEGIN
+  UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'cards';
+END;
+
+CREATE TRIGGER IF NOT EXISTS cards_epoch_update AFTER UPDATE ON cards
+BEGIN
+  UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'cards';
+END;
+
+CREATE TRIGGER IF NOT EXISTS cards_epoch_delete AFTER DELETE ON cards
+BEGIN
+  UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'cards';
+END;
+
+CREATE TRIGGER IF NOT EXISTS accounts_epoch_insert AFTER INSERT ON accounts
+BEGIN
+  UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'cards';
+END;
+
+CREATE TRIGGER IF NOT EXISTS accounts_epoch_limit AFTER UPDATE OF max_overdraft_week, student_id ON accounts
+BEGIN
+  UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'cards';
+END;
+
+CREATE TRIGGER IF NOT EXISTS accounts_epoch_delete AFTER DELETE ON accounts
+BEGIN
+  UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'cards';
+END;
+
+COMMIT;
@@ -0,0 +1,40 @@
+-- Migration: indexes for the hot query paths
+-- Run this with: ./scripts/run_migration.sh migrate_hot_path_indexes.sql
+--
+-- Each index backs a real query; audit_query_plans.py runs EXPLAIN QUERY PLAN
+-- over the queries in pos.py, topup.py, batch_import_students.py and
+-- web-next/lib/repositories and flags any that still scan a whole table.
+-- All statements are IF NOT EXISTS, so re-running is harmless.
+
+BEGIN TRANSACTION;
+
+-- Cards of one student, newest first (web student page), and the
+-- ON DELETE CASCADE from students
+CREATE INDEX IF NOT EXISTS idx_cards_student
+  ON cards(student_id, issued_at);
+
+-- Active cards only: CardCache loads and bulk top-ups read just these
+-- columns, so the partial index covers them without touching revoked cards
+CREATE INDEX IF NOT EXISTS idx_cards_active
+  ON cards(card_uid, student_id) WHERE status = 'active';
+
+-- Recent-transactions feed (ORDER BY created_at DESC LIMIT n) and date ranges
+CREATE INDEX IF NOT EXISTS idx_tx_time
+  ON transactions(created_at);
+
+-- Dashboard aggregates by type: weekly top-ups, sales count
+CREATE INDEX IF NOT EXISTS idx_tx_type_time
+  ON transactions(type, created_at);
+
+-- History of one card (lost/stolen card investigations)
+CREATE INDEX IF NOT EXISTS idx_tx_card_time
+  ON transactions(card_uid, created_at);
+
+-- Line items of one product (sales per product, ON DELETE CASCADE from products)
+CREATE INDEX IF NOT EXISTS idx_items_product
+  ON transaction_items(product_id);
+
+-- Give the planner row counts for the new indexes
+ANALYZE;
+
+COMMIT;
@@ -0,0 +1,51 @@
+-- Migration: product catalog and cart line items
+-- Run this with: ./scripts/run_migration.sh migrate_products_catalog.sql
+--
+-- products holds the price list the POS processes cache in memory
+-- (pos.ProductCatalog); a cart charge is one DEBIT transaction plus one
+-- transaction_items row per product. Triggers bump cache_epochs('products')
+-- on every catalog change so cached copies reload.
+
+BEGIN TRANSACTION;
+
+CREATE TABLE IF NOT EXISTS products (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  sku TEXT NOT NULL UNIQUE COLLATE NOCASE,    -- short code typed at the till, e.g. 'drink'
+  name TEXT NOT NULL,
+  price INTEGER NOT NULL CHECK (price > 0),   -- tenths of CNY, e.g., 55 = ¥5.5
+  active INTEGER NOT NULL DEFAULT 1           -- 0 = no longer sold (kept for old line items)
+);
+
+CREATE TABLE IF NOT EXISTS transaction_items (
+  transaction_id INTEGER NOT NULL,
+  product_id INTEGER NOT NULL,
+  quantity INTEGER NOT NULL CHECK (quantity > 0),
+  unit_price INTEGER NOT NULL,                -- tenths of CNY at the time of sale
+  PRIMARY KEY (transaction_id, product_id),
+  FOREIGN KEY(transaction_id) REFERENCES transactions(id) ON DELETE CASCADE,
+  FOREIGN KEY(product_id) REFERENCES products(id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS cache_epochs (
+  name TEXT PRIMARY KEY,
+  epoch INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO cache_epochs(name, epoch) VALUES ('products', 0);
+
+CREATE TRIGGER IF NOT EXISTS products_epoch_insert AFTER INSERT ON products
+BEGIN
+  UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'products';
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_epoch_update AFTER UPDATE ON products
+BEGIN
+  UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'products';
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_epoch_delete AFTER DELETE ON products
+BEGIN
+  UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'products';
+END;
+
+COMMIT;
@@ -45,6 +45,69 @@ CREATE TABLE IF NOT EXISTS overdraft_weeks (
 CREATE INDEX IF NOT EXISTS idx_tx_student_time
   ON transactions(student_id, created_at);
 
+-- Hot-path indexes (migrate_hot_path_indexes.sql; audit with audit_query_plans.py)
+CREATE INDEX IF NOT EXISTS idx_cards_student
+  ON cards(student_id, issued_at);
+CREATE INDEX IF NOT EXISTS idx_cards_active
+  ON cards(card_uid, student_id) WHERE status = 'active';
+CREATE INDEX IF NOT EXISTS idx_tx_time
+  ON transactions(created_at);
+CREATE INDEX IF NOT EXISTS idx_tx_type_time
+  ON transactions(type, created_at);
+CREATE INDEX IF NOT EXISTS idx_tx_card_time
+  ON transactions(card_uid, created_at);
+
+-- Change counter for in-process card caches (pos.CardCache); bumped by the triggers
+-- below whenever a card or an account's overdraft limit changes (not on balance updates)
+CREATE TABLE IF NOT EXISTS cache_epochs (
+  name TEXT PRIMARY KEY,
+  epoch INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO cache_epochs(name, epoch) VALUES ('cards', 0);
+
+CREATE TRIGGER IF NOT EXISTS cards_epoch_insert AFTER INSERT ON cards
+BEGIN UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'cards'; END;
+CREATE TRIGGER IF NOT EXISTS cards_epoch_update AFTER UPDATE ON cards
+BEGIN UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'cards'; END;
+CREATE TRIGGER IF NOT EXISTS cards_epoch_delete AFTER DELETE ON cards
+BEGIN UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'cards'; END;
+CREATE TRIGGER IF NOT EXISTS accounts_epoch_insert AFTER INSERT ON accounts
+BEGIN UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'cards'; END;
+CREATE TRIGGER IF NOT EXISTS accounts_epoch_limit AFTER UPDATE OF max_overdraft_week, student_id ON accounts
+BEGIN UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'cards'; END;
+CREATE TRIGGER IF NOT EXISTS accounts_epoch_delete AFTER DELETE ON accounts
+BEGIN UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'cards'; END;
+
+-- Price catalog (cached by pos.ProductCatalog) and cart line items
+CREATE TABLE IF NOT EXISTS products (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  sku TEXT NOT NULL UNIQUE COLLATE NOCASE,    -- short code typed at the till, e.g. 'drink'
+  name TEXT NOT NULL,
+  price INTEGER NOT NULL CHECK (price > 0),   -- tenths of CNY, e.g., 55 = ¥5.5
+  active INTEGER NOT NULL DEFAULT 1           -- 0 = no longer sold (kept for old line items)
+);
+
+CREATE TABLE IF NOT EXISTS transaction_items (
+  transaction_id INTEGER NOT NULL,
+  product_id INTEGER NOT NULL,
+  quantity INTEGER NOT NULL CHECK (quantity > 0),
+  unit_price INTEGER NOT NULL,                -- tenths of CNY at the time of sale
+  PRIMARY KEY (transaction_id, product_id),
+  FOREIGN KEY(transaction_id) REFERENCES transactions(id) ON DELETE CASCADE,
+  FOREIGN KEY(product_id) REFERENCES products(id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_items_product
+  ON transaction_items(product_id);
+
+INSERT OR IGNORE INTO cache_epochs(name, epoch) VALUES ('products', 0);
+
+CREATE TRIGGER IF NOT EXISTS products_epoch_insert AFTER INSERT ON products
+BEGIN UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'products'; END;
+CREATE TRIGGER IF NOT EXISTS products_epoch_update AFTER UPDATE ON products
+BEGIN UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'products'; END;
+CREATE TRIGGER IF NOT EXISTS products_epoch_delete AFTER DELETE ON products
+BEGIN UPDATE cache_epochs SET epoch = epoch + 1 WHERE name = 'products'; END;
+
 -- Staff user accounts
 CREATE TABLE IF NOT EXISTS users (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -1,4 +1,5 @@
-import argparse, sqlite3, binascii, time
+import argparse, sqlite3, binascii, time, os, threading, queue
+from abc import ABC, abstractmethod
 from datetime import datetime, timedelta, timezone
 try:
     from zoneinfo import ZoneInfo
@@ -8,6 +9,12 @@ except Exception:
 DB = "stuco.db"
 WEEK_TZ = "Asia/Shanghai"  # stable UTC+8, no DST
 
+def connect(path: str = None) -> sqlite3.Connection:
+    con = sqlite3.connect(path or DB)
+    con.execute("PRAGMA foreign_keys=ON;")
+    con.execute("PRAGMA busy_timeout=5000;")
+    return con
+
 def week_start_utc(now_utc: datetime) -> str:
     """Return Monday 00:00 of the current week in Asia/Shanghai, converted to UTC (naive string)."""
     if ZoneInfo is None:
@@ -34,93 +41,437 @@ def add_overdraft_usage(cur, sid: int, week_start: str, delta: int):
                    DO UPDATE SET used = used + excluded.used""",
                 (sid, week_start, delta))
 
-def charge_by_uid(uid_hex: str, price: float, staff="pos"):
-    if price <= 0:
-        return False, "Price must be a positive number."
-    
-    # Convert to tenths (e.g., 5.5 -> 55)
-    price_tenths = round(price * 10)
+# Debit an active card's account, but only if the overpay the charge needs
+# (max(0, price - balance)) fits in the rest of this week's quota
+CHARGE_SQL = """UPDATE accounts SET balance = balance - :price
+                WHERE student_id = (SELECT student_id FROM cards WHERE card_uid=:uid AND status='active')
+                  AND MAX(0, :price - balance) <= MAX(0, max_overdraft_week - COALESCE(
+                        (SELECT used FROM overdraft_weeks
+                         WHERE student_id=accounts.student_id AND week_start_utc=:wk), 0))"""
+# Same, for a card already resolved through CardCache
+CHARGE_CACHED_SQL = """UPDATE accounts SET balance = balance - :price
+                       WHERE student_id = :sid
+                         AND MAX(0, :price - balance) <= MAX(0, :max_ov - COALESCE(
+                               (SELECT used FROM overdraft_weeks
+                                WHERE student_id = :sid AND week_start_utc=:wk), 0))"""
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
 
-    con = sqlite3.connect(DB)
-    con.execute("PRAGMA foreign_keys=ON;")
-    con.execute("PRAGMA busy_timeout=5000;")
+class EpochCache(ABC):
+    """
+    In-process snapshot of a table, kept valid without re-reading it on every use.
+
+    Validity is checked with PRAGMA data_version, which only changes when another
+    connection commits, so a quiet database costs no table reads at all. When it
+    does change, the cache_epochs(EPOCH) counter (bumped by triggers, see
+    migrate_card_cache_epoch.sql) decides whether to reload; commits that don't
+    touch the cached rows leave the snapshot alone. Without that table, any
+    foreign commit reloads. Shared by threads; tracks data_version per connection.
+    Subclasses set EPOCH and implement _load(con).
+
+    Only use it with long-lived connections: a new connection starts at the
+    same data_version, so it proves nothing until it has been seen once.
+    """
+    EPOCH = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._epoch = None
+        # id(connection) -> (connection, data_version last seen on it); holding the
+        # connection keeps its id from being reused by a new one while the entry exists
+        self._versions = {}
+        self.loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.checks = 0
+
+    @abstractmethod
+    def _load(self, con) -> dict:
+        """Read the cached table into a dict (the override point for subclasses)"""
+
+    def _forget_closed_connections(self):
+        for key, (con, _) in list(self._versions.items()):
+            try:
+                con.total_changes
+            except sqlite3.ProgrammingError:  # closed
+                del self._versions[key]
+
+    def _read_epoch(self, con):
+        try:
+            row = con.execute("SELECT epoch FROM cache_epochs WHERE name=?", (self.EPOCH,)).fetchone()
+        except sqlite3.OperationalError:
+            return None  # migration not applied
+        return row[0] if row else None
+
+    def _snapshot(self, con) -> dict:
+        """Current snapshot, reloaded first if needed (call with the lock held)"""
+        version = con.execute("PRAGMA data_version").fetchone()[0]
+        seen = self._versions.get(id(con))
+        if seen is None or seen[0] is not con:
+            self._forget_closed_connections()
+            seen = None
+        if self._data is None or seen is None or seen[1] != version:
+            self.checks += 1
+            epoch = self._read_epoch(con)
+            if self._data is None or epoch is None or epoch != self._epoch:
+                self._data = self._load(con)
+                self._epoch = epoch
+                self.loaded_at = time.time()
+                self.reloads += 1
+            self._versions[id(con)] = (con, version)
+        return self._data
+
+    def lookup(self, con, key):
+        with self._lock:
+            entry = self._snapshot(con).get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data or ()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "miss_rate": round(self.misses / lookups, 4) if lookups else 0.0,
+            "reloads": self.reloads,
+            "version_checks": self.checks,
+            "snapshot_age_seconds": round(time.time() - self.loaded_at, 1) if self.loaded_at else None,
+        }
+
+class CardCache(EpochCache):
+    """
+    Active card_uid -> (student_id, max_overdraft_week). The epoch is bumped on
+    card and account-limit changes, not on balance updates from other lanes.
+    """
+    EPOCH = "cards"
+
+    def _load(self, con) -> dict:
+        rows = con.execute("""SELECT c.card_uid, c.student_id, a.max_overdraft_week
+                              FROM cards c JOIN accounts a ON a.student_id=c.student_id
+                              WHERE c.status='active'""").fetchall()
+        return {uid: (sid, max_ov) for uid, sid, max_ov in rows}
+
+    def lookup(self, con, uid_hex: str):
+        """(student_id, max_overdraft_week) for an active card, or None for unknown/inactive"""
+        return super().lookup(con, uid_hex)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["cards"] = stats.pop("entries")
+        return stats
+
+class ProductCatalog(EpochCache):
+    """
+    Active products: sku (lower case) -> (product_id, name, price in tenths).
+    Reloaded when cache_epochs('products') moves (migrate_products_catalog.sql).
+    """
+    EPOCH = "products"
+
+    def _load(self, con) -> dict:
+        rows = con.execute("SELECT id, sku, name, price FROM products WHERE active=1").fetchall()
+        return {sku.lower(): (pid, name, price) for pid, sku, name, price in rows}
+
+    def lookup(self, con, sku: str):
+        """(product_id, name, price_tenths) for an active product, or None"""
+        return super().lookup(con, sku.strip().lower())
+
+    def products(self, con) -> list:
+        """All active products as (sku, product_id, name, price_tenths), by sku"""
+        with self._lock:
+            return sorted((sku, *entry) for sku, entry in self._snapshot(con).items())
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["products"] = stats.pop("entries")
+        return stats
+
+def lookup_product(con, sku: str, catalog=None):
+    """(product_id, name, price_tenths) for an active product, through the catalog cache if given"""
+    if catalog is not None:
+        return catalog.lookup(con, sku)
+    return con.execute("SELECT id, name, price FROM products WHERE sku=? AND active=1",
+                       (sku.strip(),)).fetchone()
+
+def parse_cart(spec: str) -> list:
+    """'drink:2,chips' -> [('drink', 2), ('chips', 1)]"""
+    items = []
+    for part in spec.split(","):
+        sku, _, qty = part.strip().partition(":")
+        if sku.strip():
+            items.append((sku.strip(), int(qty) if qty.strip() else 1))
+    return items
+
+def _write_transaction(con, body, *args):
+    """Run body(cur, *args) -> (ok, msg) in BEGIN IMMEDIATE; commit only if ok"""
     cur = con.cursor()
+    cur.execute("BEGIN IMMEDIATE;")
+    try:
+        ok, msg = body(cur, *args)
+    except BaseException:
+        con.rollback()
+        raise
+    if ok:
+        con.commit()
+    else:
+        con.rollback()  # nothing was written; just release the lock
+    return ok, msg
 
-    card = cur.execute("""SELECT c.student_id, a.balance, a.max_overdraft_week
-                          FROM cards c JOIN accounts a ON a.student_id=c.student_id
-                          WHERE c.card_uid=? AND c.status='active'""", (uid_hex,)).fetchone()
-    if not card:
-        con.close()
+def charge_by_uid(uid_hex: str, price: float, staff="pos", con=None, card_cache=None):
+    """
+    Charge a card. Pass `con` to reuse an open connection (e.g. from ledger_daemon),
+    and `card_cache` (a CardCache) to reject unknown cards without taking the write lock.
+    The cache is only used with a caller's `con`, never with a temporary connection.
+    """
+    if price <= 0:
+        return False, "Price must be a positive number."
+    if con is None:
+        con = connect()
+        try:
+            return charge_by_uid(uid_hex, price, staff, con)
+        finally:
+            con.close()
+    if card_cache is not None and card_cache.lookup(con, uid_hex) is None:
         return False, "Unknown/inactive card"
+    return _write_transaction(con, charge_in_transaction, uid_hex, price, staff, card_cache)
 
-    sid, bal_tenths, max_ov_tenths = card
-    now_utc = datetime.now(timezone.utc) 
-    wk_start = week_start_utc(now_utc)
+def charge_in_transaction(cur, uid_hex: str, price: float, staff="pos", card_cache=None):
+    """
+    Charge logic of charge_by_uid, run inside a write transaction the caller holds.
+    Never commits or rolls back; a decline writes nothing. Used by ledger_daemon's group commit.
+    """
+    if price <= 0:
+        return False, "Price must be a positive number."
 
-    cur.execute("BEGIN IMMEDIATE;")
-    bal_tenths = cur.execute("SELECT balance FROM accounts WHERE student_id=?", (sid,)).fetchone()[0]
-    used_this_week_tenths = overdraft_used_this_week(cur, sid, wk_start)
-    remaining_ov_tenths = max(0, max_ov_tenths - used_this_week_tenths)
-
-    need_ov_tenths = max(0, price_tenths - bal_tenths)
-    if need_ov_tenths > remaining_ov_tenths:
-        con.rollback(); con.close()
-        need_ov_display = need_ov_tenths / 10.0
-        remaining_ov_display = remaining_ov_tenths / 10.0
+    # Convert to tenths (e.g., 5.5 -> 55)
+    ok, result = debit_in_transaction(cur, uid_hex, round(price * 10), staff, card_cache)
+    if not ok:
+        return False, result
+    tx_id, newbal_tenths, need_ov_tenths = result
+    newbal = newbal_tenths / 10.0
+    need_ov = need_ov_tenths / 10.0
+    return True, f"Charged ¥{price:.1f} (overpay used ¥{need_ov:.1f}). New balance: ¥{newbal:.1f}. TX ID: {tx_id}"
+
+def debit_in_transaction(cur, uid_hex: str, price_tenths: int, staff="pos", card_cache=None,
+                         description="purchase"):
+    """
+    Debit price_tenths from a card's account inside the caller's write transaction,
+    applying the weekly overpay rule. Returns (True, (tx_id, new_balance_tenths,
+    overpay_used_tenths)) or (False, decline message); a decline writes nothing.
+    """
+    wk_start = week_start_utc(datetime.now(timezone.utc))
+
+    # The UPDATE finds the card's account and only applies if the overpay this
+    # charge needs (everything below zero) fits in what is left of the weekly quota.
+    # With a cache the card is resolved up front; under the write lock nobody can
+    # change cards between that lookup and the UPDATE.
+    sql, params = CHARGE_SQL, {"uid": uid_hex, "price": price_tenths, "wk": wk_start}
+    if card_cache is not None:
+        entry = card_cache.lookup(cur.connection, uid_hex)
+        if entry is None:
+            return False, "Unknown/inactive card"
+        sql = CHARGE_CACHED_SQL
+        params.update(sid=entry[0], max_ov=entry[1])
+    if HAS_RETURNING:
+        rows = cur.execute(sql + " RETURNING student_id, balance", params).fetchall()
+        row = rows[0] if rows else None
+    else:
+        cur.execute(sql, params)
+        row = cur.execute("""SELECT a.student_id, a.balance FROM cards c JOIN accounts a ON a.student_id=c.student_id
+                             WHERE c.card_uid=? AND c.status='active'""", (uid_hex,)).fetchone() if cur.rowcount else None
+
+    if row is None:
+        # Declined or unknown card: work out which, for the message
+        card = cur.execute("""SELECT a.balance, a.max_overdraft_week, COALESCE(o.used, 0)
+                              FROM cards c JOIN accounts a ON a.student_id=c.student_id
+                              LEFT JOIN overdraft_weeks o ON o.student_id=c.student_id AND o.week_start_utc=?
+                              WHERE c.card_uid=? AND c.status='active'""", (wk_start, uid_hex)).fetchone()
+        if not card:
+            return False, "Unknown/inactive card"
+        bal_tenths, max_ov_tenths, used_this_week_tenths = card
+        need_ov_display = max(0, price_tenths - bal_tenths) / 10.0
+        remaining_ov_display = max(0, max_ov_tenths - used_this_week_tenths) / 10.0
         return False, f"Declined: need ¥{need_ov_display:.1f} overpay, only ¥{remaining_ov_display:.1f} left this week."
 
-    # Apply debit
-    cur.execute("UPDATE accounts SET balance = balance - ? WHERE student_id=?", (price_tenths, sid))
+    sid, newbal_tenths = row
+    need_ov_tenths = max(0, -newbal_tenths)  # == max(0, price - balance before the charge)
     cur.execute("""INSERT INTO transactions
                    (student_id, card_uid, type, amount, overdraft_component, description, staff)
                    VALUES (?,?,?,?,?,?,?)""",
-                (sid, uid_hex, 'DEBIT', -price_tenths, need_ov_tenths, 'purchase', staff))
+                (sid, uid_hex, 'DEBIT', -price_tenths, need_ov_tenths, description, staff))
     tx_id = cur.lastrowid
     if need_ov_tenths:
         add_overdraft_usage(cur, sid, wk_start, need_ov_tenths)
+    return True, (tx_id, newbal_tenths, need_ov_tenths)
 
-    con.commit()
-    newbal_tenths = cur.execute("SELECT balance FROM accounts WHERE student_id=?", (sid,)).fetchone()[0]
-    newbal = newbal_tenths / 10.0
-    need_ov = need_ov_tenths / 10.0
-    con.close()
-    return True, f"Charged ¥{price:.1f} (overpay used ¥{need_ov:.1f}). New balance: ¥{newbal:.1f}. TX ID: {tx_id}"
+def charge_cart_by_uid(uid_hex: str, items, staff="pos", con=None, card_cache=None, catalog=None):
+    """
+    Charge a basket of (sku, quantity) items as one DEBIT with line items, in one
+    transaction; the overpay rule applies to the basket total. `catalog` (a
+    ProductCatalog) resolves prices from memory. Like charge_by_uid, the caches are
+    only used with a caller's `con`.
+    """
+    if con is None:
+        con = connect()
+        try:
+            return charge_cart_by_uid(uid_hex, items, staff, con)
+        finally:
+            con.close()
+    if card_cache is not None and card_cache.lookup(con, uid_hex) is None:
+        return False, "Unknown/inactive card"
+    return _write_transaction(con, cart_in_transaction, uid_hex, items, staff, card_cache, catalog)
+
+def cart_in_transaction(cur, uid_hex: str, items, staff="pos", card_cache=None, catalog=None):
+    """Cart logic of charge_cart_by_uid, inside a write transaction the caller holds (see charge_in_transaction)"""
+    quantities = {}
+    for sku, qty in items:
+        if not isinstance(qty, int) or qty <= 0:
+            return False, f"Quantity for {sku} must be a positive whole number."
+        quantities[sku.strip().lower()] = quantities.get(sku.strip().lower(), 0) + qty
+    if not quantities:
+        return False, "Cart is empty."
+
+    lines = {}  # product_id -> [name, quantity, unit price]
+    for sku, qty in quantities.items():
+        product = lookup_product(cur.connection, sku, catalog)
+        if product is None:
+            return False, f"Unknown product: {sku}"
+        pid, name, price_tenths = product
+        lines[pid] = [name, qty, price_tenths]
+
+    total_tenths = sum(qty * unit for _, qty, unit in lines.values())
+    description = ", ".join(f"{qty}x {name}" for name, qty, _ in lines.values())
+    ok, result = debit_in_transaction(cur, uid_hex, total_tenths, staff, card_cache, description)
+    if not ok:
+        return False, result
+    tx_id, newbal_tenths, need_ov_tenths = result
+    cur.executemany("""INSERT INTO transaction_items(transaction_id, product_id, quantity, unit_price)
+                       VALUES (?,?,?,?)""",
+                    [(tx_id, pid, qty, unit) for pid, (_, qty, unit) in lines.items()])
+
+    count = sum(qty for _, qty, _ in lines.values())
+    return True, (f"Charged ¥{total_tenths / 10.0:.1f} for {count} item(s) "
+                  f"(overpay used ¥{need_ov_tenths / 10.0:.1f}). New balance: ¥{newbal_tenths / 10.0:.1f}. TX ID: {tx_id}")
+
+class TapReader(threading.Thread):
+    """
+    Polls the reader on its own thread and queues each tap's UID, so charging
+    (and printing the result) never holds up the next tap.
 
-def read_uid_from_pn532(device):
-    import nfc
-    uid_hex = {"val": None}
-    def on_connect(tag):
-        uid_hex["val"] = binascii.hexlify(tag.identifier).decode().upper()
-        return False
-    with nfc.ContactlessFrontend(device) as clf:
-        print(f"Tap card on {device}…")
-        clf.connect(rdwr={'on-connect': on_connect})
-    return uid_hex["val"]
+    One frontend stays open for the session. A card is held until it leaves the
+    field, so resting it on the reader is one tap; the same card coming back
+    within `retap_seconds` of leaving (edge-of-field flicker) is ignored.
+    """
+
+    def __init__(self, device: str, taps: queue.Queue, retap_seconds: float = 1.0):
+        super().__init__(name="pos-reader", daemon=True)
+        self.device = device
+        self.taps = taps
+        self.retap_seconds = retap_seconds
+        self.stop = threading.Event()
+        self.suppressed = 0
+        self._last_uid = None
+        self._last_gone = 0.0
+
+    def _on_connect(self, tag):
+        uid = binascii.hexlify(tag.identifier).decode().upper()
+        if uid == self._last_uid and time.monotonic() - self._last_gone < self.retap_seconds:
+            self.suppressed += 1
+        else:
+            self.taps.put(uid)
+        self._last_uid = uid
+        return True  # hold the card until it is removed
+
+    def run(self):
+        import nfc
+        while not self.stop.is_set():
+            try:
+                with nfc.ContactlessFrontend(self.device) as clf:
+                    print(f"Tap card on {self.device}…")
+                    while not self.stop.is_set():
+                        if clf.connect(rdwr={'on-connect': self._on_connect}, terminate=self.stop.is_set):
+                            self._last_gone = time.monotonic()
+            except (IOError, OSError) as e:
+                print(f"[WARN] Reader error on {self.device}: {e}; reopening.")
+                self.stop.wait(1.0)
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
-    ap.add_argument("price", type=float, help="price per tap in CNY (e.g., 6.5)")
+    ap.add_argument("price", type=float, nargs="?", help="price per tap in CNY (e.g., 6.5)")
+    ap.add_argument("--cart", help="charge this basket from the product catalog per tap instead, e.g. drink:2,chips")
+    ap.add_argument("--list-products", action="store_true", help="print the product catalog and exit")
     ap.add_argument("--device", default="tty:AMA0:pn532",
                     help="nfcpy device string (e.g., tty:AMA0:pn532, usb:USB0:pn532)")
     ap.add_argument("--simulate", action="store_true", help="type UIDs manually (no reader)")
+    ap.add_argument("--retap-seconds", type=float, default=1.0,
+                    help="ignore the same card returning within this many seconds of leaving the reader (default: 1.0)")
+    ap.add_argument("--ledger-socket", default=os.getenv("STUCO_LEDGER_SOCKET"),
+                    help="charge through ledger_daemon.py on this Unix socket (default: $STUCO_LEDGER_SOCKET)")
     args = ap.parse_args()
 
-    print(f"POS ready. Price per tap: ¥{args.price:.1f}. Weekly overpay quota: ¥20.0 (resets Monday 00:00 Asia/Shanghai).")
+    if args.list_products:
+        con = connect()
+        for sku, _, name, price_tenths in ProductCatalog().products(con):
+            print(f"{sku:<16} ¥{price_tenths / 10.0:>6.1f}  {name}")
+        con.close()
+        raise SystemExit(0)
+    if (args.price is None) == (args.cart is None):
+        ap.error("give either a price or --cart")
+    cart = None
+    if args.cart:
+        try:
+            cart = parse_cart(args.cart)
+        except ValueError:
+            ap.error(f"bad --cart {args.cart!r} (expected sku:qty,sku:qty)")
+
+    if args.ledger_socket:
+        from ledger_daemon import LedgerClient, LedgerOutcomeUnknown, LedgerUnavailable
+        ledger = LedgerClient(args.ledger_socket)
+        def charge(uid):
+            try:
+                return ledger.charge_cart(uid, cart) if cart else ledger.charge(uid, args.price)
+            except LedgerUnavailable as e:
+                # Nothing reached the daemon, so a direct charge cannot double up
+                print(f"[WARN] Ledger daemon unavailable ({e}); charging directly.")
+                return charge_cart_by_uid(uid, cart) if cart else charge_by_uid(uid, args.price)
+            except LedgerOutcomeUnknown as e:
+                return False, f"Charge outcome unknown: {e}. Check the balance before charging again."
+    else:
+        con = connect()  # one connection, card cache and catalog for the whole session
+        card_cache = CardCache()
+        catalog = ProductCatalog()
+        def charge(uid):
+            if cart:
+                return charge_cart_by_uid(uid, cart, con=con, card_cache=card_cache, catalog=catalog)
+            return charge_by_uid(uid, args.price, con=con, card_cache=card_cache)
+
+    per_tap = f"Cart per tap: {args.cart}" if cart else f"Price per tap: ¥{args.price:.1f}"
+    print(f"POS ready. {per_tap}. Weekly overpay quota: ¥20.0 (resets Monday 00:00 Asia/Shanghai).")
 
     if args.simulate:
         print("Simulation mode. Type UID hex (or 'quit'):")
         while True:
             uid = input("> ").strip()
             if uid.lower() in ("q","quit","exit"): break
-            ok, msg = charge_by_uid(uid.upper(), args.price)
+            ok, msg = charge(uid.upper())
             print(("[OK] " if ok else "[NO] ") + msg)
     else:
+        taps = queue.Queue()
+        reader = TapReader(args.device, taps, args.retap_seconds)
+        reader.start()
         try:
             while True:
-                uid = read_uid_from_pn532(args.device)
-                ok, msg = charge_by_uid(uid, args.price)
+                uid = taps.get()
+                ok, msg = charge(uid)
                 print(("[OK] " if ok else "[NO] ") + msg)
-                time.sleep(0.8)
         except KeyboardInterrupt:
             pass
+        finally:
+            reader.stop.set()
+            reader.join(timeout=2)
 
@@ -6,11 +6,12 @@ Backs up existing database and creates a fresh one with the schema.
 
 import sqlite3
 import os
-import shutil
-from datetime import datetime
+import sys
 from getpass import getpass
 import hashlib
 
+import backup_db
+
 DB_FILE = "stuco.db"
 DB_WAL = "stuco.db-wal"
 DB_SHM = "stuco.db-shm"
@@ -22,22 +23,15 @@ def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 def backup_database():
-    """Backup existing database files if they exist"""
+    """Backup existing database if it exists (raises if the backup fails verification)"""
     if not os.path.exists(DB_FILE):
         print("No existing database to backup.")
         return None
     
-    # Create backup directory if it doesn't exist
-    os.makedirs(BACKUP_DIR, exist_ok=True)
-    
-    # Create timestamped backup
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_path = os.path.join(BACKUP_DIR, f"stuco_backup_{timestamp}.db")
-    
-    print(f"Backing up database to: {backup_path}")
-    shutil.copy2(DB_FILE, backup_path)
-    
-    return backup_path
+    # Backup API copy, so changes still in stuco.db-wal are included;
+    # verified with integrity_check before it is moved into place
+    print(f"Backing up database to: {BACKUP_DIR}/")
+    return backup_db.make_backup(DB_FILE, backup_dir=BACKUP_DIR, sleep=0)
 
 def remove_database_files():
     """Remove all database files (main DB, WAL, SHM)"""
@@ -118,7 +112,12 @@ def main():
     print("-" * 60)
     print("Step 1: Backing up existing database")
     print("-" * 60)
-    backup_path = backup_database()
+    try:
+        backup_path = backup_database()
+    except (OSError, sqlite3.Error, RuntimeError) as e:
+        print(f"✗ Backup failed: {e}")
+        print("Reset stopped; the existing database was not touched.")
+        sys.exit(1)
     if backup_path:
         print(f"✓ Backup created: {backup_path}")
     print()
@@ -8,8 +8,6 @@ set -e
 
 # Configuration
 DB_FILE="stuco.db"
-DB_WAL="stuco.db-wal" 
-DB_SHM="stuco.db-shm"
 LOCAL_BACKUP_DIR="db_backups"
 TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
 BACKUP_NAME="stuco_backup_${TIMESTAMP}"
@@ -78,12 +76,18 @@ echo "Step 1: Creating compressed backup"
 echo "------------------------------------------------------------"
 BACKUP_FILE="${LOCAL_BACKUP_DIR}/${BACKUP_NAME}.tar.gz"
 
-# Create tar archive (suppress warnings for missing WAL/SHM files)
-if tar -czf "$BACKUP_FILE" "$DB_FILE" "$DB_WAL" "$DB_SHM" 2>/dev/null; then
-    echo "✓ All database files included"
-elif tar -czf "$BACKUP_FILE" "$DB_FILE" 2>/dev/null; then
-    echo "⚠ Warning: WAL/SHM files not found, backed up main DB only"
-else
+# Consistent snapshot via the SQLite backup API (safe while POS lanes are
+# writing; tarring stuco.db/-wal/-shm directly can catch them mid-write),
+# verified with integrity_check, then archived as a single stuco.db
+SNAPSHOT_DIR=$(mktemp -d)
+trap 'rm -rf "$SNAPSHOT_DIR"' EXIT
+
+if ! python3 backup_db.py --db "$DB_FILE" --output "$SNAPSHOT_DIR/stuco.db"; then
+    echo "❌ Error: Failed to create database snapshot"
+    exit 1
+fi
+
+if ! tar -czf "$BACKUP_FILE" -C "$SNAPSHOT_DIR" stuco.db; then
     echo "❌ Error: Failed to create backup archive"
     exit 1
 fi
@@ -77,8 +77,12 @@ echo "Step 2: Backing up current database"
 echo "------------------------------------------------------------"
 
 if [ -f "stuco.db" ]; then
-    CURRENT_BACKUP="db_backups/pre_restore_backup_$(date +%Y%m%d_%H%M%S).tar.gz"
-    tar -czf "$CURRENT_BACKUP" stuco.db stuco.db-wal stuco.db-shm 2>/dev/null || tar -czf "$CURRENT_BACKUP" stuco.db 2>/dev/null
+    # Consistent, verified copy (tarring the live stuco.db/-wal/-shm can catch them mid-write)
+    CURRENT_BACKUP="db_backups/pre_restore_backup_$(date +%Y%m%d_%H%M%S).db"
+    if ! python3 backup_db.py --db stuco.db --output "$CURRENT_BACKUP"; then
+        echo "❌ Error: Could not back up the current database; restore aborted"
+        exit 1
+    fi
     echo "✓ Current database backed up to: $CURRENT_BACKUP"
 else
     echo "ℹ No existing database to backup"
@@ -96,10 +100,15 @@ SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
 cd "$PROJECT_ROOT"
 
+# Drop the old WAL/SHM (saved above) so they are not replayed onto the restored file
+rm -f stuco.db-wal stuco.db-shm
+
 # Extract
 tar -xzf "$LOCAL_PATH"
 
 if [ $? -eq 0 ]; then
+    # Snapshots from backup_db.py are single files in rollback-journal mode
+    python3 -c "import sqlite3; sqlite3.connect('stuco.db').execute('PRAGMA journal_mode=WAL;')"
     echo "✓ Database restored successfully!"
 else
     echo "❌ Extraction failed!"
@@ -7,29 +7,45 @@ Next.js web UI via WebSocket connection.
 
 Features:
 - WebSocket connection with automatic reconnection
+- Reader loops independent of the WebSocket (network blips never re-init hardware)
 - Card presence tracking to prevent duplicate taps
+- Optional event-driven presence mode with tap / tap_end events (--presence)
+- Optional local auto-charge for fixed-price lanes (--auto-charge)
 - Continuous reader mode (keeps NFC connection open)
 - Proper debouncing with UID tracking
 - Simulation and test modes
 - UART, USB, and I2C device support
+- Multi-reader mode (one process, one WebSocket, N readers)
+- Disk-backed spool that replays taps missed while disconnected
+- Optional Prometheus metrics endpoint (--metrics-port)
 - Graceful shutdown handling
 
 Usage:
     python tap-broadcaster.py --url http://localhost:3000 --secret YOUR_SECRET
+    python tap-broadcaster.py --multi     # Drive every detected reader from one process
+    python tap-broadcaster.py --readers reader-1=tty:USB0:pn532,reader-2=tty:USB1:pn532
+    python tap-broadcaster.py --auto-charge 5.5  # Charge every tap locally, send the result
     python tap-broadcaster.py --simulate  # Test mode without hardware
     python tap-broadcaster.py --test      # Send single test tap and exit
+    python tap-broadcaster.py --bench --bench-connections 50 --bench-rate 200  # Load-test the server
 """
 
 import argparse
 import asyncio
 import binascii
+import ctypes
+import ctypes.util
 import json
 import os
 import re
 import signal
 import subprocess
 import sys
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime, timezone
 from typing import Optional, Callable
 
@@ -40,13 +56,20 @@ except ImportError:
     sys.exit(1)
 
 
-# Global state for card tracking
+# Per-reader state for card tracking
 class CardState:
     """Track card presence and prevent duplicate taps"""
-    def __init__(self):
+    def __init__(self, debounce_seconds: float = 1.5, retap_seconds: float = 1.0):
         self.last_uid: Optional[str] = None
         self.last_tap_time: float = 0
-        self.debounce_seconds: float = 1.5
+        self.debounce_seconds: float = debounce_seconds
+        # Presence mode: the card currently held on the reader, and the last one to leave
+        self.present_uid: Optional[str] = None
+        self.present_since: float = 0
+        self.present_published: bool = False
+        self.retap_seconds: float = retap_seconds
+        self.gone_uid: Optional[str] = None
+        self.gone_at: float = 0
     
     def should_broadcast(self, uid: str) -> bool:
         """Check if this UID should be broadcast (not a duplicate)"""
@@ -64,21 +87,256 @@ class CardState:
         """Reset state when card is removed"""
         self.last_uid = None
 
+    def is_retap(self, uid: str) -> bool:
+        """
+        Presence mode: True if this read is the same placement as before: the card is
+        still held (a read retried after a reader error), or it is back within
+        retap_seconds of leaving (edge-of-field flicker)
+        """
+        if uid == self.present_uid:
+            return True
+        return uid == self.gone_uid and time.monotonic() - self.gone_at < self.retap_seconds
+
+    def card_arrived(self, uid: str, published: bool = True):
+        """Presence mode: a card was placed on the reader (published=False for a suppressed retap)"""
+        self.present_uid = uid
+        self.present_since = time.monotonic()
+        self.present_published = published
+
+    def card_removed(self) -> float:
+        """Presence mode: the held card left the field; returns how long it was present"""
+        present_seconds = time.monotonic() - self.present_since if self.present_uid else 0.0
+        if self.present_uid:
+            self.gone_uid, self.gone_at = self.present_uid, time.monotonic()
+        self.present_uid = None
+        return present_seconds
+
+
+class ReaderContext:
+    """
+    One physical reader driven by this process.
+
+    Each reader gets its own CardState and a dedicated single-thread executor,
+    so a blocking poll on one reader never delays another.
+
+    With presence=True the reader holds each card until it is removed and
+    emits tap / tap_end events instead of debouncing repeated reads; the same
+    card read again while held, or back within retap_seconds of leaving, is
+    not a new tap.
+
+    With a charger (AutoCharger) every tap is charged locally and sent as a
+    charge_result event instead of a plain tap.
+    """
+    def __init__(self, device: str, reader_id: str, presence: bool = False,
+                 charger: Optional["AutoCharger"] = None, retap_seconds: float = 1.0):
+        self.device = device
+        self.reader_id = reader_id
+        self.presence = presence
+        self.charger = charger
+        self.card_state = CardState(retap_seconds=retap_seconds)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"nfc-{reader_id}")
+
+    def shutdown(self):
+        """Release the reader thread (does not wait for a blocked poll)"""
+        self.executor.shutdown(wait=False)
+
 
-card_state = CardState()
 shutdown_event = asyncio.Event()
 
 
-def auto_detect_nfc_device() -> tuple[Optional[str], Optional[str]]:
+class Metrics:
+    """
+    Minimal in-process metrics, rendered in Prometheus text format.
+
+    Counters, gauges and histograms are keyed by metric name plus a label set
+    (e.g. {"reader": "reader-1"}). Recording is a dict update, so it is always
+    on; the HTTP endpoint (serve_metrics) is optional.
+    """
+    # Poll cycles and recoveries range from milliseconds to minutes
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+    def __init__(self):
+        self._types: dict[str, str] = {}
+        self._help: dict[str, str] = {}
+        self._values: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, list]] = {}
+        self._buckets: dict[str, tuple] = {}
+
+    def _declare(self, name: str, kind: str, help_text: str):
+        if name not in self._types:
+            self._types[name] = kind
+            self._help[name] = help_text
+
+    @staticmethod
+    def _key(labels: Optional[dict]) -> tuple:
+        return tuple(sorted((labels or {}).items()))
+
+    def inc(self, name: str, help_text: str, labels: Optional[dict] = None, amount: float = 1):
+        """Increment a counter"""
+        self._declare(name, "counter", help_text)
+        values = self._values.setdefault(name, {})
+        key = self._key(labels)
+        values[key] = values.get(key, 0) + amount
+
+    def set(self, name: str, help_text: str, value: float, labels: Optional[dict] = None, kind: str = "gauge"):
+        """Set a gauge (or a counter whose total is tracked elsewhere)"""
+        self._declare(name, kind, help_text)
+        self._values.setdefault(name, {})[self._key(labels)] = value
+
+    def observe(self, name: str, help_text: str, value: float, labels: Optional[dict] = None,
+                buckets: tuple = DEFAULT_BUCKETS):
+        """Record one observation in a histogram"""
+        self._declare(name, "histogram", help_text)
+        self._buckets.setdefault(name, buckets)
+        series = self._histograms.setdefault(name, {})
+        key = self._key(labels)
+        if key not in series:
+            series[key] = [[0] * len(self._buckets[name]), 0.0, 0]  # per-bucket counts, sum, count
+        counts, _, _ = series[key]
+        for idx, bound in enumerate(self._buckets[name]):
+            if value <= bound:
+                counts[idx] += 1
+                break
+        series[key][1] += value
+        series[key][2] += 1
+
+    @staticmethod
+    def _format_labels(key: tuple, extra: Optional[tuple] = None) -> str:
+        pairs = list(key) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escaped = []
+        for name, value in pairs:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            escaped.append(f'{name}="{value}"')
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self) -> str:
+        """Render every metric in Prometheus text exposition format"""
+        lines = []
+        for name, kind in self._types.items():
+            lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for key, (counts, total, count) in self._histograms.get(name, {}).items():
+                    cumulative = 0
+                    for bound, bucket_count in zip(self._buckets[name], counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{self._format_labels(key, ('le', bound))} {cumulative}")
+                    lines.append(f"{name}_bucket{self._format_labels(key, ('le', '+Inf'))} {count}")
+                    lines.append(f"{name}_sum{self._format_labels(key)} {total}")
+                    lines.append(f"{name}_count{self._format_labels(key)} {count}")
+            else:
+                for key, value in self._values.get(name, {}).items():
+                    lines.append(f"{name}{self._format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def auto_detect_nfc_device(cache_path: Optional[str] = None) -> tuple[Optional[str], Optional[str]]:
     """
     Auto-detect NFC reader device and assign reader_id.
 
+    Args:
+        cache_path: JSON file holding the last known good port -> reader mapping (None disables)
+
     Returns:
         Tuple of (device_string, reader_id)
         device_string: nfcpy format like 'tty:USB0:pn532'
         reader_id: 'reader-1' or 'reader-2' based on USB port
     """
-    import os
+    detected = detect_nfc_devices(first_only=True, cache_path=cache_path)
+    if not detected:
+        return None, None
+    return detected[0]
+
+
+def usb_port_identity(tty_path: str) -> str:
+    """
+    Return a stable identity for the physical USB port behind a tty.
+
+    Prefers the /dev/serial/by-path link name, then the sysfs USB interface
+    (e.g. '1-1.3:1.0'), and falls back to the tty name. Unlike ttyUSB
+    numbering, the first two do not change when adapters re-enumerate.
+    """
+    import glob
+
+    real = os.path.realpath(tty_path)
+    for link in glob.glob('/dev/serial/by-path/*'):
+        if os.path.realpath(link) == real:
+            return os.path.basename(link)
+
+    sysfs_device = f'/sys/class/tty/{os.path.basename(real)}/device'
+    if os.path.exists(sysfs_device):
+        # .../1-1.3/1-1.3:1.0/ttyUSB0 -> '1-1.3:1.0'
+        return os.path.basename(os.path.dirname(os.path.realpath(sysfs_device)))
+
+    return os.path.basename(real)
+
+
+def load_reader_cache(cache_path: Optional[str]) -> dict:
+    """
+    Load the port -> reader mapping written by save_reader_cache.
+
+    Returns:
+        Dict of port identity -> {'reader_id', 'tty', 'ok'}; empty if missing or unreadable
+    """
+    if not cache_path:
+        return {}
+    try:
+        with open(cache_path, 'r') as f:
+            ports = json.load(f).get('ports', {})
+        return ports if isinstance(ports, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"[DEVICE] Ignoring unreadable reader cache {cache_path}: {e}")
+        return {}
+
+
+def save_reader_cache(cache_path: Optional[str], ports: dict):
+    """Atomically write the port -> reader mapping"""
+    if not cache_path:
+        return
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({'ports': ports}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"[DEVICE] Could not write reader cache {cache_path}: {e}")
+
+
+def probe_nfc_device(device_string: str) -> bool:
+    """Open and close a frontend to check that a reader answers"""
+    try:
+        import nfc
+        with nfc.ContactlessFrontend(device_string):
+            return True
+    except Exception as e:
+        print(f"[DEVICE] Failed to open {device_string}: {e}")
+        return False
+
+
+def detect_nfc_devices(first_only: bool = False, cache_path: Optional[str] = None) -> list[tuple[str, str]]:
+    """
+    Auto-detect every working NFC reader and assign reader_ids.
+
+    Reader IDs are keyed by physical USB port (see usb_port_identity) and
+    remembered in cache_path, so a reader keeps its ID when ttyUSB numbers
+    move. Ports whose tty matches the cached known-good entry are trusted
+    without opening them; only new or changed ports are probed, all at once.
+
+    Args:
+        first_only: Return at most one reader. Every port is probed (still
+            concurrently) so a reader held by another instance is skipped.
+        cache_path: JSON file holding the last known good mapping (None disables caching)
+
+    Returns:
+        List of (device_string, reader_id) tuples, e.g. [('tty:USB0:pn532', 'reader-1')]
+    """
     import glob
 
     # Find all ttyUSB devices
@@ -86,153 +344,253 @@ def auto_detect_nfc_device() -> tuple[Optional[str], Optional[str]]:
 
     if not tty_devices:
         print("[DEVICE] No /dev/ttyUSB* devices found")
-        return None, None
+        return []
 
     # Check if device was specified via env var
     specified_device = os.getenv('PN532_DEVICE')
     if specified_device and not specified_device.startswith('tty:'):
         # Device specified but not in our auto-detect list
         print(f"[DEVICE] Using specified device: {specified_device}")
-        return specified_device, 'reader-1'  # Default to reader-1 for non-USB devices
-
-    # Try each USB device until one works
-    for idx, tty_path in enumerate(tty_devices):
+        return [(specified_device, 'reader-1')]  # Default to reader-1 for non-USB devices
+
+    cached = load_reader_cache(cache_path)
+    ports = {}
+    to_probe = []
+
+    for tty_path in tty_devices:
+        port = usb_port_identity(tty_path)
+        entry = cached.get(port)
+        # A single-reader instance must open its port to skip one already held by another instance
+        if entry and entry.get('tty') == tty_path and entry.get('ok') and not first_only:
+            ports[port] = dict(entry)
+        else:
+            ports[port] = {'reader_id': entry.get('reader_id') if entry else None, 'tty': tty_path, 'ok': False}
+            to_probe.append(port)
+
+    # Keep IDs for ports seen before; hand out the lowest free reader-N to new ports in tty order
+    used_ids = {entry['reader_id'] for entry in cached.values() if entry.get('reader_id')}
+    next_idx = 1
+    for port in ports:
+        if ports[port]['reader_id'] is None:
+            while f'reader-{next_idx}' in used_ids:
+                next_idx += 1
+            ports[port]['reader_id'] = f'reader-{next_idx}'
+            used_ids.add(ports[port]['reader_id'])
+
+    def device_string(tty_path: str) -> str:
         # Extract device name (e.g., 'USB0' from '/dev/ttyUSB0')
-        tty_name = os.path.basename(tty_path).replace('tty', '')
-        device_string = f'tty:{tty_name}:pn532'
-        reader_id = f'reader-{idx + 1}'  # reader-1, reader-2, etc.
+        return f"tty:{os.path.basename(tty_path).replace('tty', '')}:pn532"
+
+    for port, entry in ports.items():
+        state = "probing" if port in to_probe else "cached"
+        print(f"[DEVICE] Detected: {entry['tty']} -> {device_string(entry['tty'])} "
+              f"({entry['reader_id']}, port {port}, {state})")
+
+    if to_probe:
+        with ThreadPoolExecutor(max_workers=len(to_probe)) as pool:
+            results = pool.map(lambda port: probe_nfc_device(device_string(ports[port]['tty'])), to_probe)
+            for port, ok in zip(to_probe, results):
+                ports[port]['ok'] = ok
+                if ok:
+                    print(f"[DEVICE] Successfully opened {device_string(ports[port]['tty'])} as {ports[port]['reader_id']}")
+
+    # Remember IDs of unplugged ports too (re-probed when they come back), so they keep their ID
+    unplugged = {port: {**entry, 'ok': False} for port, entry in cached.items() if port not in ports}
+    save_reader_cache(cache_path, {**unplugged, **ports})
+
+    detected = sorted(
+        ((device_string(entry['tty']), entry['reader_id']) for entry in ports.values() if entry['ok']),
+        key=lambda item: (len(item[1]), item[1]),
+    )
+    if not detected:
+        print("[DEVICE] No working NFC readers found")
+    return detected[:1] if first_only else detected
 
-        print(f"[DEVICE] Detected: {tty_path} -> {device_string} ({reader_id})")
 
-        # Try to open the device to verify it's accessible
-        try:
-            # Test if we can connect to this device
-            import nfc
-            with nfc.ContactlessFrontend(device_string) as clf:
-                print(f"[DEVICE] Successfully opened {device_string} as {reader_id}")
-                return device_string, reader_id
-        except Exception as e:
-            print(f"[DEVICE] Failed to open {device_string}: {e}")
-            continue
-
-    print("[DEVICE] No working NFC readers found")
-    return None, None
+def parse_reader_specs(spec: str) -> list[tuple[str, str]]:
+    """
+    Parse a reader list like 'reader-1=tty:USB0:pn532,reader-2=tty:USB1:pn532'.
 
+    Entries without 'reader_id=' are numbered by position (reader-1, reader-2, ...).
 
-def read_uid_from_pn532(device: str) -> Optional[str]:
+    Returns:
+        List of (device_string, reader_id) tuples
     """
-    Read card UID from PN532 reader (blocking) with enhanced error detection.
+    readers = []
+    for idx, entry in enumerate(e.strip() for e in spec.split(',')):
+        if not entry:
+            continue
+        if '=' in entry:
+            reader_id, device = (part.strip() for part in entry.split('=', 1))
+        else:
+            reader_id, device = f'reader-{idx + 1}', entry
+        readers.append((device, reader_id))
+    return readers
 
-    Args:
-        device: Device string (e.g., 'tty:AMA0:pn532', 'usb:001:003', 'i2c:/dev/i2c-1:pn532')
 
-    Returns:
-        Card UID as hex string, or None if no card detected
-        
-    Raises:
-        Exception: If hardware is unresponsive after multiple retries (fatal error)
+class PN532Session:
     """
-    # Check if device is I2C (nfcpy doesn't support I2C, use libnfc instead)
-    if device.startswith("i2c") or "i2c" in device.lower():
-        return read_uid_from_libnfc()
-    
-    # Use nfcpy for TTY/USB devices
-    try:
-        import nfc
-    except ImportError:
-        print("Error: nfcpy module not found. Install with: pip install nfcpy")
-        sys.exit(1)
+    Long-lived reader session for a PN532 (blocking, run in an executor).
 
-    uid_hex = {"val": None}
+    The ContactlessFrontend is opened once per hardware connection and every
+    poll reuses it. It is only closed when a read fails with an error that is
+    classified as a hardware fault; the next poll then reopens it.
 
-    def on_connect(tag):
-        """Callback when card is detected"""
-        uid = binascii.hexlify(tag.identifier).decode().upper()
-        uid_hex["val"] = uid
-        return False  # Release immediately for single-read mode
+    I2C devices are not supported by nfcpy; use open_reader_session(), which
+    returns a LibnfcSession for them.
+    """
 
-    # Retry logic for hardware stability
     max_retries = 3
-    timeout_count = 0
-    fatal_error = None
-    
-    for attempt in range(max_retries):
-        try:
-            # Small delay to let UART settle
+
+    def __init__(self, device: str):
+        """
+        Args:
+            device: Device string (e.g., 'tty:AMA0:pn532', 'usb:001:003', 'i2c:/dev/i2c-1:pn532')
+        """
+        self.device = device
+        self.clf = None
+        self._stop = threading.Event()
+
+    def request_stop(self):
+        """Make a blocked poll return so the session can be closed (thread-safe)"""
+        self._stop.set()
+
+    def _terminate(self) -> bool:
+        return shutdown_event.is_set() or self._stop.is_set()
+
+    def open(self):
+        """Open the frontend if it is not already open and return it"""
+        if self.clf is None:
+            try:
+                import nfc
+            except ImportError:
+                print("Error: nfcpy module not found. Install with: pip install nfcpy")
+                sys.exit(1)
+
+            # Small delay to let UART settle (only needed when (re)opening)
             time.sleep(0.2)
-            
-            with nfc.ContactlessFrontend(device) as clf:
-                clf.connect(rdwr={"on-connect": on_connect}, terminate=lambda: shutdown_event.is_set())
-            return uid_hex["val"]
-            
-        except IOError as e:
-            error_str = str(e).lower()
-            
-            # Categorize errors for better handling
-            if "timeout" in error_str or "timed out" in error_str:
-                timeout_count += 1
-                if attempt < max_retries - 1:
-                    # Wait progressively longer for timeouts
-                    time.sleep(0.5 * (attempt + 1))
-                else:
-                    # Multiple timeouts indicate hardware issue
-                    print(f"[ERROR] Device {device} timeout after {max_retries} attempts")
-                    print(f"[ERROR] Hardware may be locked up or disconnected")
-                    fatal_error = e
-                    
-            elif "permission denied" in error_str:
-                print(f"[ERROR] Permission denied accessing {device}")
-                print(f"[ERROR] Add user to dialout group: sudo usermod -aG dialout $USER")
-                fatal_error = e
-                break  # Don't retry permission errors
-                
-            elif "no such file or directory" in error_str or "not found" in error_str:
-                print(f"[ERROR] Device {device} not found - may be disconnected")
-                fatal_error = e
-                break  # Don't retry if device doesn't exist
-                
-            elif "device or resource busy" in error_str:
-                print(f"[ERROR] Device {device} is busy - another process may be using it")
-                if attempt < max_retries - 1:
-                    time.sleep(1)  # Wait longer for busy device
-                else:
+            self.clf = nfc.ContactlessFrontend(self.device)
+            print(f"[NFC] Opened reader session on {self.device}")
+        return self.clf
+
+    def close(self):
+        """Close the frontend; safe to call when already closed"""
+        if self.clf is not None:
+            try:
+                self.clf.close()
+            except Exception as e:
+                print(f"[NFC] Error closing {self.device}: {e}")
+            self.clf = None
+
+    def read_uid(self, on_present: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """
+        Wait for a card on the open frontend with enhanced error detection.
+
+        Args:
+            on_present: Presence mode. Called with the UID as soon as the card is
+                read; the tag is then held (nfcpy polls tag.is_present) and this
+                returns only after the card has been removed.
+
+        Returns:
+            Card UID as hex string, or None if no card detected
+
+        Raises:
+            Exception: If hardware is unresponsive after multiple retries (fatal error).
+                       The frontend is closed before raising.
+        """
+        device = self.device
+        max_retries = self.max_retries
+        uid_hex = {"val": None}
+
+        def on_connect(tag):
+            """Callback when card is detected"""
+            uid = binascii.hexlify(tag.identifier).decode().upper()
+            uid_hex["val"] = uid
+            if on_present is not None:
+                on_present(uid)
+                return True  # Hold the tag until it leaves the field
+            return False  # Release immediately for single-read mode
+
+        # Retry logic for hardware stability
+        timeout_count = 0
+        fatal_error = None
+
+        for attempt in range(max_retries):
+            try:
+                clf = self.open()
+                clf.connect(rdwr={"on-connect": on_connect}, terminate=self._terminate)
+                return uid_hex["val"]
+
+            except IOError as e:
+                error_str = str(e).lower()
+
+                # Categorize errors for better handling
+                if "timeout" in error_str or "timed out" in error_str:
+                    timeout_count += 1
+                    if attempt < max_retries - 1:
+                        # Wait progressively longer for timeouts
+                        time.sleep(0.5 * (attempt + 1))
+                    else:
+                        # Multiple timeouts indicate hardware issue
+                        print(f"[ERROR] Device {device} timeout after {max_retries} attempts")
+                        print(f"[ERROR] Hardware may be locked up or disconnected")
+                        fatal_error = e
+
+                elif "permission denied" in error_str:
+                    print(f"[ERROR] Permission denied accessing {device}")
+                    print(f"[ERROR] Add user to dialout group: sudo usermod -aG dialout $USER")
                     fatal_error = e
-                    
-            else:
-                # Unknown IO error
-                if attempt == max_retries - 1:
-                    print(f"[ERROR] IO error on {device}: {e}")
+                    break  # Don't retry permission errors
+
+                elif "no such file or directory" in error_str or "not found" in error_str:
+                    print(f"[ERROR] Device {device} not found - may be disconnected")
                     fatal_error = e
+                    break  # Don't retry if device doesn't exist
+
+                elif "device or resource busy" in error_str:
+                    print(f"[ERROR] Device {device} is busy - another process may be using it")
+                    if attempt < max_retries - 1:
+                        time.sleep(1)  # Wait longer for busy device
+                    else:
+                        fatal_error = e
+
                 else:
-                    time.sleep(0.5)
-                    
-        except OSError as e:
-            # OS-level errors often indicate hardware disconnection
-            print(f"[ERROR] OS error accessing {device}: {e}")
-            fatal_error = e
-            break
-            
-        except Exception as e:
-            # Unexpected errors
-            error_str = str(e).lower()
-            if "broken pipe" in error_str or "connection" in error_str:
-                print(f"[ERROR] Connection error on {device}: {e}")
+                    # Unknown IO error
+                    if attempt == max_retries - 1:
+                        print(f"[ERROR] IO error on {device}: {e}")
+                        fatal_error = e
+                    else:
+                        time.sleep(0.5)
+
+            except OSError as e:
+                # OS-level errors often indicate hardware disconnection
+                print(f"[ERROR] OS error accessing {device}: {e}")
                 fatal_error = e
                 break
-            else:
-                # For other exceptions, just return None
-                if attempt == max_retries - 1:
-                    print(f"[ERROR] Unexpected error on {device}: {e}")
-                return None
-    
-    # If we had multiple timeouts or fatal errors, raise exception
-    # This will trigger hardware reconnection logic
-    if timeout_count >= max_retries:
-        raise Exception(f"Hardware timeout: Device {device} unresponsive after {max_retries} attempts")
-    if fatal_error:
-        raise Exception(f"Hardware error: {fatal_error}")
-            
-    return None
+
+            except Exception as e:
+                # Unexpected errors
+                error_str = str(e).lower()
+                if "broken pipe" in error_str or "connection" in error_str:
+                    print(f"[ERROR] Connection error on {device}: {e}")
+                    fatal_error = e
+                    break
+                else:
+                    # For other exceptions, just return None
+                    if attempt == max_retries - 1:
+                        print(f"[ERROR] Unexpected error on {device}: {e}")
+                    return None
+
+        # If we had multiple timeouts or fatal errors, drop the frontend and raise.
+        # This will trigger hardware reconnection logic; the session reopens on next poll.
+        if timeout_count >= max_retries:
+            self.close()
+            raise Exception(f"Hardware timeout: Device {device} unresponsive after {max_retries} attempts")
+        if fatal_error:
+            self.close()
+            raise Exception(f"Hardware error: {fatal_error}")
+
+        return None
 
 
 def read_uid_from_libnfc() -> Optional[str]:
@@ -301,59 +659,657 @@ def read_uid_from_libnfc() -> Optional[str]:
     return None
 
 
-async def broadcast_tap_ws(websocket, card_uid: str, lane: str, reader_id: Optional[str] = None) -> bool:
+# libnfc constants (nfc-types.h)
+NMT_ISO14443A = 1
+NBR_106 = 1
+NP_INFINITE_SELECT = 7
+NFC_EOPABORTED = -7
+
+
+class _NfcModulation(ctypes.Structure):
+    _fields_ = [("nmt", ctypes.c_int), ("nbr", ctypes.c_int)]
+
+
+class _NfcIso14443aInfo(ctypes.Structure):
+    _fields_ = [
+        ("abtAtqa", ctypes.c_uint8 * 2),
+        ("btSak", ctypes.c_uint8),
+        ("szUidLen", ctypes.c_size_t),
+        ("abtUid", ctypes.c_uint8 * 10),
+        ("szAtsLen", ctypes.c_size_t),
+        ("abtAts", ctypes.c_uint8 * 254),
+    ]
+
+
+class _NfcTargetInfo(ctypes.Union):
+    # ISO14443A is the largest member of nfc_target_info, so the union size matches
+    _fields_ = [("nai", _NfcIso14443aInfo)]
+
+
+class _NfcTarget(ctypes.Structure):
+    _fields_ = [("nti", _NfcTargetInfo), ("nm", _NfcModulation)]
+
+
+_libnfc = None
+
+
+def load_libnfc():
+    """
+    Load libnfc through ctypes (cached).
+
+    Returns:
+        The ctypes library handle, or None if libnfc is not installed
+    """
+    global _libnfc
+    if _libnfc is not None:
+        return _libnfc
+
+    path = ctypes.util.find_library("nfc")
+    if not path:
+        return None
+    try:
+        lib = ctypes.CDLL(path)
+    except OSError as e:
+        print(f"[NFC] Could not load libnfc ({path}): {e}")
+        return None
+
+    lib.nfc_init.argtypes = [ctypes.POINTER(ctypes.c_void_p)]
+    lib.nfc_init.restype = None
+    lib.nfc_exit.argtypes = [ctypes.c_void_p]
+    lib.nfc_exit.restype = None
+    lib.nfc_open.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    lib.nfc_open.restype = ctypes.c_void_p
+    lib.nfc_close.argtypes = [ctypes.c_void_p]
+    lib.nfc_close.restype = None
+    lib.nfc_abort_command.argtypes = [ctypes.c_void_p]
+    lib.nfc_abort_command.restype = ctypes.c_int
+    lib.nfc_initiator_init.argtypes = [ctypes.c_void_p]
+    lib.nfc_initiator_init.restype = ctypes.c_int
+    lib.nfc_device_set_property_bool.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_bool]
+    lib.nfc_device_set_property_bool.restype = ctypes.c_int
+    lib.nfc_initiator_select_passive_target.argtypes = [
+        ctypes.c_void_p, _NfcModulation, ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(_NfcTarget)
+    ]
+    lib.nfc_initiator_select_passive_target.restype = ctypes.c_int
+    lib.nfc_initiator_target_is_present.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    lib.nfc_initiator_target_is_present.restype = ctypes.c_int
+    lib.nfc_strerror.argtypes = [ctypes.c_void_p]
+    lib.nfc_strerror.restype = ctypes.c_char_p
+
+    _libnfc = lib
+    return lib
+
+
+def libnfc_connstring(device: str) -> Optional[bytes]:
+    """
+    Translate an 'i2c:/dev/i2c-1:pn532' device string to a libnfc connstring.
+
+    Returns:
+        b'pn532_i2c:/dev/i2c-1', or None to let libnfc pick the device from libnfc.conf
+    """
+    match = re.match(r'i2c:(/dev/[^:]+)', device)
+    if match:
+        return f"pn532_i2c:{match.group(1)}".encode()
+    return None
+
+
+class LibnfcSession:
+    """
+    Long-lived libnfc reader session for I2C PN532 readers (blocking, run in an executor).
+
+    Same interface as PN532Session. The libnfc context and device are opened
+    once and every poll is a single non-blocking passive-target select, so
+    there is no per-poll process spawn or libnfc re-initialisation.
+
+    If libnfc cannot be loaded through ctypes, polls fall back to the
+    nfc-list subprocess (read_uid_from_libnfc).
     """
-    Send tap event via WebSocket.
+
+    max_retries = 3
+
+    def __init__(self, device: str):
+        """
+        Args:
+            device: Device string (e.g., 'i2c:/dev/i2c-1:pn532')
+        """
+        self.device = device
+        self.lib = load_libnfc()
+        self.context = ctypes.c_void_p()
+        self.pnd = None
+        self._stop = threading.Event()
+        if self.lib is None:
+            print("[NFC] libnfc shared library not found; falling back to nfc-list per poll")
+
+    def request_stop(self):
+        """Abort an in-flight select so the session can be closed (thread-safe)"""
+        self._stop.set()
+        if self.lib is not None and self.pnd:
+            self.lib.nfc_abort_command(self.pnd)
+
+    def _error(self) -> str:
+        return self.lib.nfc_strerror(self.pnd).decode(errors="replace")
+
+    def open(self):
+        """Open the libnfc device if it is not already open and return it"""
+        if self.lib is None or self.pnd:
+            return self.pnd
+
+        lib = self.lib
+        lib.nfc_init(ctypes.byref(self.context))
+        if not self.context:
+            raise Exception("libnfc initialisation failed")
+
+        pnd = lib.nfc_open(self.context, libnfc_connstring(self.device))
+        if not pnd:
+            lib.nfc_exit(self.context)
+            self.context = ctypes.c_void_p()
+            raise Exception(f"Unable to open libnfc device {self.device}")
+        self.pnd = pnd
+
+        if lib.nfc_initiator_init(pnd) < 0:
+            error = self._error()
+            self.close()
+            raise Exception(f"libnfc initiator init failed on {self.device}: {error}")
+        # Return from select straight away when no card is in the field
+        lib.nfc_device_set_property_bool(pnd, NP_INFINITE_SELECT, False)
+
+        print(f"[NFC] Opened libnfc session on {self.device}")
+        return pnd
+
+    def close(self):
+        """Close the device and libnfc context; safe to call when already closed"""
+        if self.lib is None:
+            return
+        if self.pnd:
+            self.lib.nfc_close(self.pnd)
+            self.pnd = None
+        if self.context:
+            self.lib.nfc_exit(self.context)
+            self.context = ctypes.c_void_p()
+
+    def read_uid(self, on_present: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """
+        Poll once for an ISO14443A card on the open device.
+
+        Args:
+            on_present: Presence mode, as for PN532Session.read_uid. The selected
+                target is checked with nfc_initiator_target_is_present until it
+                leaves the field.
+
+        Returns:
+            Card UID as hex string, or None if no card detected
+
+        Raises:
+            Exception: If hardware is unresponsive after multiple retries (fatal error).
+                       The device is closed before raising.
+        """
+        if self.lib is None:
+            # nfc-list cannot hold a target: a resting card would be a new tap on every poll
+            if on_present is not None:
+                raise Exception("presence mode needs libnfc through ctypes; nfc-list cannot detect removal")
+            return read_uid_from_libnfc()
+
+        modulation = _NfcModulation(NMT_ISO14443A, NBR_106)
+        target = _NfcTarget()
+        error = None
+
+        for attempt in range(self.max_retries):
+            if self._stop.is_set() or shutdown_event.is_set():
+                return None
+
+            pnd = self.open()
+            result = self.lib.nfc_initiator_select_passive_target(
+                pnd, modulation, None, 0, ctypes.byref(target)
+            )
+            if result > 0:
+                info = target.nti.nai
+                uid = bytes(info.abtUid[:info.szUidLen]).hex().upper()
+                if on_present is not None:
+                    on_present(uid)
+                    self._wait_for_removal()
+                return uid
+            if result == 0 or result == NFC_EOPABORTED:
+                return None
+
+            error = self._error()
+            if attempt < self.max_retries - 1:
+                time.sleep(0.5)
+
+        print(f"[ERROR] libnfc error on {self.device} after {self.max_retries} attempts: {error}")
+        self.close()
+        raise Exception(f"libnfc hardware error: {error}")
+
+    def _wait_for_removal(self, interval: float = 0.1):
+        """Block until the selected target leaves the field (or stop is requested)"""
+        while not (self._stop.is_set() or shutdown_event.is_set()):
+            if self.lib.nfc_initiator_target_is_present(self.pnd, None) != 0:
+                return
+            time.sleep(interval)
+
+
+def supports_presence(device: str) -> bool:
+    """Whether the reader backend for a device can hold a card and detect its removal"""
+    if device.startswith("i2c") or "i2c" in device.lower():
+        return load_libnfc() is not None
+    return True
+
+
+def open_reader_session(device: str):
+    """
+    Create the reader session for a device string.
+
+    I2C readers go through libnfc (nfcpy has no I2C support); everything else
+    uses nfcpy.
+
+    Returns:
+        LibnfcSession or PN532Session (not yet opened)
+    """
+    if device.startswith("i2c") or "i2c" in device.lower():
+        return LibnfcSession(device)
+    return PN532Session(device)
+
+
+class TapSpool:
+    """
+    Append-only on-disk spool for taps that could not be sent.
+
+    Each line is a JSON record: either a tap message (with its original
+    reader_ts and a unique tap_id) or an acknowledgement {"ack": tap_id}
+    written once that tap has been replayed. Appends are flushed at once
+    and fsync'd in batches of at most fsync_interval seconds, so a burst
+    of taps costs one fsync. The file is truncated once nothing is pending.
+    """
+    def __init__(self, path: str, max_age: float = 300, fsync_interval: float = 0.5):
+        self.path = path
+        self.max_age = max_age
+        self.fsync_interval = fsync_interval
+        self._file = open(path, "a", encoding="utf-8")
+        self._last_fsync = 0.0
+        self._sync_scheduled = False
+
+    def append(self, message: dict):
+        """Spool an unsent tap message"""
+        self._write(message)
+
+    def ack(self, tap_id: str):
+        """Mark a spooled tap as delivered (or deliberately dropped)"""
+        self._write({"ack": tap_id})
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+        # Batch fsyncs: sync now if the last one was long enough ago, otherwise schedule one
+        if time.monotonic() - self._last_fsync >= self.fsync_interval:
+            self.sync()
+        elif not self._sync_scheduled:
+            self._sync_scheduled = True
+            asyncio.get_event_loop().call_later(self.fsync_interval, self.sync)
+
+    def sync(self):
+        """Force spooled records to disk"""
+        self._sync_scheduled = False
+        if self._file.closed:
+            return
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+
+    def pending(self) -> list[dict]:
+        """Return unacknowledged taps in their original order (deduplicated by tap_id)"""
+        taps: dict[str, dict] = {}
+        acked = set()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Torn write from a crash mid-append
+                    if "ack" in record:
+                        acked.add(record["ack"])
+                    elif record.get("tap_id"):
+                        taps.setdefault(record["tap_id"], record)
+        except FileNotFoundError:
+            return []
+        return [tap for tap_id, tap in taps.items() if tap_id not in acked]
+
+    def compact(self):
+        """Truncate the spool when every tap has been acknowledged"""
+        if self.pending():
+            return
+        self._file.truncate(0)
+        self.sync()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+
+def _tap_age_seconds(message: dict) -> float:
+    """Seconds since the reader saw this tap (0 if the timestamp is unreadable)"""
+    try:
+        reader_ts = datetime.fromisoformat(message["reader_ts"])
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+    return (datetime.now(timezone.utc) - reader_ts).total_seconds()
+
+
+async def replay_spool(websocket, spool: TapSpool) -> int:
+    """
+    Replay spooled taps in order after (re-)authentication.
+
+    Taps older than spool.max_age are acknowledged without being sent, so a
+    long outage does not flood the POS with stale taps.
+
+    Returns:
+        Number of taps replayed
+
+    Raises:
+        WebSocketException: If the connection drops mid-replay (remaining taps stay spooled)
+    """
+    pending = spool.pending()
+    if not pending:
+        return 0
+
+    print(f"[SPOOL] Replaying {len(pending)} spooled tap(s)...")
+    replayed = 0
+    for message in pending:
+        age = _tap_age_seconds(message)
+        if spool.max_age and age > spool.max_age:
+            print(f"[SPOOL] Dropping stale tap {message.get('card_uid')} ({age:.0f}s old)")
+            spool.ack(message["tap_id"])
+            continue
+
+        await websocket.send(json.dumps({**message, "replayed": True}))
+        spool.ack(message["tap_id"])
+        replayed += 1
+        print(
+            f"[SPOOL] Replayed tap: {message.get('card_uid')} "
+            f"(reader_id: {message.get('reader_id')}, {age:.1f}s late)"
+        )
+
+    spool.compact()
+    return replayed
+
+
+class TapQueue(asyncio.Queue):
+    """
+    Bounded queue between the readers and the sender, with an overflow policy.
+
+    Policies:
+        block        Readers wait for room when the queue is full (nothing is dropped)
+        drop-oldest  The oldest queued tap is discarded to make room
+        coalesce     A tap for a UID already queued on the same reader is merged into
+                     the queued one; otherwise behaves like drop-oldest
+
+    Also keeps the queue-depth and send-latency stats reported by log_queue_stats.
+    """
+    POLICIES = ("block", "drop-oldest", "coalesce")
+
+    def __init__(self, maxsize: int = 100, policy: str = "coalesce"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}' (expected one of {', '.join(self.POLICIES)})")
+        super().__init__(maxsize)
+        self.policy = policy
+        self.max_depth = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.blocked = 0
+        self.sent = 0
+        self.send_seconds_total = 0.0
+        self.send_seconds_max = 0.0
+
+    async def publish(self, message: dict):
+        """Queue a tap message according to the overflow policy"""
+        # Every charge_result is a separate sale, so those are never merged
+        if self.policy == "coalesce" and message["type"] != "charge_result" and any(
+            queued["card_uid"] == message["card_uid"] and queued["reader_id"] == message["reader_id"]
+            and queued["type"] == message["type"]
+            for queued in self._queue
+        ):
+            self.coalesced += 1
+            return
+
+        if self.full():
+            if self.policy == "block":
+                self.blocked += 1
+                await self.put(message)
+                self.max_depth = max(self.max_depth, self.qsize())
+                return
+            oldest = self.get_nowait()
+            self.dropped += 1
+            print(f"[QUEUE] Full ({self.maxsize}), dropped oldest tap: {oldest['card_uid']} ({oldest['reader_id']})")
+
+        self.put_nowait(message)
+        self.max_depth = max(self.max_depth, self.qsize())
+
+    def record_send(self, seconds: float):
+        """Record how long one websocket send took"""
+        self.sent += 1
+        self.send_seconds_total += seconds
+        self.send_seconds_max = max(self.send_seconds_max, seconds)
+
+    def stats(self) -> dict:
+        """Snapshot of queue depth and send latency"""
+        return {
+            "depth": self.qsize(),
+            "max_depth": self.max_depth,
+            "capacity": self.maxsize,
+            "policy": self.policy,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "blocked": self.blocked,
+            "sent": self.sent,
+            "send_avg_ms": (self.send_seconds_total / self.sent * 1000) if self.sent else 0.0,
+            "send_max_ms": self.send_seconds_max * 1000,
+        }
+
+
+async def log_queue_stats(tap_queue: TapQueue, interval: float):
+    """Print queue stats every interval seconds until shutdown"""
+    while not shutdown_event.is_set():
+        try:
+            await asyncio.wait_for(shutdown_event.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+        stats = tap_queue.stats()
+        print(
+            f"[STATS] queue depth {stats['depth']}/{stats['capacity']} (max {stats['max_depth']}), "
+            f"sent {stats['sent']}, send avg {stats['send_avg_ms']:.1f}ms max {stats['send_max_ms']:.1f}ms, "
+            f"dropped {stats['dropped']}, coalesced {stats['coalesced']}, blocked {stats['blocked']}"
+        )
+
+
+def build_tap_message(card_uid: str, lane: str, reader_id: Optional[str] = None, event_type: str = "tap") -> dict:
+    """
+    Build a tap event, stamped with the time the reader saw the card.
 
     Args:
-        websocket: WebSocket connection
         card_uid: Card UID to broadcast
         lane: Lane identifier (for backward compatibility)
         reader_id: Reader identifier (e.g., 'reader-1', 'reader-2')
+        event_type: 'tap', or 'tap_end' when a held card is removed (presence mode)
 
     Returns:
-        True if successful, False otherwise
+        Tap message dict, ready to be sent as JSON
     """
     # Normalize lane/reader identifiers so every message is consistently tagged
     # - Prefer explicit reader_id (e.g., 'reader-1')
     # - Fall back to lane value (e.g., POS_LANE_ID) if reader_id is missing
     # - Never send empty/None lane values
-    try:
-        normalized_lane = (reader_id or lane or "default") or "default"
-        # Ensure we always send simple string identifiers
-        normalized_lane = str(normalized_lane).strip() or "default"
-        normalized_reader_id = str(reader_id or normalized_lane).strip()
-
-        message = {
-            "type": "tap",
-            "card_uid": card_uid,
-            "lane": normalized_lane,
-            "reader_id": normalized_reader_id,
-            "reader_ts": datetime.now(timezone.utc).isoformat(),
-        }
+    normalized_lane = (reader_id or lane or "default") or "default"
+    # Ensure we always send simple string identifiers
+    normalized_lane = str(normalized_lane).strip() or "default"
+    normalized_reader_id = str(reader_id or normalized_lane).strip()
+
+    return {
+        "type": event_type,
+        "card_uid": card_uid,
+        "lane": normalized_lane,
+        "reader_id": normalized_reader_id,
+        "reader_ts": datetime.now(timezone.utc).isoformat(),
+        "tap_id": uuid.uuid4().hex,
+    }
+
+
+async def send_tap_message(websocket, message: dict, spool: Optional[TapSpool] = None) -> bool:
+    """
+    Send a tap message via WebSocket.
+
+    Args:
+        websocket: WebSocket connection
+        message: Message from build_tap_message
+        spool: If given, a tap that fails to send is spooled for replay
 
+    Returns:
+        True if successful, False otherwise
+    """
+    try:
         await websocket.send(json.dumps(message))
+        event = {"tap_end": "Card removed", "charge_result": "Charge result sent"}.get(message["type"], "Tap broadcast")
         print(
-            f"[OK] Tap broadcast: {card_uid} "
-            f"(lane: {normalized_lane}, reader_id: {normalized_reader_id})"
+            f"[OK] {event}: {message['card_uid']} "
+            f"(lane: {message['lane']}, reader_id: {message['reader_id']})"
         )
         return True
 
     except Exception as e:
         print(f"[ERROR] Failed to broadcast tap: {e}")
+        if spool is not None:
+            spool.append(message)
+            print(f"[SPOOL] Tap spooled for replay: {message['card_uid']}")
         return False
 
 
-async def nfc_reader_loop(websocket, device: str, lane: str, reader_id: Optional[str] = None):
+async def broadcast_tap_ws(websocket, card_uid: str, lane: str, reader_id: Optional[str] = None,
+                           spool: Optional[TapSpool] = None) -> bool:
     """
-    Continuous NFC reader loop with card presence tracking.
+    Build and send a tap event via WebSocket.
 
     Args:
         websocket: WebSocket connection
-        device: NFC device string
+        card_uid: Card UID to broadcast
+        lane: Lane identifier (for backward compatibility)
+        reader_id: Reader identifier (e.g., 'reader-1', 'reader-2')
+        spool: If given, a tap that fails to send is spooled for replay
+
+    Returns:
+        True if successful, False otherwise
+    """
+    return await send_tap_message(websocket, build_tap_message(card_uid, lane, reader_id), spool)
+
+
+class AutoCharger:
+    """
+    Charges taps locally at a fixed price (auto-charge lanes).
+
+    Uses the same charge logic as pos.py: directly against the database with one
+    connection and card cache, or through ledger_daemon.py when a socket is given.
+    Charges run one at a time on a dedicated thread, shared by all readers.
+    """
+    RESULT_RE = re.compile(r"New balance: ¥(-?[0-9.]+)\. TX ID: ([0-9]+)")
+
+    def __init__(self, price: float, db_path: Optional[str] = None, ledger_socket: Optional[str] = None,
+                 staff: str = "tap-broadcaster"):
+        import pos
+        self.pos = pos
+        self.price = price
+        self.db_path = db_path or pos.DB
+        self.ledger_socket = ledger_socket
+        self.staff = staff
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="charge")
+        self._con = None
+        self._ledger = None
+        self._card_cache = pos.CardCache()
+
+    def _charge(self, uid: str) -> tuple[bool, str]:
+        """Blocking charge (runs on the charge thread, which owns the connection)"""
+        if self.ledger_socket:
+            from ledger_daemon import LedgerClient, LedgerOutcomeUnknown, LedgerUnavailable
+            if self._ledger is None:
+                self._ledger = LedgerClient(self.ledger_socket)
+            try:
+                return self._ledger.charge(uid, self.price, self.staff)
+            except LedgerUnavailable as e:
+                # Nothing reached the daemon, so a direct charge cannot double up
+                print(f"[CHARGE] Ledger daemon unavailable ({e}); charging directly")
+            except LedgerOutcomeUnknown as e:
+                print(f"[CHARGE] {uid}: {e}")
+                return False, f"Charge outcome unknown: {e}. Check the balance before charging again."
+        if self._con is None:
+            self._con = self.pos.connect(self.db_path)
+        return self.pos.charge_by_uid(uid, self.price, self.staff, con=self._con, card_cache=self._card_cache)
+
+    async def charge(self, uid: str) -> tuple[bool, str]:
+        """Charge one tap; errors are reported as a declined charge"""
+        try:
+            return await asyncio.get_event_loop().run_in_executor(self.executor, self._charge, uid)
+        except Exception as e:
+            print(f"[ERROR] Charge failed for {uid}: {e}")
+            return False, f"Charge failed: {e}"
+
+    def build_result(self, message: dict, ok: bool, text: str) -> dict:
+        """Turn a tap message into the charge_result event for the UI"""
+        result = dict(message, type="charge_result", ok=ok, message=text, price=self.price)
+        match = self.RESULT_RE.search(text) if ok else None
+        if match:
+            result["balance"] = float(match.group(1))
+            result["tx_id"] = int(match.group(2))
+        return result
+
+    def close(self):
+        """Stop the charge thread and close the connection"""
+        def close_connections():
+            if self._con is not None:
+                self._con.close()
+            if self._ledger is not None:
+                self._ledger.close()
+        self.executor.submit(close_connections)
+        self.executor.shutdown(wait=True)
+
+
+async def publish_tap(tap_queue: TapQueue, uid: str, lane: str, reader_id: Optional[str] = None,
+                      charger: Optional[AutoCharger] = None):
+    """
+    Publish a tap, or with a charger, charge it and publish the charge_result.
+
+    Args:
+        tap_queue: Queue drained by tap_sender
+        uid: Card UID that was read
         lane: Lane identifier (for backward compatibility)
         reader_id: Reader identifier (e.g., 'reader-1', 'reader-2')
+        charger: AutoCharger for auto-charge lanes, or None
+    """
+    message = build_tap_message(uid, lane, reader_id)
+    if charger is not None:
+        started = time.monotonic()
+        ok, text = await charger.charge(uid)
+        labels = {"reader": message["reader_id"], "result": "approved" if ok else "declined"}
+        metrics.inc("tap_charges_total", "Auto-charges by result", labels)
+        metrics.observe("tap_charge_seconds", "Time to charge a tap locally", time.monotonic() - started,
+                        {"reader": message["reader_id"]})
+        print(f"[CHARGE] {uid}: {'[OK] ' if ok else '[NO] '}{text}")
+        message = charger.build_result(message, ok, text)
+    await tap_queue.publish(message)
+
+
+async def nfc_reader_loop(tap_queue: TapQueue, reader: ReaderContext, lane: str):
+    """
+    Continuous NFC reader loop with card presence tracking.
+
+    Taps are published to tap_queue; the reader never waits on the WebSocket.
+
+    Args:
+        tap_queue: Queue drained by tap_sender
+        reader: Reader to poll (device, reader_id, card state and executor)
+        lane: Lane identifier (for backward compatibility)
     """
+    device = reader.device
+    reader_id = reader.reader_id
+    card_state = reader.card_state
+    labels = {"reader": reader_id}
+
     print(f"[NFC] Starting card reader loop on {device}")
     if reader_id:
         print(f"[NFC] Reader ID: {reader_id}")
@@ -363,58 +1319,126 @@ async def nfc_reader_loop(websocket, device: str, lane: str, reader_id: Optional
     consecutive_failures = 0
     last_success_time = time.time()
 
-    while not shutdown_event.is_set():
-        try:
-            # Read UID in thread pool (blocking call)
-            uid = await loop.run_in_executor(None, read_uid_from_pn532, device)
+    # One frontend per hardware connection; the session only reopens it after a hardware fault
+    session = open_reader_session(device)
+
+    # Presence mode: the tap is published from the reader thread as soon as the card
+    # is read, while read_uid keeps holding it until removal
+    tap_starts = []
+
+    async def publish_tap_start(uid: str):
+        retap = card_state.is_retap(uid)
+        if card_state.present_uid and card_state.present_uid != uid:
+            # The previous card left during a reader fault and never got its tap_end
+            await end_card(card_state.present_uid)
+        if retap:
+            # Same placement (read retried after an error, or edge-of-field flicker): never charge it twice
+            metrics.inc("tap_debounce_suppressed_total", "Reads suppressed by the debounce window", labels)
+            if uid != card_state.present_uid:
+                card_state.card_arrived(uid, published=False)
+            return
+        card_state.card_arrived(uid)
+        metrics.inc("tap_taps_total", "Taps published for sending", labels)
+        await publish_tap(tap_queue, uid, lane, reader_id, reader.charger)
+
+    async def publish_tap_end(uid: str):
+        # Make sure the card's tap went first, then end it
+        while tap_starts:
+            await asyncio.wrap_future(tap_starts.pop(0))
+        await end_card(uid)
+
+    async def end_card(uid: str):
+        """tap_end for the held card, unless its tap was suppressed"""
+        published = card_state.present_published
+        present_seconds = card_state.card_removed()
+        if not published:
+            return  # its tap was suppressed, so there is nothing to end
+        metrics.observe("tap_card_present_seconds", "How long a card rested on the reader", present_seconds, labels)
+        message = build_tap_message(uid, lane, reader_id, event_type="tap_end")
+        message["present_seconds"] = round(present_seconds, 3)
+        await tap_queue.publish(message)
+
+    def on_present(uid: str):
+        tap_starts.append(asyncio.run_coroutine_threadsafe(publish_tap_start(uid), loop))
+
+    read_uid = partial(session.read_uid, on_present) if reader.presence else session.read_uid
 
-            if uid:
-                # Check if we should broadcast this tap
-                if card_state.should_broadcast(uid):
-                    await broadcast_tap_ws(websocket, uid, lane, reader_id)
+    try:
+        while not shutdown_event.is_set():
+            metrics.set("tap_reader_consecutive_failures", "Consecutive reader errors", consecutive_failures, labels)
+            try:
+                # Read UID in thread pool (blocking call)
+                cycle_started = time.monotonic()
+                uid = await loop.run_in_executor(reader.executor, read_uid)
+                metrics.observe("tap_poll_cycle_seconds", "Duration of one reader poll", time.monotonic() - cycle_started, labels)
+
+                if uid and reader.presence:
+                    # The card has left the field
+                    await publish_tap_end(uid)
+
+                    consecutive_failures = 0
+                    last_success_time = time.time()
+                    await asyncio.sleep(0.1)
+                elif uid:
+                    # Check if we should broadcast this tap
+                    if card_state.should_broadcast(uid):
+                        metrics.inc("tap_taps_total", "Taps published for sending", labels)
+                        await publish_tap(tap_queue, uid, lane, reader_id, reader.charger)
+                    else:
+                        # Card still present, don't rebroadcast
+                        metrics.inc("tap_debounce_suppressed_total", "Reads suppressed by the debounce window", labels)
+
+                    # Reset failure counter on successful read
+                    consecutive_failures = 0
+                    last_success_time = time.time()
+
+                    # Small delay to prevent excessive polling
+                    await asyncio.sleep(0.1)
                 else:
-                    # Card still present, don't rebroadcast
-                    pass
-
-                # Reset failure counter on successful read
-                consecutive_failures = 0
-                last_success_time = time.time()
-
-                # Small delay to prevent excessive polling
-                await asyncio.sleep(0.1)
-            else:
-                # No card detected, reset state
-                card_state.reset()
-
-                # Check if we've been getting None for too long (potential hardware issue)
-                time_since_success = time.time() - last_success_time
-                if time_since_success > 60:  # 60 seconds of no reads might indicate hardware issue
-                    consecutive_failures += 1
-                    if consecutive_failures > 3:
-                        print(f"[WARNING] No card reads for {time_since_success:.0f}s (failure #{consecutive_failures})")
-                        # This might be normal (no cards), but log it for awareness
-                    last_success_time = time.time()  # Reset to avoid spam
-
-                # Small delay before next poll
-                await asyncio.sleep(0.1)
-
-        except asyncio.CancelledError:
-            print("[NFC] Reader loop cancelled")
-            break
-        except Exception as e:
-            consecutive_failures += 1
-            print(f"[ERROR] Reader error (failure #{consecutive_failures}): {e}")
+                    # No card detected, reset state
+                    card_state.reset()
+                    if reader.presence and card_state.present_uid:
+                        # The held card left while the reader was failing
+                        await publish_tap_end(card_state.present_uid)
+
+                    # Check if we've been getting None for too long (potential hardware issue)
+                    time_since_success = time.time() - last_success_time
+                    if time_since_success > 60:  # 60 seconds of no reads might indicate hardware issue
+                        consecutive_failures += 1
+                        if consecutive_failures > 3:
+                            print(f"[WARNING] No card reads for {time_since_success:.0f}s (failure #{consecutive_failures})")
+                            # This might be normal (no cards), but log it for awareness
+                        last_success_time = time.time()  # Reset to avoid spam
+
+                    # Small delay before next poll
+                    await asyncio.sleep(0.1)
+
+            except asyncio.CancelledError:
+                print("[NFC] Reader loop cancelled")
+                break
+            except Exception as e:
+                consecutive_failures += 1
+                metrics.set("tap_reader_consecutive_failures", "Consecutive reader errors", consecutive_failures, labels)
+                print(f"[ERROR] Reader error (failure #{consecutive_failures}): {e}")
+                if tap_starts:
+                    # Let taps read before the fault finish, so a later tap_end follows them
+                    await asyncio.gather(*map(asyncio.wrap_future, tap_starts), return_exceptions=True)
+                    tap_starts.clear()
             
-            # If we have many consecutive failures, hardware might be stuck
-            if consecutive_failures >= 10:
-                print(f"[ERROR] Too many consecutive failures ({consecutive_failures}), hardware may need reset")
-                # Raise exception to trigger hardware reconnection
-                raise
+                # If we have many consecutive failures, hardware might be stuck
+                if consecutive_failures >= 10:
+                    print(f"[ERROR] Too many consecutive failures ({consecutive_failures}), hardware may need reset")
+                    # Raise exception to trigger hardware reconnection
+                    raise
             
-            await asyncio.sleep(1)  # Wait before retry on error
+                await asyncio.sleep(1)  # Wait before retry on error
+
+    finally:
+        session.request_stop()
+        await loop.run_in_executor(reader.executor, session.close)
 
 
-async def nfc_reader_loop_with_reconnection(websocket, device: str, lane: str, reader_id: Optional[str] = None):
+async def nfc_reader_loop_with_reconnection(tap_queue: TapQueue, reader: ReaderContext, lane: str):
     """
     Wrapper around nfc_reader_loop that handles automatic hardware reconnection.
     
@@ -423,19 +1447,21 @@ async def nfc_reader_loop_with_reconnection(websocket, device: str, lane: str, r
     This ensures the reader keeps working without manual intervention.
     
     Args:
-        websocket: WebSocket connection
-        device: NFC device string
+        tap_queue: Queue drained by tap_sender
+        reader: Reader to poll (device, reader_id, card state and executor)
         lane: Lane identifier (for backward compatibility)
-        reader_id: Reader identifier (e.g., 'reader-1', 'reader-2')
     """
+    device = reader.device
+    labels = {"reader": reader.reader_id}
     reconnect_delay = 1
     max_reconnect_delay = 30
     reconnect_attempt = 0
+    failure_started = None
     
     while not shutdown_event.is_set():
         try:
             # Attempt to run the NFC reader loop
-            await nfc_reader_loop(websocket, device, lane, reader_id)
+            await nfc_reader_loop(tap_queue, reader, lane)
             
             # If we get here, the loop exited normally (shutdown)
             break
@@ -446,7 +1472,10 @@ async def nfc_reader_loop_with_reconnection(websocket, device: str, lane: str, r
             
         except Exception as e:
             reconnect_attempt += 1
-            print(f"[NFC] Hardware connection lost: {e}")
+            if failure_started is None:
+                failure_started = time.monotonic()
+                metrics.inc("tap_reader_hardware_failures_total", "Reader loops stopped by a hardware fault", labels)
+            print(f"[NFC] Hardware connection lost ({reader.reader_id}): {e}")
             print(f"[NFC] Attempting hardware reconnection #{reconnect_attempt} in {reconnect_delay}s...")
             
             # Wait before attempting reconnection
@@ -459,23 +1488,29 @@ async def nfc_reader_loop_with_reconnection(websocket, device: str, lane: str, r
             print(f"[NFC] Reinitializing hardware connection to {device}...")
             try:
                 # Test if we can connect to the device
-                import nfc
                 loop = asyncio.get_event_loop()
                 
                 def test_hardware():
                     """Quick hardware test"""
+                    session = open_reader_session(device)
                     try:
-                        with nfc.ContactlessFrontend(device) as clf:
-                            return True
+                        session.open()
+                        return True
                     except Exception as test_e:
                         print(f"[NFC] Hardware test failed: {test_e}")
                         return False
+                    finally:
+                        session.close()
                 
                 # Run hardware test in executor
-                hardware_ok = await loop.run_in_executor(None, test_hardware)
+                hardware_ok = await loop.run_in_executor(reader.executor, test_hardware)
                 
                 if hardware_ok:
                     print(f"[NFC] Hardware reconnection successful! Resuming reader loop...")
+                    metrics.inc("tap_reader_reconnects_total", "Successful hardware reconnections", labels)
+                    metrics.observe("tap_reader_recovery_seconds", "Time from hardware fault to successful reconnection",
+                                    time.monotonic() - failure_started, labels)
+                    failure_started = None
                     # Reset delay on successful reconnection
                     reconnect_delay = 1
                     reconnect_attempt = 0
@@ -492,14 +1527,16 @@ async def nfc_reader_loop_with_reconnection(websocket, device: str, lane: str, r
             print(f"[NFC] Next reconnection attempt in {reconnect_delay}s...")
 
 
-async def simulation_mode(websocket, lane: str, reader_id: Optional[str] = None):
+async def simulation_mode(tap_queue: TapQueue, lane: str, reader_id: Optional[str] = None,
+                          charger: Optional[AutoCharger] = None):
     """
     Interactive simulation mode - manually type UIDs.
 
     Args:
-        websocket: WebSocket connection
+        tap_queue: Queue drained by tap_sender
         lane: Lane identifier (for backward compatibility)
         reader_id: Reader identifier (e.g., 'reader-1', 'reader-2')
+        charger: AutoCharger for auto-charge lanes, or None
     """
     print("[SIMULATE] Manual UID entry mode. Type UID hex (or 'quit'):")
     if reader_id:
@@ -518,7 +1555,7 @@ async def simulation_mode(websocket, lane: str, reader_id: Optional[str] = None)
             if not uid:
                 continue
 
-            await broadcast_tap_ws(websocket, uid.upper(), lane, reader_id)
+            await publish_tap(tap_queue, uid.upper(), lane, reader_id, charger)
 
         except (EOFError, KeyboardInterrupt):
             break
@@ -558,27 +1595,101 @@ async def authenticate_websocket(websocket, secret: Optional[str], lane: str):
         return False
 
 
-async def websocket_broadcaster(url: str, secret: Optional[str], lane: str, device: str, simulate: bool, reader_id: Optional[str] = None):
+async def _next_tap(tap_queue: TapQueue, websocket=None, timeout: Optional[float] = None) -> Optional[dict]:
     """
-    Main WebSocket broadcaster with automatic reconnection.
+    Wait for the next queued tap.
 
-    Args:
-        url: Server URL (http://localhost:3000)
-        secret: Shared secret for authentication
-        lane: Lane identifier (for backward compatibility)
-        device: NFC device string
-        simulate: Whether to run in simulation mode
-        reader_id: Reader identifier (e.g., 'reader-1', 'reader-2')
+    Returns:
+        The tap message, or None on shutdown, timeout, or when websocket closes first
     """
-    # Convert HTTP URL to WebSocket URL
-    ws_url = url.replace("http://", "ws://").replace("https://", "wss://")
-    ws_url = f"{ws_url}/api/nfc/ws"
+    get_task = asyncio.ensure_future(tap_queue.get())
+    waiters = {get_task, asyncio.ensure_future(shutdown_event.wait())}
+    if websocket is not None:
+        waiters.add(asyncio.ensure_future(websocket.wait_closed()))
 
-    # Use reader_id as lane if available (maintains compatibility with existing server logic)
-    effective_lane = reader_id or lane
+    done, pending = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    return get_task.result() if get_task in done else None
+
+
+async def _hold_taps(tap_queue: TapQueue, spool: Optional[TapSpool], delay: float):
+    """
+    Wait out a reconnect delay (cut short by shutdown).
+
+    Taps published meanwhile are moved to the spool so they survive a restart;
+    without a spool they simply wait in the queue until the socket is back.
+    """
+    deadline = time.monotonic() + delay
+    while not shutdown_event.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if spool is None:
+            try:
+                await asyncio.wait_for(shutdown_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+            return
+        message = await _next_tap(tap_queue, timeout=remaining)
+        if message is not None:
+            spool.append(message)
+            print(f"[SPOOL] Tap spooled while disconnected: {message['card_uid']} ({message['reader_id']})")
+
+
+async def _send_and_record(websocket, tap_queue: TapQueue, message: dict, spool: Optional[TapSpool]) -> bool:
+    """Send one tap and record the send latency in the queue stats"""
+    started = time.monotonic()
+    ok = await send_tap_message(websocket, message, spool)
+    if ok:
+        send_seconds = time.monotonic() - started
+        tap_queue.record_send(send_seconds)
+        labels = {"reader": message["reader_id"]}
+        metrics.observe("tap_websocket_send_seconds", "Duration of one websocket send", send_seconds, labels)
+        metrics.observe("tap_send_latency_seconds", "Time from card read to tap sent", _tap_age_seconds(message), labels)
+    return ok
+
+
+async def _send_queued_taps(websocket, tap_queue: TapQueue, spool: Optional[TapSpool]):
+    """
+    Send queued taps until the socket closes, a send fails, or shutdown.
 
+    On shutdown, taps still queued are sent before returning.
+    """
+    while True:
+        message = await _next_tap(tap_queue, websocket=websocket)
+        if message is None:
+            if not shutdown_event.is_set():
+                return  # Socket closed
+            while not tap_queue.empty():
+                if not await _send_and_record(websocket, tap_queue, tap_queue.get_nowait(), spool):
+                    return
+            return
+
+        if not await _send_and_record(websocket, tap_queue, message, spool):
+            # The tap is spooled (if enabled); reconnect before sending anything else
+            return
+
+
+async def tap_sender(ws_url: str, secret: Optional[str], lane: str, tap_queue: TapQueue,
+                     spool: Optional[TapSpool] = None):
+    """
+    Own the WebSocket: connect, authenticate, replay the spool and send queued taps.
+
+    Runs until shutdown, reconnecting with exponential backoff. Readers keep
+    publishing into tap_queue the whole time, so a network blip never costs a
+    reader re-initialisation.
+
+    Args:
+        ws_url: WebSocket URL (ws://localhost:3000/api/nfc/ws)
+        secret: Shared secret for authentication
+        lane: Lane to authenticate as
+        tap_queue: Queue the readers publish taps to
+        spool: Spool for taps that cannot be sent; replayed after each (re-)authentication
+    """
     retry_delay = 1
     max_retry_delay = 60
+    connected_before = False
 
     while not shutdown_event.is_set():
         try:
@@ -593,35 +1704,166 @@ async def websocket_broadcaster(url: str, secret: Optional[str], lane: str, devi
                 print("[WS] Connected successfully")
 
                 # Authenticate
-                if not await authenticate_websocket(websocket, secret, effective_lane):
+                if not await authenticate_websocket(websocket, secret, lane):
                     print("[WS] Disconnecting due to auth failure")
-                    await asyncio.sleep(5)
+                    await _hold_taps(tap_queue, spool, 5)
                     continue
 
                 # Reset retry delay on successful connection
                 retry_delay = 1
+                if connected_before:
+                    metrics.inc("tap_websocket_reconnects_total", "WebSocket connections re-established")
+                connected_before = True
+                metrics.set("tap_websocket_connected", "1 while authenticated to the server", 1)
+
+                # Deliver taps spooled while the connection was down before any new ones
+                if spool is not None:
+                    await replay_spool(websocket, spool)
+
+                await _send_queued_taps(websocket, tap_queue, spool)
+                if not shutdown_event.is_set():
+                    print("[WS] Connection closed")
 
-                # Start NFC reader or simulation
-                if simulate:
-                    await simulation_mode(websocket, effective_lane, reader_id)
-                else:
-                    await nfc_reader_loop_with_reconnection(websocket, device, effective_lane, reader_id)
-                
         except websockets.exceptions.WebSocketException as e:
             print(f"[WS] Connection error: {e}")
         except ConnectionRefusedError:
             print(f"[WS] Connection refused - is the server running?")
         except Exception as e:
             print(f"[WS] Unexpected error: {e}")
-        
+
+        metrics.set("tap_websocket_connected", "1 while authenticated to the server", 0)
         if shutdown_event.is_set():
             break
-        
+
         # Exponential backoff for reconnection
         print(f"[WS] Reconnecting in {retry_delay}s...")
-        await asyncio.sleep(retry_delay)
+        await _hold_taps(tap_queue, spool, retry_delay)
         retry_delay = min(retry_delay * 2, max_retry_delay)
 
+    # Whatever could not be sent before shutdown goes to the spool
+    unsent = 0
+    while not tap_queue.empty():
+        message = tap_queue.get_nowait()
+        if spool is not None:
+            spool.append(message)
+        unsent += 1
+    if unsent:
+        print(f"[WS] {unsent} tap(s) unsent at shutdown" + (" (spooled)" if spool is not None else ""))
+
+
+def _export_queue_metrics(tap_queue: TapQueue):
+    """Copy the queue's own stats into the metrics registry"""
+    stats = tap_queue.stats()
+    metrics.set("tap_queue_depth", "Taps waiting to be sent", stats["depth"])
+    metrics.set("tap_queue_max_depth", "Highest queue depth seen", stats["max_depth"])
+    metrics.set("tap_queue_capacity", "Queue capacity", stats["capacity"])
+    metrics.set("tap_queue_dropped_total", "Taps dropped because the queue was full", stats["dropped"], kind="counter")
+    metrics.set("tap_queue_coalesced_total", "Taps merged into an already queued tap", stats["coalesced"], kind="counter")
+    metrics.set("tap_queue_blocked_total", "Publishes that waited for room", stats["blocked"], kind="counter")
+
+
+async def serve_metrics(host: str, port: int, tap_queue: TapQueue):
+    """
+    Serve GET /metrics in Prometheus text format until shutdown.
+
+    Deliberately tiny (no HTTP framework): one request per connection.
+    """
+    async def handle(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # Drain headers
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            path = parts[1] if len(parts) > 1 else ""
+
+            if path.split("?")[0] == "/metrics":
+                _export_queue_metrics(tap_queue)
+                status, body = "200 OK", metrics.render()
+            else:
+                status, body = "404 Not Found", "Not found. Try /metrics\n"
+
+            payload = body.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    try:
+        server = await asyncio.start_server(handle, host, port)
+    except OSError as e:
+        print(f"[METRICS] Could not listen on {host}:{port}: {e}")
+        return
+
+    print(f"[METRICS] Serving Prometheus metrics on http://{host}:{port}/metrics")
+    async with server:
+        await shutdown_event.wait()
+
+
+async def websocket_broadcaster(url: str, secret: Optional[str], lane: str, readers: list[ReaderContext], simulate: bool,
+                                spool: Optional[TapSpool] = None, queue_size: int = 100,
+                                queue_policy: str = "coalesce", stats_interval: float = 0,
+                                metrics_port: Optional[int] = None, metrics_host: str = "127.0.0.1"):
+    """
+    Main WebSocket broadcaster with automatic reconnection.
+
+    Readers run as long-lived tasks that publish taps into a queue; a separate
+    sender task owns the socket and its reconnect policy. All readers share the
+    one authenticated connection, and every tap is tagged with the reader_id of
+    the reader that produced it.
+
+    Args:
+        url: Server URL (http://localhost:3000)
+        secret: Shared secret for authentication
+        lane: Lane identifier (for backward compatibility)
+        readers: Readers to drive (only the first is used in simulation mode)
+        simulate: Whether to run in simulation mode
+        spool: Spool for taps that cannot be sent; replayed after each (re-)authentication
+        queue_size: Capacity of the queue between readers and sender
+        queue_policy: Overflow policy for that queue (see TapQueue)
+        stats_interval: Seconds between queue stats log lines (0 disables)
+        metrics_port: Serve Prometheus metrics on this port (None disables)
+        metrics_host: Address for the metrics endpoint
+    """
+    # Convert HTTP URL to WebSocket URL
+    ws_url = url.replace("http://", "ws://").replace("https://", "wss://")
+    ws_url = f"{ws_url}/api/nfc/ws"
+
+    # With a single reader, use its reader_id as lane (maintains compatibility with existing server logic).
+    # A multi-reader connection authenticates with the plain lane; taps still carry their own reader_id.
+    reader_id = readers[0].reader_id if len(readers) == 1 or simulate else None
+    effective_lane = reader_id or lane
+
+    tap_queue = TapQueue(queue_size, queue_policy)
+    sender_task = asyncio.ensure_future(tap_sender(ws_url, secret, effective_lane, tap_queue, spool))
+    stats_task = asyncio.ensure_future(log_queue_stats(tap_queue, stats_interval)) if stats_interval > 0 else None
+    metrics_task = asyncio.ensure_future(serve_metrics(metrics_host, metrics_port, tap_queue)) if metrics_port else None
+
+    try:
+        # Start NFC readers or simulation; they only return on shutdown (or end of simulated input)
+        if simulate:
+            await simulation_mode(tap_queue, effective_lane, reader_id, readers[0].charger)
+        else:
+            await asyncio.gather(*(
+                nfc_reader_loop_with_reconnection(tap_queue, reader, effective_lane)
+                for reader in readers
+            ))
+    finally:
+        # Let the sender flush what is queued and exit
+        shutdown_event.set()
+        await sender_task
+        if stats_task is not None:
+            await stats_task
+        if metrics_task is not None:
+            await metrics_task
+
 
 async def test_mode(url: str, secret: Optional[str], lane: str, reader_id: Optional[str] = None):
     """
@@ -667,6 +1909,213 @@ async def test_mode(url: str, secret: Optional[str], lane: str, reader_id: Optio
         return 1
 
 
+def load_bench_trace(path: str, lanes: list[str]) -> list[tuple[float, str]]:
+    """
+    Load a recorded tap trace for bench_mode.
+
+    Each line is a JSON object with either 't' (seconds from the start) or
+    'reader_ts' (ISO timestamp, as in tap messages and the spool file), and
+    optionally 'lane' / 'reader_id'. Taps without a lane are spread round-robin
+    over the bench lanes. UIDs are not replayed: every tap gets a unique UID so
+    the server's duplicate filter does not hide it.
+
+    Returns:
+        List of (offset_seconds, lane) sorted by offset
+    """
+    events = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "t" in record:
+                at = float(record["t"])
+            else:
+                at = datetime.fromisoformat(record["reader_ts"]).timestamp()
+            lane = record.get("lane") or record.get("reader_id") or lanes[len(events) % len(lanes)]
+            events.append((at, lane))
+
+    events.sort()
+    start = events[0][0] if events else 0.0
+    return [(at - start, lane) for at, lane in events]
+
+
+async def bench_mode(url: str, secret: Optional[str], connections: int, lanes: int, subscribers: int,
+                     rate: float, duration: float, trace: Optional[str] = None) -> int:
+    """
+    Load-test the server's /api/nfc/ws path without hardware.
+
+    Opens `connections` broadcaster connections spread over `lanes` lanes, plus
+    `subscribers` client connections per lane, then sends uniquely numbered taps
+    at `rate` taps/second for `duration` seconds (or on the schedule of a
+    recorded trace). Every tap is timed from just before the send to its
+    arrival at each subscriber on its lane:
+
+        round-trip  send -> first subscriber receives it
+        fan-out     send -> last subscriber on the lane receives it
+
+    Args:
+        url: Server URL
+        secret: Shared secret
+        connections: Number of broadcaster connections
+        lanes: Number of lanes (bench-1 .. bench-N)
+        subscribers: Client connections per lane
+        rate: Taps per second across all connections (ignored with trace)
+        duration: Seconds to send for (ignored with trace)
+        trace: Optional trace file (see load_bench_trace)
+
+    Returns:
+        0 if every tap reached every subscriber, 1 otherwise
+    """
+    ws_url = url.replace("http://", "ws://").replace("https://", "wss://")
+    ws_url = f"{ws_url}/api/nfc/ws"
+    lane_names = [f"bench-{i + 1}" for i in range(max(1, lanes))]
+
+    if trace:
+        schedule = load_bench_trace(trace, lane_names)
+        lane_names = sorted(set(lane_names) | {lane for _, lane in schedule})
+    else:
+        count = int(rate * duration)
+        schedule = [(i / rate, lane_names[i % len(lane_names)]) for i in range(count)]
+
+    sent_at = {}          # card_uid -> perf_counter at send
+    expected = {}         # card_uid -> subscribers that should see it
+    received = {}         # card_uid -> subscribers that saw it so far
+    round_trip = []
+    fan_out = []
+    send_errors = 0
+    run_id = uuid.uuid4().hex[:4].upper()
+
+    async def drain(websocket):
+        # Server pings and errors; broadcasters never receive taps
+        try:
+            async for raw in websocket:
+                data = json.loads(raw)
+                if data.get("type") == "ping":
+                    await websocket.send(json.dumps({"type": "pong"}))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def subscribe(websocket):
+        try:
+            async for raw in websocket:
+                now = time.perf_counter()
+                uid = json.loads(raw).get("card_uid")
+                if uid not in sent_at:
+                    continue
+                received[uid] += 1
+                if received[uid] == 1:
+                    round_trip.append(now - sent_at[uid])
+                if received[uid] == expected[uid]:
+                    fan_out.append(now - sent_at[uid])
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    sockets = []
+    tasks = []
+    try:
+        # Subscribers first, so no tap is sent before everyone listens
+        lane_subscribers = {}
+        for lane in lane_names:
+            for _ in range(subscribers):
+                websocket = await websockets.connect(f"{ws_url}?lane={lane}", ping_interval=None, max_queue=None)
+                sockets.append(websocket)
+                await websocket.send(json.dumps({"type": "auth", "role": "client"}))
+                if json.loads(await websocket.recv()).get("type") != "auth_success":
+                    print(f"[BENCH] Subscriber authentication failed (lane: {lane})")
+                    return 1
+                tasks.append(asyncio.create_task(subscribe(websocket)))
+                lane_subscribers[lane] = lane_subscribers.get(lane, 0) + 1
+
+        broadcasters = []
+        for i in range(max(1, connections)):
+            lane = lane_names[i % len(lane_names)]
+            websocket = await websockets.connect(ws_url, ping_interval=None)
+            sockets.append(websocket)
+            if not await authenticate_websocket(websocket, secret, lane):
+                print("[BENCH] Broadcaster authentication failed")
+                return 1
+            tasks.append(asyncio.create_task(drain(websocket)))
+            broadcasters.append((lane, websocket))
+
+        print(f"[BENCH] {len(broadcasters)} broadcaster(s), {len(lane_names)} lane(s), "
+              f"{subscribers} subscriber(s) per lane, {len(schedule)} tap(s) to send")
+
+        by_lane = {}
+        for lane, websocket in broadcasters:
+            by_lane.setdefault(lane, []).append(websocket)
+        next_socket = {lane: 0 for lane in by_lane}
+
+        async def send_one(seq: int, lane: str):
+            nonlocal send_errors
+            # Trace lanes without a broadcaster of their own go out on any connection
+            pool = by_lane.get(lane) or [ws for _, ws in broadcasters]
+            idx = next_socket.get(lane, 0)
+            next_socket[lane] = idx + 1
+            websocket = pool[idx % len(pool)]
+
+            uid = f"B{run_id}{seq:07X}"
+            message = build_tap_message(uid, lane, lane)
+            expected[uid] = lane_subscribers.get(lane, 0)
+            received[uid] = 0
+            sent_at[uid] = time.perf_counter()
+            try:
+                await websocket.send(json.dumps(message))
+            except Exception as e:
+                send_errors += 1
+                del sent_at[uid]
+                print(f"[BENCH] Send failed: {e}")
+
+        started = time.perf_counter()
+        sends = []
+        for seq, (offset, lane) in enumerate(schedule):
+            if shutdown_event.is_set():
+                print("[BENCH] Interrupted, stopping early")
+                break
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sends.append(asyncio.create_task(send_one(seq, lane)))
+        if sends:
+            await asyncio.gather(*sends)
+        send_seconds = time.perf_counter() - started
+
+        # Give the last taps time to arrive
+        deadline = time.perf_counter() + 5
+        while len(fan_out) < sum(1 for uid in sent_at if expected[uid]) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+
+    except Exception as e:
+        print(f"[BENCH] Error: {e}")
+        return 1
+    finally:
+        for task in tasks:
+            task.cancel()
+        for websocket in sockets:
+            await websocket.close()
+
+    from bench_charges import percentile  # same percentile definition as the charge benchmark
+
+    sent = len(sent_at)
+    incomplete = sum(1 for uid in sent_at if received[uid] < expected[uid])
+    round_trip.sort()
+    fan_out.sort()
+
+    print("\n[BENCH] Results")
+    print(f"  Taps sent:       {sent} in {send_seconds:.2f}s ({sent / send_seconds if send_seconds else 0:.1f}/s)")
+    print(f"  Send errors:     {send_errors}")
+    print(f"  Not delivered to every subscriber: {incomplete}")
+    for name, values in (("Round-trip", round_trip), ("Fan-out", fan_out)):
+        print(
+            f"  {name + ':':<16} p50 {percentile(values, 50) * 1000:.1f}ms  "
+            f"p99 {percentile(values, 99) * 1000:.1f}ms  "
+            f"max {(values[-1] if values else 0) * 1000:.1f}ms  (n={len(values)})"
+        )
+
+    return 0 if incomplete == 0 and send_errors == 0 else 1
+
+
 def signal_handler(signum, frame):
     """Handle shutdown signals gracefully"""
     print("\n[SIGNAL] Shutdown signal received")
@@ -698,6 +2147,99 @@ async def main():
         default=os.getenv("PN532_DEVICE", "tty:AMA0:pn532"),
         help="NFC device string (default: tty:AMA0:pn532 or $PN532_DEVICE)",
     )
+    parser.add_argument(
+        "--multi",
+        action="store_true",
+        help="Drive every detected reader from this one process over a single WebSocket",
+    )
+    parser.add_argument(
+        "--readers",
+        default=os.getenv("PN532_READERS"),
+        help="Readers to drive in one process, e.g. 'reader-1=tty:USB0:pn532,reader-2=tty:USB1:pn532' "
+             "(default: $PN532_READERS; implies --multi)",
+    )
+    parser.add_argument(
+        "--reader-cache",
+        default=os.getenv("NFC_READER_CACHE", "nfc-readers.json"),
+        help="File remembering which USB port is which reader, so auto-detection only probes "
+             "changed ports (default: nfc-readers.json or $NFC_READER_CACHE; '' disables)",
+    )
+    parser.add_argument(
+        "--presence",
+        action="store_true",
+        default=os.getenv("TAP_PRESENCE_MODE", "").lower() in ("1", "true", "yes"),
+        help="Hold each card until it is removed and send tap / tap_end events instead of "
+             "debouncing repeated reads (default: off or $TAP_PRESENCE_MODE)",
+    )
+    parser.add_argument(
+        "--retap-seconds",
+        type=float,
+        default=float(os.getenv("TAP_RETAP_SECONDS", "1.0")),
+        help="Presence mode: ignore the same card read again while held or returning within this many "
+             "seconds of leaving the reader (default: 1.0 or $TAP_RETAP_SECONDS)",
+    )
+    parser.add_argument(
+        "--auto-charge",
+        type=float,
+        metavar="PRICE",
+        default=float(os.getenv("TAP_AUTO_CHARGE", "0")) or None,
+        help="Fixed-price lane: charge every tap this many CNY locally and send the result to the UI "
+             "instead of the tap; implies --presence (default: off or $TAP_AUTO_CHARGE)",
+    )
+    parser.add_argument(
+        "--db",
+        default=os.getenv("DATABASE_PATH"),
+        help="SQLite database for --auto-charge (default: stuco.db or $DATABASE_PATH)",
+    )
+    parser.add_argument(
+        "--ledger-socket",
+        default=os.getenv("STUCO_LEDGER_SOCKET"),
+        help="Charge through ledger_daemon.py on this Unix socket instead of opening the database "
+             "(default: $STUCO_LEDGER_SOCKET)",
+    )
+    parser.add_argument(
+        "--spool",
+        default=os.getenv("TAP_SPOOL_PATH"),
+        help="File for taps that could not be sent; replayed after reconnecting "
+             "(default: tap-spool-<lane>.jsonl or $TAP_SPOOL_PATH; '' disables)",
+    )
+    parser.add_argument(
+        "--spool-max-age",
+        type=float,
+        default=float(os.getenv("TAP_SPOOL_MAX_AGE", "300")),
+        help="Drop spooled taps older than this many seconds instead of replaying them "
+             "(default: 300 or $TAP_SPOOL_MAX_AGE; 0 keeps all)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=int(os.getenv("TAP_QUEUE_SIZE", "100")),
+        help="Capacity of the in-memory queue between readers and the WebSocket (default: 100 or $TAP_QUEUE_SIZE)",
+    )
+    parser.add_argument(
+        "--queue-policy",
+        choices=TapQueue.POLICIES,
+        default=os.getenv("TAP_QUEUE_POLICY", "coalesce"),
+        help="What to do when the queue is full: block the reader, drop the oldest tap, or coalesce "
+             "repeated UIDs (default: coalesce or $TAP_QUEUE_POLICY)",
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        default=float(os.getenv("TAP_STATS_INTERVAL", "0")),
+        help="Log queue depth and send latency every N seconds (default: off or $TAP_STATS_INTERVAL)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=int(os.getenv("TAP_METRICS_PORT", "0")) or None,
+        help="Serve Prometheus metrics on http://HOST:PORT/metrics (default: off or $TAP_METRICS_PORT)",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        default=os.getenv("TAP_METRICS_HOST", "127.0.0.1"),
+        help="Address for the metrics endpoint (default: 127.0.0.1 or $TAP_METRICS_HOST)",
+    )
     parser.add_argument(
         "--simulate",
         action="store_true",
@@ -708,6 +2250,45 @@ async def main():
         action="store_true",
         help="Send a single test tap and exit",
     )
+    parser.add_argument(
+        "--bench",
+        action="store_true",
+        help="Load-test the server: many broadcaster and client connections, report latency, then exit",
+    )
+    parser.add_argument(
+        "--bench-connections",
+        type=int,
+        default=10,
+        help="Broadcaster connections for --bench (default: 10)",
+    )
+    parser.add_argument(
+        "--bench-lanes",
+        type=int,
+        default=4,
+        help="Lanes the --bench broadcasters are spread over (default: 4)",
+    )
+    parser.add_argument(
+        "--bench-subscribers",
+        type=int,
+        default=2,
+        help="Client connections per lane for --bench (default: 2)",
+    )
+    parser.add_argument(
+        "--bench-rate",
+        type=float,
+        default=50,
+        help="Taps per second across all --bench connections (default: 50)",
+    )
+    parser.add_argument(
+        "--bench-duration",
+        type=float,
+        default=10,
+        help="Seconds to send taps for with --bench (default: 10)",
+    )
+    parser.add_argument(
+        "--bench-trace",
+        help="Replay tap timing from a JSON-lines trace ('t' or 'reader_ts', optional 'lane') instead of --bench-rate",
+    )
     
     args = parser.parse_args()
 
@@ -715,14 +2296,41 @@ async def main():
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
+    # Benchmark mode - no hardware involved
+    if args.bench:
+        exit_code = await bench_mode(
+            args.url,
+            args.secret,
+            args.bench_connections,
+            args.bench_lanes,
+            args.bench_subscribers,
+            args.bench_rate,
+            args.bench_duration,
+            args.bench_trace,
+        )
+        sys.exit(exit_code)
+
     # Auto-detect device and reader ID if not in simulation/test mode
     reader_id = None
     final_device = args.device
+    multi = (args.multi or bool(args.readers)) and not args.simulate and not args.test
+    reader_specs = []
+
+    if multi:
+        # One process drives every configured (or detected) reader
+        reader_specs = parse_reader_specs(args.readers) if args.readers else detect_nfc_devices(cache_path=args.reader_cache)
+        if not reader_specs:
+            print("[DEVICE] No readers configured or detected for multi-reader mode")
+            sys.exit(1)
+        for device, rid in reader_specs:
+            print(f"[DEVICE] Multi-reader: {rid} -> {device}")
+        reader_id = ", ".join(rid for _, rid in reader_specs)
+        final_device = f"MULTI ({len(reader_specs)} readers)"
 
     # Only auto-detect if PN532_DEVICE env var is NOT explicitly set
     # This prevents race conditions when multiple services start simultaneously
-    if not args.simulate and not args.test and not os.getenv('PN532_DEVICE'):
-        detected_device, detected_reader_id = auto_detect_nfc_device()
+    elif not args.simulate and not args.test and not os.getenv('PN532_DEVICE'):
+        detected_device, detected_reader_id = auto_detect_nfc_device(cache_path=args.reader_cache)
         if detected_device:
             final_device = detected_device
             reader_id = detected_reader_id
@@ -766,6 +2374,7 @@ async def main():
 ║ Device:  {final_device:<52} ║
 ║ Secret:  {'[SET]' if args.secret else '[NOT SET]':<52} ║
 ║ Mode:    {'TEST' if args.test else 'SIMULATE' if args.simulate else 'HARDWARE':<52} ║
+║ Charge:  {f'AUTO ¥{args.auto_charge:.1f}' if args.auto_charge else 'off (UI charges)':<52} ║
 ╚═══════════════════════════════════════════════════════════════╝
 """)
 
@@ -774,18 +2383,65 @@ async def main():
         exit_code = await test_mode(args.url, args.secret, args.lane, reader_id)
         sys.exit(exit_code)
 
+    # Auto-charge lanes charge each card once per placement, so they always run in presence mode
+    charger = None
+    if args.auto_charge is not None:
+        if args.auto_charge <= 0:
+            print("[CHARGE] --auto-charge needs a positive price")
+            sys.exit(1)
+        charger = AutoCharger(args.auto_charge, args.db, args.ledger_socket)
+        via = f"ledger daemon at {args.ledger_socket}" if args.ledger_socket else os.path.abspath(charger.db_path)
+        print(f"[CHARGE] Auto-charge ¥{args.auto_charge:.1f} per tap via {via}")
+
+    if not multi:
+        reader_specs = [(final_device, reader_id)]
+    readers = [
+        ReaderContext(device, rid, presence=args.presence or charger is not None, charger=charger,
+                      retap_seconds=args.retap_seconds)
+        for device, rid in reader_specs
+    ]
+
+    # Without removal detection a resting card reads as a new tap on every poll (and is charged each time)
+    no_presence = [r.device for r in readers if r.presence and not supports_presence(r.device)]
+    if no_presence and not args.simulate:
+        mode = "--auto-charge" if charger is not None else "--presence"
+        print(f"[NFC] {mode} needs a reader backend that detects card removal, but libnfc could not be "
+              f"loaded for {', '.join(no_presence)} (nfc-list fallback). Install libnfc or run without {mode}.")
+        sys.exit(1)
+
+    # Separate spool per lane so per-reader services never share a file
+    spool_path = args.spool
+    if spool_path is None:
+        spool_lane = readers[0].reader_id if len(readers) == 1 else args.lane
+        spool_path = f"tap-spool-{spool_lane or 'default'}.jsonl"
+    spool = TapSpool(spool_path, max_age=args.spool_max_age) if spool_path else None
+    if spool is not None:
+        print(f"[SPOOL] Unsent taps are spooled to {os.path.abspath(spool_path)}")
+
     # Main broadcaster mode
     try:
         await websocket_broadcaster(
             args.url,
             args.secret,
             args.lane,
-            final_device,
+            readers,
             args.simulate,
-            reader_id
+            spool,
+            args.queue_size,
+            args.queue_policy,
+            args.stats_interval,
+            args.metrics_port,
+            args.metrics_host,
         )
     except KeyboardInterrupt:
         pass
+    finally:
+        for reader in readers:
+            reader.shutdown()
+        if charger is not None:
+            charger.close()
+        if spool is not None:
+            spool.close()
 
     print("[EXIT] Shutting down.")
 
@@ -1,43 +1,256 @@
-import argparse, sqlite3
+import argparse, sqlite3, os, csv, json, math, sys, time
 
 DB = "stuco.db"
+MAX_AMOUNT = 1_000_000.0  # CNY per charge/top-up; anything larger is a typo or a client bug
 
-def topup(uid_hex: str, amount: float, staff="admin"):
+def topup(uid_hex: str, amount: float, staff="admin", con=None):
+    """Top up a card; returns (ok, message). Pass `con` to reuse an open connection."""
     if amount <= 0:
-        print("Amount must be a positive number.")
-        return
+        return False, "Amount must be a positive number."
+    if con is None:
+        con = sqlite3.connect(DB)
+        con.execute("PRAGMA foreign_keys=ON;")
+        con.execute("PRAGMA busy_timeout=5000;")
+        try:
+            return topup(uid_hex, amount, staff, con)
+        finally:
+            con.close()
     
+    cur = con.cursor()
+    cur.execute("BEGIN IMMEDIATE;")  # atomic top-up + log
+    try:
+        ok, msg = topup_in_transaction(cur, uid_hex, amount, staff)
+    except BaseException:
+        con.rollback()
+        raise
+    if ok:
+        con.commit()
+    else:
+        con.rollback()
+    return ok, msg
+
+def topup_in_transaction(cur, uid_hex: str, amount: float, staff="admin"):
+    """Top-up logic of topup(), run inside a write transaction the caller holds (never commits)."""
+    if amount <= 0:
+        return False, "Amount must be a positive number."
+
     # Convert to tenths (e.g., 5.5 -> 55)
     amount_tenths = round(amount * 10)
 
-    con = sqlite3.connect(DB)
-    con.execute("PRAGMA foreign_keys=ON;")
-    con.execute("PRAGMA busy_timeout=5000;")
-    cur = con.cursor()
-
     row = cur.execute("SELECT student_id FROM cards WHERE card_uid=? AND status='active'", (uid_hex,)).fetchone()
     if not row:
-        print("Card not found or inactive.")
-        return
+        return False, "Card not found or inactive."
     sid = row[0]
 
-    cur.execute("BEGIN IMMEDIATE;")  # atomic top-up + log
     cur.execute("UPDATE accounts SET balance = balance + ? WHERE student_id=?", (amount_tenths, sid))
     cur.execute("""INSERT INTO transactions(student_id, card_uid, type, amount, description, staff)
                    VALUES (?,?,?,?,?,?)""",
                 (sid, uid_hex, 'TOPUP', amount_tenths, 'manual top-up', staff))
     tx_id = cur.lastrowid
-    con.commit()
     newbal_tenths = cur.execute("SELECT balance FROM accounts WHERE student_id=?", (sid,)).fetchone()[0]
     newbal = newbal_tenths / 10.0
-    con.close()
-    print(f"Topped up ¥{amount:.1f}. New balance: ¥{newbal:.1f}. TX ID: {tx_id}")
+    return True, f"Topped up ¥{amount:.1f}. New balance: ¥{newbal:.1f}. TX ID: {tx_id}"
+
+BULK_FIELDS = ["row", "uid", "name", "student_id", "amount", "status", "message", "tx_id", "new_balance"]
+
+def read_bulk_csv(path: str, default_amount=None):
+    """
+    Rows of a bulk top-up CSV: a 'uid' or 'name' column, plus 'amount' (else default_amount)
+    and optional 'description'. Returns [{row, uid, name, amount, description}], amount may be
+    None or a string when invalid (reported by resolve_bulk).
+    """
+    rows = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        fields = [name.strip().lower() for name in reader.fieldnames or []]
+        if "uid" not in fields and "name" not in fields:
+            raise ValueError(f"CSV needs a 'uid' or 'name' column (found: {', '.join(fields)})")
+        if "amount" not in fields and default_amount is None:
+            raise ValueError("CSV has no 'amount' column; pass --amount")
+        reader.fieldnames = fields
+        for line, rec in enumerate(reader, start=2):
+            raw = (rec.get("amount") or "").strip()
+            try:
+                amount = float(raw) if raw else default_amount
+            except ValueError:
+                amount = raw
+            rows.append({"row": line, "uid": (rec.get("uid") or "").strip().upper(),
+                         "name": (rec.get("name") or "").strip(), "amount": amount,
+                         "description": (rec.get("description") or "").strip() or "bulk top-up"})
+    return rows
+
+def filter_bulk_rows(con, amount: float, name_like: str = "%"):
+    """One row per student with an account whose name matches the SQL LIKE pattern"""
+    students = con.execute("""SELECT s.id, s.name FROM students s JOIN accounts a ON a.student_id=s.id
+                              WHERE s.name LIKE ? ORDER BY s.name""", (name_like,)).fetchall()
+    return [{"row": n, "uid": "", "name": name, "student_id": sid, "amount": amount,
+             "description": "bulk top-up"} for n, (sid, name) in enumerate(students, start=1)]
+
+def resolve_bulk(con, rows):
+    """
+    Validate every row before anything is written: resolve the card or name to a
+    student with an account and check the amount. Returns (valid_rows, error_rows);
+    error rows carry status 'error' and a message.
+    """
+    cards = dict(con.execute("SELECT card_uid, student_id FROM cards WHERE status='active'"))
+    names = dict(con.execute("SELECT id, name FROM students"))
+    accounts = {sid for (sid,) in con.execute("SELECT student_id FROM accounts")}
+    by_name = {name: sid for sid, name in names.items()}
+    by_folded_name = {}  # names are unique, but only case-sensitively
+    for sid, name in names.items():
+        by_folded_name.setdefault(name.lower(), []).append(sid)
+    valid, errors = [], []
+    for row in rows:
+        amount, sid, problem = row["amount"], row.get("student_id"), None
+        if sid is None:
+            if row["uid"]:
+                sid = cards.get(row["uid"])
+                problem = None if sid else "Card not found or inactive."
+            elif row["name"]:
+                # Exact name first; a case-insensitive match only if it names one student
+                sid = by_name.get(row["name"])
+                if sid is None:
+                    matches = by_folded_name.get(row["name"].lower(), [])
+                    sid = matches[0] if len(matches) == 1 else None
+                    if not matches:
+                        problem = "Student not found."
+                    elif sid is None:
+                        problem = f"Name is ambiguous: {len(matches)} students differ only in case. Use the exact name or the card UID."
+            else:
+                problem = "Row has no uid or name."
+        if not problem and sid not in accounts:
+            problem = "Student has no account."
+        if not problem and (not isinstance(amount, float) or not math.isfinite(amount) or amount <= 0):
+            problem = "Amount must be a positive number."
+        if not problem and amount > MAX_AMOUNT:
+            problem = f"Amount must be at most {MAX_AMOUNT:.0f}."
+        row = dict(row, student_id=sid, name=row["name"] or names.get(sid, ""))
+        if problem:
+            errors.append(dict(row, status="error", message=problem))
+        else:
+            valid.append(row)
+    return valid, errors
+
+def bulk_topup(con, rows, staff="admin", chunk_size=500):
+    """
+    Apply validated rows in chunks, each chunk one BEGIN IMMEDIATE transaction using
+    executemany. Returns the rows with status, message, tx_id and new_balance.
+    """
+    results = []
+    cur = con.cursor()
+    for start in range(0, len(rows), max(1, chunk_size)):
+        chunk = rows[start:start + max(1, chunk_size)]
+        params = [(row["student_id"], row["uid"] or None, round(row["amount"] * 10), row["description"], staff)
+                  for row in chunk]
+        cur.execute("BEGIN IMMEDIATE;")
+        try:
+            sids = json.dumps(sorted({row["student_id"] for row in chunk}))
+            balances = dict(cur.execute("""SELECT student_id, balance FROM accounts
+                                           WHERE student_id IN (SELECT value FROM json_each(?))""", (sids,)))
+            cur.executemany("UPDATE accounts SET balance = balance + ? WHERE student_id=?",
+                            [(tenths, sid) for sid, _, tenths, _, _ in params])
+            cur.executemany("""INSERT INTO transactions(student_id, card_uid, type, amount, description, staff)
+                               VALUES (?,?,'TOPUP',?,?,?)""", params)
+            # AUTOINCREMENT ids are consecutive while we hold the write lock
+            first_tx = cur.execute("SELECT MAX(id) FROM transactions").fetchone()[0] - len(chunk) + 1
+        except BaseException:
+            con.rollback()
+            raise
+        con.commit()
+        for n, (row, (sid, _, tenths, _, _)) in enumerate(zip(chunk, params)):
+            balances[sid] += tenths
+            newbal = balances[sid] / 10.0
+            results.append(dict(row, status="ok", tx_id=first_tx + n, new_balance=newbal,
+                                message=f"Topped up ¥{row['amount']:.1f}. New balance: ¥{newbal:.1f}. TX ID: {first_tx + n}"))
+    return results
+
+def print_bulk_report(results, report_path=None):
+    """Per-row result lines, plus a CSV report if asked"""
+    for row in sorted(results, key=lambda r: r["row"]):
+        who = " ".join(part for part in (row["uid"], f"({row['name']})" if row["name"] else "") if part)
+        print(f"{'[OK]' if row['status'] == 'ok' else '[--]' if row['status'] == 'skipped' else '[NO]'} "
+              f"row {row['row']} {who}: {row['message']}")
+    if report_path:
+        with open(report_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=BULK_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(sorted(results, key=lambda r: r["row"]))
+        print(f"Report written to {report_path}")
+
+def bulk_main(args):
+    con = sqlite3.connect(DB)
+    con.execute("PRAGMA foreign_keys=ON;")
+    con.execute("PRAGMA busy_timeout=5000;")
+    try:
+        if args.csv:
+            try:
+                rows = read_bulk_csv(args.csv, args.bulk_amount)
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}")
+                return 1
+        else:
+            if args.bulk_amount is None:
+                print("Error: --amount is required with --all / --name-like")
+                return 1
+            rows = filter_bulk_rows(con, args.bulk_amount, args.name_like or "%")
+
+        valid, errors = resolve_bulk(con, rows)
+        total = sum(row["amount"] for row in valid)
+        print(f"{len(rows)} row(s): {len(valid)} valid, {len(errors)} invalid; total ¥{total:.1f}")
+        if errors and not args.skip_invalid:
+            skipped = [dict(row, status="skipped", message="Not applied (other rows invalid).") for row in valid]
+            print_bulk_report(errors + skipped, args.report)
+            print("Nothing applied. Fix the rows above or pass --skip-invalid.")
+            return 1
+        if args.dry_run:
+            planned = [dict(row, status="skipped", message=f"Would top up ¥{row['amount']:.1f} (dry run).")
+                       for row in valid]
+            print_bulk_report(errors + planned, args.report)
+            return 1 if errors else 0
+
+        started = time.time()
+        results = bulk_topup(con, valid, args.staff, args.chunk_size)
+        print_bulk_report(errors + results, args.report)
+        print(f"Applied {len(results)} top-up(s), ¥{total:.1f} in {time.time() - started:.2f}s")
+        return 1 if errors else 0
+    finally:
+        con.close()
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
-    ap.add_argument("uid", help="Card UID hex")
-    ap.add_argument("amount", type=float, help="Amount in CNY (e.g., 20.5 = ¥20.5)")
+    ap.add_argument("uid", nargs="?", help="Card UID hex")
+    ap.add_argument("amount", type=float, nargs="?", help="Amount in CNY (e.g., 20.5 = ¥20.5)")
     ap.add_argument("--staff", default="admin")
+    ap.add_argument("--ledger-socket", default=os.getenv("STUCO_LEDGER_SOCKET"),
+                    help="top up through ledger_daemon.py on this Unix socket (default: $STUCO_LEDGER_SOCKET)")
+    bulk = ap.add_argument_group("bulk top-up")
+    bulk.add_argument("--csv", help="CSV with a uid or name column, and amount (or --amount) per row")
+    bulk.add_argument("--all", action="store_true", help="top up every student with an account by --amount")
+    bulk.add_argument("--name-like", help="top up students whose name matches this SQL LIKE pattern, e.g. 'G10 %%'")
+    bulk.add_argument("--amount", dest="bulk_amount", type=float, help="amount in CNY for --all / --name-like, or for CSV rows without one")
+    bulk.add_argument("--dry-run", action="store_true", help="validate and show what would be applied")
+    bulk.add_argument("--skip-invalid", action="store_true", help="apply the valid rows even if some are invalid")
+    bulk.add_argument("--report", help="write the per-row results to this CSV file")
+    bulk.add_argument("--chunk-size", type=int, default=500, help="rows per transaction (default: 500)")
     args = ap.parse_args()
-    topup(args.uid.upper(), args.amount, args.staff)
+
+    if args.csv or args.all or args.name_like:
+        if args.uid or args.amount is not None or sum(map(bool, (args.csv, args.all, args.name_like))) > 1:
+            ap.error("use one of --csv, --all or --name-like, without uid/amount")
+        sys.exit(bulk_main(args))
+    if args.uid is None or args.amount is None:
+        ap.error("give uid and amount, or a bulk option (--csv, --all, --name-like)")
+    if args.ledger_socket:
+        from ledger_daemon import LedgerClient, LedgerOutcomeUnknown, LedgerUnavailable
+        try:
+            ok, msg = LedgerClient(args.ledger_socket).topup(args.uid.upper(), args.amount, args.staff)
+        except LedgerUnavailable as e:
+            # Nothing reached the daemon, so a direct top-up cannot double up
+            print(f"[WARN] Ledger daemon unavailable ({e}); topping up directly.")
+            ok, msg = topup(args.uid.upper(), args.amount, args.staff)
+        except LedgerOutcomeUnknown as e:
+            ok, msg = False, f"Top-up outcome unknown: {e}. Check the balance before topping up again."
+    else:
+        ok, msg = topup(args.uid.upper(), args.amount, args.staff)
+    print(msg)
 
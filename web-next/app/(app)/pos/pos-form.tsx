@@ -126,6 +126,27 @@ export function PosForm({ students, studentIdsWithTransactions, userName }: PosF
       console.log(`[POS] ✓ ACCEPTED - Correct reader`);
       handleCardTap(event.card_uid);
     },
+    onChargeResult: (event) => {
+      // Auto-charge lane: the broadcaster already charged the card, just show the outcome
+      if (event.lane !== selectedReaderRef.current) {
+        return;
+      }
+
+      setError("");
+      setSuccess("");
+      setTransactionId(null);
+      if (event.ok) {
+        setSuccess(
+          event.balance !== undefined
+            ? `Auto-charged ¥${event.price.toFixed(1)} to card ${event.card_uid}. New balance: ¥${event.balance.toFixed(1)}`
+            : `Auto-charged ¥${event.price.toFixed(1)} to card ${event.card_uid}.`
+        );
+        setTransactionId(event.tx_id ?? null);
+        router.refresh();
+      } else {
+        setError(`Card ${event.card_uid}: ${event.message}`);
+      }
+    },
   });
 
   // Show reader selection prompt on first mount if no reader selected
@@ -82,9 +82,11 @@ export function getRecentTransactions(limit: number = 10): TransactionWithStuden
 
 export function getStudentIdsWithTransactions(): number[] {
   const db = getDb();
+  // One index probe per student rather than a DISTINCT over every transaction
   const stmt = db.prepare(`
-    SELECT DISTINCT student_id
-    FROM transactions
+    SELECT s.id AS student_id
+    FROM students s
+    WHERE EXISTS (SELECT 1 FROM transactions t WHERE t.student_id = s.id)
   `);
   const rows = stmt.all() as { student_id: number }[];
   return rows.map((row) => row.student_id);
@@ -49,7 +49,17 @@ class TapEventBroadcaster {
     }
 
     // Broadcast to all listeners
-    console.log(`[TapBroadcaster] Broadcasting tap: ${event.card_uid} (${this.listeners.size} listeners)`);
+    this.notify(event);
+
+    return true; // Successfully broadcast
+  }
+
+  /**
+   * Send an event to all listeners without deduplication
+   * (charge results: every one is a separate sale)
+   */
+  notify(event) {
+    console.log(`[TapBroadcaster] Broadcasting ${event.type || 'tap'}: ${event.card_uid} (${this.listeners.size} listeners)`);
     
     this.listeners.forEach((listener) => {
       try {
@@ -58,8 +68,6 @@ class TapEventBroadcaster {
         console.error('[TapBroadcaster] Listener error:', error);
       }
     });
-
-    return true; // Successfully broadcast
   }
 
   /**
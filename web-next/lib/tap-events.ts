@@ -11,13 +11,30 @@
  */
 
 export interface TapEvent {
+  type?: "tap";
   card_uid: string;
   lane?: string;
   reader_ts?: string;
   timestamp: string;
 }
 
-type TapListener = (event: TapEvent) => void;
+/**
+ * Result of a tap charged by the broadcaster itself (auto-charge lanes)
+ */
+export interface ChargeResultEvent {
+  type: "charge_result";
+  card_uid: string;
+  lane?: string;
+  reader_ts?: string;
+  timestamp: string;
+  ok: boolean;
+  message: string;
+  price: number;
+  balance?: number;
+  tx_id?: number;
+}
+
+type TapListener = (event: TapEvent | ChargeResultEvent) => void;
 
 class TapEventBroadcaster {
   private listeners: Set<TapListener> = new Set();
@@ -67,7 +84,17 @@ class TapEventBroadcaster {
     }
 
     // Broadcast to all listeners
-    console.log(`[TapBroadcaster] Broadcasting tap: ${event.card_uid} (${this.listeners.size} listeners)`);
+    this.notify(event);
+
+    return true; // Successfully broadcast
+  }
+
+  /**
+   * Send an event to all listeners without deduplication
+   * (charge results: every one is a separate sale)
+   */
+  notify(event: TapEvent | ChargeResultEvent): void {
+    console.log(`[TapBroadcaster] Broadcasting ${event.type || "tap"}: ${event.card_uid} (${this.listeners.size} listeners)`);
     
     this.listeners.forEach((listener) => {
       try {
@@ -76,8 +103,6 @@ class TapEventBroadcaster {
         console.error("[TapBroadcaster] Listener error:", error);
       }
     });
-
-    return true; // Successfully broadcast
   }
 
   /**
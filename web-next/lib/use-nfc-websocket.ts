@@ -15,7 +15,7 @@
  */
 
 import { useEffect, useState, useRef, useCallback } from "react";
-import { type TapEvent } from "./tap-events";
+import { type TapEvent, type ChargeResultEvent } from "./tap-events";
 
 interface WebSocketMessage {
   type: string;
@@ -37,6 +37,12 @@ interface UseNFCWebSocketOptions {
    * Callback when a tap is received
    */
   onTap?: (event: TapEvent) => void;
+
+  /**
+   * Callback when a tap was charged by the broadcaster (auto-charge lanes).
+   * These are never passed to onTap.
+   */
+  onChargeResult?: (event: ChargeResultEvent) => void;
   
   /**
    * Callback when connection status changes
@@ -99,6 +105,7 @@ export function useNFCWebSocket(
     lane = "default",
     autoConnect = true,
     onTap,
+    onChargeResult,
     onConnectionChange,
     onError,
   } = options;
@@ -161,6 +168,19 @@ export function useNFCWebSocket(
             }
             break;
 
+          case "charge_result":
+            // Already charged by the broadcaster - not a tap to act on
+            console.log(
+              `[NFC WS] Charge result:`,
+              data.card_uid,
+              data.ok ? "approved" : "declined",
+              `from lane: ${data.lane}`
+            );
+            if (onChargeResult) {
+              onChargeResult(data as ChargeResultEvent);
+            }
+            break;
+
           default:
             // Check if this is a tap event (has card_uid)
             if (data.card_uid) {
@@ -193,7 +213,7 @@ export function useNFCWebSocket(
         }
       }
     },
-    [onTap, onError]
+    [onTap, onChargeResult, onError]
   );
 
   /**
@@ -27,6 +27,24 @@ const BLOCK_DURATION = 300000; // 5 minutes block
 // Connection tracking
 let connectionCounter = 0;
 
+// Recently seen broadcaster tap IDs, so taps replayed from the broadcaster's
+// spool after a reconnect are never delivered twice
+const seenTapIds = new Map(); // tap_id -> first seen timestamp
+const MAX_SEEN_TAP_IDS = 1000;
+
+/**
+ * Record a tap ID; returns false if it was already seen
+ */
+function rememberTapId(tapId) {
+  if (seenTapIds.has(tapId)) return false;
+  seenTapIds.set(tapId, Date.now());
+  if (seenTapIds.size > MAX_SEEN_TAP_IDS) {
+    // Maps iterate in insertion order, so the first key is the oldest
+    seenTapIds.delete(seenTapIds.keys().next().value);
+  }
+  return true;
+}
+
 /**
  * Get client IP address from request
  */
@@ -195,6 +213,16 @@ function handleWebSocketConnection(ws, request) {
         handleTapEvent(message);
       }
 
+      // Tap already charged by the broadcaster (auto-charge lane)
+      if (connectionInfo?.role === 'broadcaster' && message.type === 'charge_result') {
+        handleChargeResult(message);
+      }
+
+      // Card removed (broadcaster presence mode); logged only, clients act on the tap itself
+      if (connectionInfo?.role === 'broadcaster' && message.type === 'tap_end') {
+        console.log(`[WS #${connectionId}] Card removed: ${message.card_uid} (lane: ${message.lane || connectionInfo?.lane}, present ${message.present_seconds ?? '?'}s)`);
+      }
+
       // Handle pong
       if (message.type === 'pong') {
         // Connection is alive
@@ -365,10 +393,16 @@ function handleWebSocketConnection(ws, request) {
       return;
     }
 
+    if (message.tap_id && !rememberTapId(message.tap_id)) {
+      console.log(`[WS #${connectionId}] Tap ignored (already seen tap_id ${message.tap_id}): ${message.card_uid}`);
+      return;
+    }
+
     const tapEvent = {
       card_uid: message.card_uid,
       lane: eventLane,
       reader_ts: message.reader_ts,
+      replayed: message.replayed === true,
       timestamp: new Date().toISOString(),
     };
 
@@ -382,6 +416,45 @@ function handleWebSocketConnection(ws, request) {
     }
   }
 
+  // Handle charge results from auto-charge broadcasters: the sale already happened,
+  // so every result is forwarded (no card debounce), only replays are dropped
+  function handleChargeResult(message) {
+    if (!message.card_uid) {
+      console.warn(`[WS #${connectionId}] Charge result missing card_uid`);
+      return;
+    }
+
+    let eventLane = message.lane || connectionInfo?.lane || 'default';
+    if (typeof eventLane === 'string') {
+      eventLane = eventLane.trim();
+    }
+
+    if (message.tap_id && !rememberTapId(message.tap_id)) {
+      console.log(`[WS #${connectionId}] Charge result ignored (already seen tap_id ${message.tap_id}): ${message.card_uid}`);
+      return;
+    }
+
+    const chargeEvent = {
+      type: 'charge_result',
+      card_uid: message.card_uid,
+      lane: eventLane || 'default',
+      reader_ts: message.reader_ts,
+      replayed: message.replayed === true,
+      timestamp: new Date().toISOString(),
+      ok: message.ok === true,
+      message: message.message || '',
+      price: message.price,
+      balance: message.balance,
+      tx_id: message.tx_id,
+    };
+
+    tapBroadcaster.notify(chargeEvent);
+    console.log(
+      `[WS #${connectionId}] Charge result broadcast: ${chargeEvent.card_uid} ` +
+      `(lane: ${chargeEvent.lane}, ${chargeEvent.ok ? 'approved' : 'declined'}${chargeEvent.tx_id ? `, tx ${chargeEvent.tx_id}` : ''})`
+    );
+  }
+
   // Start ping/pong interval
   function startPingInterval() {
     pingInterval = setInterval(() => {